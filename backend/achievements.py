@@ -0,0 +1,149 @@
+from datetime import datetime
+from pymongo import ReturnDocument
+
+# Event-driven achievements.
+# Badge rules are declarative: each one watches a single metric ("xp",
+# "lessons" or "streak") and owns a fixed bit in users.badges_mask. Callers
+# report the new value of a metric when it changes; only that metric's rules
+# are evaluated, and the bits are claimed with one atomic $bit update, so a
+# badge is awarded exactly once even under concurrent requests.
+# Newly earned bits are also set in users.badges_unseen_mask, which
+# /api/achievements/check reads from the already loaded user document.
+# Bits are persisted: never renumber a rule, only append new ones.
+
+BADGE_RULES = [
+    {"type": "first_lesson", "bit": 0, "metric": "lessons", "threshold": 1, "name": "İlk Ders!", "icon": "🎯"},
+    {"type": "five_lessons", "bit": 1, "metric": "lessons", "threshold": 5, "name": "Hızlı Başlangıç", "icon": "🚀"},
+    {"type": "ten_lessons", "bit": 2, "metric": "lessons", "threshold": 10, "name": "Kararlı Öğrenci", "icon": "💪"},
+    {"type": "streak_3", "bit": 3, "metric": "streak", "threshold": 3, "name": "3 Günlük Seri", "icon": "🔥"},
+    {"type": "streak_7", "bit": 4, "metric": "streak", "threshold": 7, "name": "Haftalık Kahraman", "icon": "⭐"},
+    {"type": "xp_100", "bit": 5, "metric": "xp", "threshold": 100, "name": "100 XP", "icon": "💯"},
+    {"type": "xp_500", "bit": 6, "metric": "xp", "threshold": 500, "name": "500 XP Master", "icon": "👑"},
+]
+
+RULES_BY_METRIC = {}
+for rule in BADGE_RULES:
+    RULES_BY_METRIC.setdefault(rule["metric"], []).append(rule)
+RULES_BY_TYPE = {rule["type"]: rule for rule in BADGE_RULES}
+
+users_collection = None
+achievements_collection = None
+user_progress_collection = None
+
+def init_collections(db):
+    """Initialize collections from main server"""
+    global users_collection, achievements_collection, user_progress_collection
+
+    users_collection = db.users
+    achievements_collection = db.achievements
+    user_progress_collection = db.user_progress
+
+def ensure_indexes():
+    achievements_collection.create_index("user_id")
+
+def rules_for_mask(mask: int):
+    return [rule for rule in BADGE_RULES if mask & (1 << rule["bit"])]
+
+def record_metric(user: dict, metric: str, value: int, now: datetime = None):
+    """Award every not-yet-earned badge unlocked by `metric` reaching `value`.
+
+    Costs nothing when no rule is newly satisfied; otherwise one user update
+    plus one insert_many. Returns the newly earned rules.
+    """
+    known_mask = user.get("badges_mask", 0)
+    candidates = 0
+    for rule in RULES_BY_METRIC.get(metric, ()):
+        bit = 1 << rule["bit"]
+        if value >= rule["threshold"] and not known_mask & bit:
+            candidates |= bit
+    if not candidates:
+        return []
+
+    before = users_collection.find_one_and_update(
+        {"_id": user["_id"]},
+        {"$bit": {
+            "badges_mask": {"or": candidates},
+            "badges_unseen_mask": {"or": candidates},
+        }},
+        projection={"badges_mask": 1},
+        return_document=ReturnDocument.BEFORE
+    )
+    if before is None:
+        return []
+
+    # Bits already set before this update were claimed by a concurrent request
+    earned = rules_for_mask(candidates & ~before.get("badges_mask", 0))
+    user["badges_mask"] = before.get("badges_mask", 0) | candidates
+    if earned:
+        now = now or datetime.utcnow()
+        user_id = str(user["_id"])
+        achievements_collection.insert_many([
+            {
+                "user_id": user_id,
+                "badge_type": rule["type"],
+                "name": rule["name"],
+                "icon": rule["icon"],
+                "earned_at": now,
+            }
+            for rule in earned
+        ])
+    return earned
+
+def pop_unseen(user: dict):
+    """Badges earned since the last check, read from the loaded user document"""
+    unseen = user.get("badges_unseen_mask", 0)
+    if not unseen:
+        return []
+
+    users_collection.update_one(
+        {"_id": user["_id"]},
+        {"$bit": {"badges_unseen_mask": {"and": ~unseen}}}
+    )
+    return [
+        {"badge_type": rule["type"], "name": rule["name"], "icon": rule["icon"]}
+        for rule in rules_for_mask(unseen)
+    ]
+
+def backfill_badges(batch_size: int = 1000) -> int:
+    """One-off: derive badges_mask from existing achievement documents and
+    total_lessons_completed from user_progress. Returns the number of users written."""
+    from bson import ObjectId
+    from pymongo import UpdateOne
+
+    masks = {}
+    for row in achievements_collection.aggregate([
+        {"$group": {"_id": "$user_id", "types": {"$addToSet": "$badge_type"}}}
+    ], allowDiskUse=True):
+        mask = 0
+        for badge_type in row["types"]:
+            if badge_type in RULES_BY_TYPE:
+                mask |= 1 << RULES_BY_TYPE[badge_type]["bit"]
+        masks[row["_id"]] = mask
+
+    lessons = {
+        row["_id"]: row["count"]
+        for row in user_progress_collection.aggregate([
+            # Stories write completed rows too; the live "lessons" metric counts lessons only
+            {"$match": {"completed": True, "lesson_id": {"$exists": True}}},
+            {"$group": {"_id": "$user_id", "count": {"$sum": 1}}}
+        ], allowDiskUse=True)
+    }
+
+    written = 0
+    operations = []
+    for user_id in set(masks) | set(lessons):
+        operations.append(UpdateOne(
+            {"_id": ObjectId(user_id)},
+            {
+                "$bit": {"badges_mask": {"or": masks.get(user_id, 0)}},
+                "$set": {"total_lessons_completed": lessons.get(user_id, 0)},
+            }
+        ))
+        if len(operations) >= batch_size:
+            users_collection.bulk_write(operations, ordered=False)
+            written += len(operations)
+            operations = []
+    if operations:
+        users_collection.bulk_write(operations, ordered=False)
+        written += len(operations)
+    return written
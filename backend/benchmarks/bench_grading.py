@@ -0,0 +1,209 @@
+"""
+Grading hot-path microbenchmarks
+
+Times the per-answer functions (answer normalization, similarity, error-type
+detection, full grading, SM-2 scheduling, document serialization) on the real
+exercises in generated_lesson_*.json, with synthetic learner answers at
+several error rates. With --mongo, update_mistake_bank is timed against
+MONGO_URL/DB_NAME as well.
+
+    python benchmarks/bench_grading.py --output grading.json
+    python benchmarks/bench_grading.py --baseline grading.json   # exit 1 on regression
+
+Results are ns per call (best of --repeat runs) and record the git commit, so
+files from different commits can be compared directly.
+"""
+
+import argparse
+import glob
+import json
+import os
+import random
+import subprocess
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import srs  # noqa: E402
+from content_store import serialize_doc  # noqa: E402
+from grading import detect_error_type, get_text_similarity, grade_answer, normalize_text  # noqa: E402
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+ERROR_RATES = (0.0, 0.2, 0.5)
+WRONG_ANSWERS = ["nu știu", "La revedere!", "Mulțumesc", "bilmiyorum"]
+
+
+def load_lessons():
+    lessons = []
+    for path in sorted(glob.glob(os.path.join(BACKEND_DIR, "generated_lesson_*.json"))):
+        with open(path, encoding="utf-8") as f:
+            lessons.append(json.load(f))
+    return lessons
+
+
+def typo(text: str, rng: random.Random) -> str:
+    """Near miss: drop, swap or replace one character"""
+    if len(text) < 3:
+        return text + "x"
+    i = rng.randrange(len(text) - 1)
+    edit = rng.choice(("drop", "swap", "replace"))
+    if edit == "drop":
+        return text[:i] + text[i + 1:]
+    if edit == "swap":
+        return text[:i] + text[i + 1] + text[i] + text[i + 2:]
+    return text[:i] + rng.choice("aăâeiîoușțt") + text[i + 1:]
+
+
+def learner_answers(exercises, error_rate: float, per_exercise: int, seed: int = 7):
+    """(exercise, answer) pairs; a share of error_rate are wrong, half of those near misses"""
+    rng = random.Random(seed)
+    pairs = []
+    for exercise in exercises:
+        correct = exercise.get("correct_answer") or ""
+        accepted = [correct] + list(exercise.get("acceptable_answers", []))
+        for _ in range(per_exercise):
+            if rng.random() >= error_rate:
+                answer = rng.choice(accepted)
+                # Learners rarely match case and spacing exactly
+                answer = f"  {answer.lower()} " if rng.random() < 0.5 else answer
+            elif rng.random() < 0.5:
+                answer = typo(correct, rng)
+            else:
+                answer = rng.choice(WRONG_ANSWERS)
+            pairs.append((exercise, answer))
+    return pairs
+
+
+def time_per_call(fn, calls: int, repeat: int) -> float:
+    """Best-of-repeat nanoseconds per call for fn, which performs `calls` calls"""
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat=repeat, number=number)) / number
+    return best / calls * 1e9
+
+
+def run_benchmarks(repeat: int, per_exercise: int):
+    from bson import ObjectId
+
+    lessons = load_lessons()
+    exercises = [exercise for lesson in lessons for exercise in lesson.get("exercises", [])]
+    results = {}
+
+    def record(name, fn, calls):
+        results[name] = round(time_per_call(fn, calls, repeat), 1)
+        print(f"{name:<36} {results[name]:>12,.1f} ns/call")
+
+    baseline_pairs = learner_answers(exercises, 0.2, per_exercise)
+    answers = [answer for _, answer in baseline_pairs]
+    corrects = [exercise.get("correct_answer") or "" for exercise, _ in baseline_pairs]
+
+    record("normalize_text", lambda: [normalize_text(a) for a in answers], len(answers))
+    record("get_text_similarity", lambda: [get_text_similarity(a, c) for a, c in zip(answers, corrects)], len(answers))
+    record("detect_error_type", lambda: [detect_error_type(e) for e in exercises], len(exercises))
+
+    for error_rate in ERROR_RATES:
+        pairs = learner_answers(exercises, error_rate, per_exercise)
+        record(f"grade_answer[err={error_rate:.0%}]", lambda: [grade_answer(e, a) for e, a in pairs], len(pairs))
+
+    rng = random.Random(11)
+    states = [
+        (rng.uniform(srs.MIN_EASE, srs.DEFAULT_EASE), rng.randint(1, 60), rng.randint(0, 6),
+         srs.answer_quality(rng.random() > 0.2, rng.random()))
+        for _ in range(1000)
+    ]
+    record("srs.schedule_review", lambda: [srs.schedule_review(*state) for state in states], len(states))
+
+    docs = [{**lesson, "_id": ObjectId()} for lesson in lessons]
+    record("serialize_doc(lesson)", lambda: [serialize_doc(doc) for doc in docs], len(docs))
+    return results
+
+
+def bench_mistake_bank(repeat: int, per_exercise: int):
+    """update_mistake_bank against a real mongod (writes to a throwaway user id)"""
+    from bson import ObjectId
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    import mistake_bank
+    import review_stats
+
+    load_dotenv()
+    db = MongoClient(os.getenv("MONGO_URL"))[os.getenv("DB_NAME")]
+    mistake_bank.init_collections(db)
+    review_stats.init_collections(db)
+
+    lessons = load_lessons()
+    pairs = []
+    for lesson_index, lesson in enumerate(lessons):
+        for exercise_index, exercise in enumerate(lesson.get("exercises", [])):
+            pairs.append((f"bench-lesson-{lesson_index}", exercise_index, exercise))
+    user_id = f"bench-{ObjectId()}"
+    answers = learner_answers([exercise for _, _, exercise in pairs], 0.5, per_exercise)
+
+    def run():
+        for (lesson_id, exercise_index, exercise), (_, answer) in zip(pairs * per_exercise, answers):
+            grade = grade_answer(exercise, answer)
+            mistake_bank.update_mistake_bank(
+                user_id, lesson_id, exercise_index, exercise,
+                grade["user_answer"], grade["is_correct"], grade["similarity"],
+            )
+
+    try:
+        result = round(time_per_call(run, len(answers), repeat), 1)
+    finally:
+        db.user_mistakes.delete_many({"user_id": user_id})
+        db.review_stats.delete_many({"user_id": user_id})
+    print(f"{'update_mistake_bank (mongo)':<36} {result:>12,.1f} ns/call")
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, tolerance: float):
+    regressions = []
+    for name, ns in results.items():
+        before = baseline.get("results", {}).get(name)
+        if before and ns > before * (1 + tolerance):
+            regressions.append(f"{name}: {before:,.1f} -> {ns:,.1f} ns/call (+{(ns / before - 1):.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--answers-per-exercise", type=int, default=20)
+    parser.add_argument("--mongo", action="store_true", help="also time update_mistake_bank against MONGO_URL/DB_NAME")
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--baseline", help="results JSON from another commit to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed slowdown (0.15 = 15%%)")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.repeat, args.answers_per_exercise)
+    if args.mongo:
+        results["update_mistake_bank"] = bench_mistake_bank(args.repeat, max(args.answers_per_exercise // 10, 1))
+
+    report = {"commit": git_commit(), "python": sys.version.split()[0], "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\nRegressions against {baseline.get('commit') or args.baseline}:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\nNo regressions against {baseline.get('commit') or args.baseline}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Cold start profile
+
+Measures what every worker boot and autoscaled replica pays before it can
+serve traffic:
+
+1. `python -X importtime -c "import server"`: total import time, the slowest
+   top-level imports, and whether any module in --forbid (the LLM client
+   stack, which server.py only imports on first generation) was loaded.
+2. Time to first request: start `uvicorn server:app` and poll /api/health
+   until it answers. Startup runs ensure_indexes etc., so MONGO_URL/DB_NAME
+   must point at a reachable mongod; skip with --no-serve.
+
+    python benchmarks/bench_import_time.py --output coldstart.json
+    python benchmarks/bench_import_time.py --baseline coldstart.json   # exit 1 on regression
+
+The run also fails (exit 1) when a forbidden module is imported or a median
+exceeds --import-target-ms / --first-request-target-ms.
+"""
+
+import argparse
+import json
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+FORBIDDEN_MODULES = ("emergentintegrations", "litellm", "openai", "google.genai", "googleapiclient", "boto3", "botocore")
+
+
+def parse_importtime(stderr: str):
+    """{module: (self_us, cumulative_us, depth)} from -X importtime output"""
+    modules = {}
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            # importtime indents nested imports by two spaces per level
+            modules[name] = (int(self_us), int(cumulative_us), (len(indent) - 1) // 2)
+    return modules
+
+
+def profile_import():
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import server"],
+        cwd=BACKEND_DIR, capture_output=True, text=True,
+    )
+    if completed.returncode != 0:
+        sys.exit(f"import server failed:\n{completed.stderr[-2000:]}")
+    return parse_importtime(completed.stderr)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def time_to_first_request(timeout: float) -> float:
+    """Seconds from spawning uvicorn until GET /api/health returns 200"""
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            if server.poll() is not None:
+                sys.exit(f"uvicorn exited during startup:\n{server.stderr.read()[-2000:]}")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/api/health", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.01)
+        sys.exit(f"no answer from /api/health within {timeout}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="slowest top-level imports to list")
+    parser.add_argument("--forbid", nargs="*", default=list(FORBIDDEN_MODULES), help="modules server.py must not import")
+    parser.add_argument("--import-target-ms", type=float, default=1500)
+    parser.add_argument("--first-request-target-ms", type=float, default=3000)
+    parser.add_argument("--no-serve", action="store_true", help="only profile imports (no mongod needed)")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--baseline", help="results JSON from another commit to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    # The first run also warms the bytecode cache, which a deployed image already has
+    profile_import()
+    runs = [profile_import() for _ in range(args.repeat)]
+    totals_ms = [run["server"][1] / 1000 for run in runs]
+    results = {"import_ms": round(statistics.median(totals_ms), 1)}
+
+    last = runs[-1]
+    top_level = sorted(
+        ((name, cumulative) for name, (_, cumulative, depth) in last.items() if depth == 1),
+        key=lambda item: item[1], reverse=True,
+    )
+    print(f"import server: median {results['import_ms']:,.1f} ms over {args.repeat} runs\n")
+    print(f"{'module (imported by server)':<40} {'cumulative ms':>14}")
+    for name, cumulative in top_level[:args.top]:
+        print(f"{name:<40} {cumulative / 1000:>14,.1f}")
+
+    failures = []
+    loaded = sorted(name for name in last if any(name == f or name.startswith(f + ".") for f in args.forbid))
+    if loaded:
+        failures.append(f"forbidden modules imported at startup: {', '.join(loaded[:10])}")
+    if results["import_ms"] > args.import_target_ms:
+        failures.append(f"import server {results['import_ms']:,.1f} ms > target {args.import_target_ms:,.0f} ms")
+
+    if not args.no_serve:
+        first_request_ms = [time_to_first_request(args.timeout) * 1000 for _ in range(args.repeat)]
+        results["first_request_ms"] = round(statistics.median(first_request_ms), 1)
+        print(f"\ntime to first request: median {results['first_request_ms']:,.1f} ms over {args.repeat} runs")
+        if results["first_request_ms"] > args.first_request_target_ms:
+            failures.append(
+                f"time to first request {results['first_request_ms']:,.1f} ms > target {args.first_request_target_ms:,.0f} ms"
+            )
+
+    report = {
+        "commit": git_commit(),
+        "python": sys.version.split()[0],
+        "results": results,
+        "top_imports_ms": {name: round(cumulative / 1000, 1) for name, cumulative in top_level[:args.top]},
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        for name, ms in results.items():
+            before = baseline.get("results", {}).get(name)
+            if before and ms > before * (1 + args.tolerance):
+                failures.append(f"{name}: {before:,.1f} -> {ms:,.1f} ms (+{(ms / before - 1):.0%}) against {baseline.get('commit')}")
+
+    if failures:
+        print("\nFailed:")
+        for line in failures:
+            print(f"  {line}")
+        sys.exit(1)
+    print("\nWithin targets.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+League rollover benchmark
+
+Builds a synthetic population (default 1M users) split into fixed-size
+cohorts and times the weekly promotion/demotion planning. With --mongo the
+population is written to MONGO_URL/DB_NAME and the full rollover job,
+including bulk writes, is timed.
+
+    python benchmarks/bench_league_rollover.py --users 1000000
+    python benchmarks/bench_league_rollover.py --users 1000000 --mongo
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import duolingo_features  # noqa: E402
+from duolingo_features import LEAGUE_TIERS, LEAGUE_COHORT_SIZE, plan_cohort_rollover  # noqa: E402
+
+BENCH_WEEK = "1970-W00"
+
+
+def synthetic_cohorts(users: int, seed: int = 7):
+    rng = np.random.default_rng(seed)
+    xp = rng.gamma(shape=1.2, scale=180, size=users).astype(np.int64)
+    xp[rng.random(users) < 0.2] = 0  # inactive learners
+    cohort_of = np.arange(users) // LEAGUE_COHORT_SIZE
+    tier_of = rng.integers(0, len(LEAGUE_TIERS), cohort_of[-1] + 1)
+
+    # Sort by (cohort, xp desc) the same way rollover_week streams members
+    order = np.lexsort((-xp, cohort_of))
+    boundaries = np.flatnonzero(np.diff(cohort_of[order])) + 1
+    cohorts = []
+    for members in np.split(order, boundaries):
+        cohort = int(cohort_of[members[0]])
+        cohorts.append((
+            LEAGUE_TIERS[tier_of[cohort]],
+            [{"user_id": f"{idx:024x}", "xp_this_week": int(xp[idx])} for idx in members],
+        ))
+    return cohorts
+
+
+def bench_planning(users: int):
+    started = time.perf_counter()
+    cohorts = synthetic_cohorts(users)
+    print(f"generated {users:,} users in {len(cohorts):,} cohorts in {time.perf_counter() - started:.1f}s")
+
+    started = time.perf_counter()
+    moved = 0
+    for tier, members in cohorts:
+        moved += sum(1 for _, new_tier, _ in plan_cohort_rollover(tier, members) if new_tier != tier)
+    elapsed = time.perf_counter() - started
+    print(f"planned rollover: {elapsed:.2f}s, {users / elapsed:,.0f} users/s, {moved:,} tier changes")
+
+
+def bench_mongo(users: int, batch_size: int):
+    from dotenv import load_dotenv
+    from bson import ObjectId
+    from pymongo import MongoClient
+
+    load_dotenv()
+    db = MongoClient(os.getenv("MONGO_URL"))[os.getenv("DB_NAME")]
+    duolingo_features.init_collections(db)
+
+    cohorts = synthetic_cohorts(users)
+    db.leagues.delete_many({"week": BENCH_WEEK})
+    db.league_members.delete_many({"week": BENCH_WEEK})
+
+    started = time.perf_counter()
+    members_batch = []
+    for tier, members in cohorts:
+        league_id = str(db.leagues.insert_one({"tier": tier, "week": BENCH_WEEK, "member_count": len(members)}).inserted_id)
+        for member in members:
+            members_batch.append({**member, "user_id": str(ObjectId()), "league_id": league_id, "week": BENCH_WEEK})
+        if len(members_batch) >= batch_size:
+            db.league_members.insert_many(members_batch, ordered=False)
+            members_batch = []
+    if members_batch:
+        db.league_members.insert_many(members_batch, ordered=False)
+    print(f"seeded {users:,} members in {time.perf_counter() - started:.1f}s")
+
+    started = time.perf_counter()
+    processed = duolingo_features.rollover_week(BENCH_WEEK, batch_size=batch_size)
+    elapsed = time.perf_counter() - started
+    print(f"rollover_week: {processed:,} members in {elapsed:.1f}s, {processed / elapsed:,.0f} members/s")
+
+    db.leagues.delete_many({"week": BENCH_WEEK})
+    db.league_members.delete_many({"week": BENCH_WEEK})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--mongo", action="store_true", help="run the full job against MONGO_URL/DB_NAME")
+    args = parser.parse_args()
+
+    bench_planning(args.users)
+    if args.mongo:
+        bench_mongo(args.users, args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+SRS scheduler benchmark
+
+Reports how many mistake-bank items per second the SM-2 code can process:
+the legacy migration (jobs.py srs-migrate) up to the bulk write, in
+--batch-size chunks as the job runs it, and the per-answer scheduler that
+mistake_bank calls on every graded answer.
+
+    python benchmarks/bench_srs.py --items 1000000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import srs  # noqa: E402
+
+
+def synthetic_items(count: int, seed: int = 42):
+    rng = np.random.default_rng(seed)
+    ease = rng.uniform(srs.MIN_EASE, srs.DEFAULT_EASE, count)
+    interval_days = rng.integers(1, 120, count)
+    repetition_count = rng.integers(0, 8, count)
+    mistake_count = rng.integers(1, 6, count)
+    quality = rng.choice(
+        [srs.WRONG_QUALITY, srs.NEAR_MISS_QUALITY, srs.CORRECT_QUALITY],
+        size=count,
+        p=[0.15, 0.1, 0.75],
+    )
+    seen = np.datetime64("2026-01-01T00:00:00") + rng.integers(0, 86400 * 90, count).astype("timedelta64[s]")
+    last_seen_at = seen.astype("datetime64[ms]")
+    return ease, interval_days, repetition_count, mistake_count, quality, last_seen_at
+
+
+def legacy_docs(repetition_count, mistake_count, last_seen_at):
+    """user_mistakes documents as the migration reads them (its projection)"""
+    return [
+        {"_id": i, "repetition_count": repetitions, "mistake_count": mistakes, "last_seen_at": seen}
+        for i, (repetitions, mistakes, seen) in enumerate(zip(
+            repetition_count.tolist(), mistake_count.tolist(), last_seen_at.astype("datetime64[ms]").tolist()
+        ))
+    ]
+
+
+def bench(label: str, count: int, fn):
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28} {count:>10} items {elapsed:8.3f}s {count / elapsed:>14,.0f} items/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, default=1_000_000)
+    parser.add_argument("--scalar-items", type=int, default=100_000)
+    parser.add_argument("--batch-size", type=int, default=10000, help="same as jobs.py --batch-size")
+    args = parser.parse_args()
+
+    ease, interval_days, repetition_count, mistake_count, quality, last_seen_at = synthetic_items(args.items)
+
+    docs = legacy_docs(repetition_count, mistake_count, last_seen_at)
+    batches = [docs[i:i + args.batch_size] for i in range(0, len(docs), args.batch_size)]
+    bench("legacy_state_updates (job)", args.items, lambda: [srs.legacy_state_updates(batch) for batch in batches])
+    bench("derive_state_batch", args.items, lambda: srs.derive_state_batch(repetition_count, mistake_count))
+    bench("due_dates_batch", args.items, lambda: srs.due_dates_batch(last_seen_at, interval_days))
+
+    n = min(args.scalar_items, args.items)
+    scalar_state = list(zip(ease[:n].tolist(), interval_days[:n].tolist(), repetition_count[:n].tolist(), quality[:n].tolist()))
+    bench("schedule_review (per answer)", n, lambda: [srs.schedule_review(*state) for state in scalar_state])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+"""
+Synthetic data generator for scale testing
+
+Fills MONGO_URL/DB_NAME with realistic volume so index choices, aggregations
+and the maintenance jobs can be measured at production scale:
+
+    python benchmarks/generate_synthetic_data.py --users 1000000 \\
+        --progress-per-user 20 --mistakes-per-user 30 --workers 8
+
+Generates users (with streaks, hearts, boosts and badge masks), user_progress,
+user_mistakes with SM-2 state and a realistic spread of due dates, friend
+edges, this week's league cohorts, inventory counters and achievements.
+Lessons come from the shipped generated_lesson_*.json files.
+
+Synthetic documents use ObjectIds / user ids starting with SYNTHETIC_PREFIX, so
+--drop removes exactly what an earlier run created. Each worker process opens
+its own MongoClient and writes unordered insert_many batches. Afterwards run
+`python jobs.py review-stats-rebuild` to build the derived SRS counters.
+"""
+
+import argparse
+import glob
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from multiprocessing import Pool
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import achievements  # noqa: E402
+import srs  # noqa: E402
+from duolingo_features import LEAGUE_COHORT_SIZE, LEAGUE_TIERS, current_week_key  # noqa: E402
+from grading import detect_error_type  # noqa: E402
+from inventory import COUNTED_ITEMS, counter_id  # noqa: E402
+from xp_ledger import day_start  # noqa: E402
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+SYNTHETIC_PREFIX = "5eed"
+USER_ID_RANGE = {"$gte": SYNTHETIC_PREFIX + "0" * 20, "$lte": SYNTHETIC_PREFIX + "f" * 20}
+# Every synthetic user can log in with this password (hashed once per run)
+PASSWORD = "synthetic123"
+
+
+def synthetic_id(kind: int, index: int) -> str:
+    """Deterministic ObjectId hex: prefix, a kind digit (users 0, leagues 1) and the index"""
+    return f"{SYNTHETIC_PREFIX}{kind:x}{index:019x}"
+
+
+def get_db():
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    load_dotenv(os.path.join(BACKEND_DIR, ".env"))
+    return MongoClient(os.getenv("MONGO_URL"))[os.getenv("DB_NAME")]
+
+
+def load_lesson_ids(db):
+    """Insert the shipped lessons if missing and return [(lesson_id, lesson)] by level"""
+    lessons = []
+    for path in sorted(glob.glob(os.path.join(BACKEND_DIR, "generated_lesson_*.json"))):
+        with open(path, encoding="utf-8") as f:
+            lesson = json.load(f)
+        lesson.pop("id", None)
+        lesson["created_at"] = datetime.utcnow()
+        existing = db.lessons.find_one({"level": lesson["level"], "topic": lesson["topic"]}, {"_id": 1})
+        lesson_id = existing["_id"] if existing else db.lessons.insert_one(lesson).inserted_id
+        lessons.append((str(lesson_id), lesson))
+    lessons.sort(key=lambda pair: pair[1].get("level", 0))
+    return lessons
+
+
+def tier_for_cohort(cohort: int) -> str:
+    # Bronze is by far the largest tier, diamond the smallest
+    weights = [40, 25, 15, 9, 6, 3, 2]
+    position = cohort * 7919 % sum(weights)
+    for tier, weight in zip(LEAGUE_TIERS, weights):
+        if position < weight:
+            return tier
+        position -= weight
+    return LEAGUE_TIERS[0]
+
+
+def due_offset_days(rng: random.Random, interval_days: int) -> float:
+    """Days from now until an item is due: ~20% overdue, the rest spread over their interval"""
+    if rng.random() < 0.2:
+        return -rng.expovariate(1 / 3)
+    return rng.uniform(0, interval_days)
+
+
+def build_user_chunk(start: int, stop: int, args, lessons, now: datetime):
+    """Every document for users [start, stop), grouped by collection"""
+    from bson import ObjectId
+
+    rng = random.Random(args.seed * 1_000_003 + start)
+    today = day_start(now)
+    week = current_week_key(now)
+    docs = {name: [] for name in (
+        "users", "user_progress", "user_mistakes", "friends", "leagues",
+        "league_members", "user_inventory", "achievements",
+    )}
+
+    for index in range(start, stop):
+        user_id = synthetic_id(0, index)
+        username = f"synth_{index}"
+        completed = min(len(lessons), max(0, int(rng.gauss(args.progress_per_user, args.progress_per_user / 3))))
+        xp = completed * 50 + rng.randint(0, 60) * 10
+        streak = int(rng.expovariate(1 / 8)) if rng.random() < 0.6 else 0
+        last_activity = today - timedelta(days=0 if rng.random() < 0.5 else 1) if streak else today - timedelta(days=rng.randint(2, 60))
+        cohort = index // LEAGUE_COHORT_SIZE
+        league_id = synthetic_id(1, cohort)
+        tier = tier_for_cohort(cohort)
+
+        badges_mask = 0
+        for rule in achievements.BADGE_RULES:
+            value = {"xp": xp, "lessons": completed, "streak": streak}[rule["metric"]]
+            if value >= rule["threshold"]:
+                badges_mask |= 1 << rule["bit"]
+                docs["achievements"].append({
+                    "user_id": user_id,
+                    "badge_type": rule["type"],
+                    "name": rule["name"],
+                    "icon": rule["icon"],
+                    "earned_at": now - timedelta(days=rng.randint(0, 300)),
+                })
+
+        user = {
+            "_id": ObjectId(user_id),
+            "username": username,
+            "email": f"{username}@example.com",
+            "password": args.password_hash,
+            "xp": xp,
+            "level": 1 + xp // 500,
+            "streak": streak,
+            "last_activity_day": last_activity,
+            "streak_freezes": rng.choice((0, 0, 0, 1, 2)),
+            "gems": rng.randint(0, 2000),
+            "hearts": rng.randint(0, 5),
+            "max_hearts": 5,
+            "last_heart_refill": now - timedelta(minutes=rng.randint(0, 600)),
+            "mistake_shields": rng.choice((0, 0, 0, 1)),
+            "daily_goal": rng.choice((20, 50, 100)),
+            "league": tier,
+            "league_id": league_id,
+            "league_week": week,
+            "total_lessons_completed": completed,
+            "badges_mask": badges_mask,
+            "onboarding_completed": True,
+            "last_login": now - timedelta(hours=rng.randint(0, 24 * 30)),
+            "created_at": now - timedelta(days=rng.randint(1, 700)),
+        }
+        if rng.random() < 0.05:
+            user["active_effects"] = {"xp_boost": now + timedelta(minutes=rng.randint(1, 15))}
+        docs["users"].append(user)
+
+        for lesson_id, _ in lessons[:completed]:
+            docs["user_progress"].append({
+                "user_id": user_id,
+                "lesson_id": lesson_id,
+                "completed": True,
+                "score": rng.randint(50, 100),
+                "attempts": 1 + int(rng.expovariate(1)),
+                "completed_at": now - timedelta(days=rng.randint(0, 365)),
+            })
+
+        seen = set()
+        for _ in range(min(args.mistakes_per_user, completed * 6)):
+            lesson_id, lesson = lessons[rng.randrange(max(completed, 1))]
+            exercise_index = rng.randrange(len(lesson["exercises"]))
+            if (lesson_id, exercise_index) in seen:
+                continue
+            seen.add((lesson_id, exercise_index))
+            exercise = lesson["exercises"][exercise_index]
+            mistake_count = 1 + int(rng.expovariate(1))
+            repetition_count = rng.randint(0, 6)
+            ease = max(srs.MIN_EASE, srs.DEFAULT_EASE - 0.32 * (mistake_count - 1) + rng.uniform(-0.1, 0.1))
+            interval_days = min(srs.MAX_INTERVAL_DAYS, 1 if repetition_count < 2 else int(6 * ease ** (repetition_count - 2)))
+            next_review_at = now + timedelta(days=due_offset_days(rng, interval_days))
+            docs["user_mistakes"].append({
+                "user_id": user_id,
+                "lesson_id": lesson_id,
+                "exercise_index": exercise_index,
+                "exercise_type": exercise.get("type"),
+                "error_type": detect_error_type(exercise),
+                "question": exercise.get("question"),
+                "correct_answer": exercise.get("correct_answer"),
+                "last_answer": "",
+                "last_result": "wrong" if repetition_count == 0 else "correct",
+                "mistake_count": mistake_count,
+                "ease": ease,
+                "interval_days": interval_days,
+                "repetition_count": repetition_count,
+                "next_review_at": next_review_at,
+                "status": "due" if next_review_at <= now else "scheduled",
+                "created_at": next_review_at - timedelta(days=interval_days + rng.randint(0, 60)),
+                "last_seen_at": next_review_at - timedelta(days=interval_days),
+            })
+
+        # Each user starts ~half their friendships; edges are stored in both directions
+        for _ in range(rng.randint(0, args.friends_per_user)):
+            friend = rng.randrange(args.users)
+            if friend != index:
+                friend_id = synthetic_id(0, friend)
+                docs["friends"].append({"user_id": user_id, "friend_id": friend_id, "created_at": now})
+                docs["friends"].append({"user_id": friend_id, "friend_id": user_id, "created_at": now})
+
+        if index % LEAGUE_COHORT_SIZE == 0:
+            docs["leagues"].append({
+                "_id": ObjectId(league_id),
+                "tier": tier,
+                "week": week,
+                "member_count": min(LEAGUE_COHORT_SIZE, args.users - index),
+                "created_at": now,
+            })
+        docs["league_members"].append({
+            "user_id": user_id,
+            "league_id": league_id,
+            "username": username,
+            "tier": tier,
+            "week": week,
+            "xp_this_week": int(rng.expovariate(1 / 120)),
+            "joined_at": now - timedelta(days=rng.randint(0, 6)),
+        })
+
+        for item_type in COUNTED_ITEMS:
+            if rng.random() < 0.3:
+                docs["user_inventory"].append({
+                    "_id": counter_id(user_id, item_type),
+                    "user_id": user_id,
+                    "item_type": item_type,
+                    "quantity": rng.randint(1, 5),
+                    "updated_at": now,
+                })
+    return docs
+
+
+def insert_chunk(task):
+    start, stop, args, lessons, now = task
+    from pymongo.errors import BulkWriteError
+
+    db = get_db()
+    docs = build_user_chunk(start, stop, args, lessons, now)
+    counts = {}
+    for name, batch in docs.items():
+        for offset in range(0, len(batch), args.batch_size):
+            try:
+                db[name].insert_many(batch[offset:offset + args.batch_size], ordered=False)
+            except BulkWriteError as e:
+                # Random friend picks can repeat an edge; the unique index drops the duplicate
+                if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+                    raise
+        counts[name] = len(batch)
+    return counts
+
+
+def drop_synthetic(db):
+    from bson import ObjectId
+
+    id_range = {"$gte": ObjectId(SYNTHETIC_PREFIX + "0" * 20), "$lte": ObjectId(SYNTHETIC_PREFIX + "f" * 20)}
+    db.users.delete_many({"_id": id_range})
+    db.leagues.delete_many({"_id": id_range})
+    for name in ("user_progress", "user_mistakes", "league_members", "user_inventory",
+                 "achievements", "review_stats", "xp_ledger", "friend_suggestions", "streak_at_risk"):
+        db[name].delete_many({"user_id": USER_ID_RANGE})
+    db.friends.delete_many({"$or": [{"user_id": USER_ID_RANGE}, {"friend_id": USER_ID_RANGE}]})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--progress-per-user", type=int, default=10, help="mean completed lessons per user")
+    parser.add_argument("--mistakes-per-user", type=int, default=25, help="max tracked mistakes per user")
+    parser.add_argument("--friends-per-user", type=int, default=6, help="max friendships a user starts")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--chunk-users", type=int, default=LEAGUE_COHORT_SIZE * 200, help="users per worker task")
+    parser.add_argument("--batch-size", type=int, default=5000, help="documents per insert_many")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--drop", action="store_true", help="remove earlier synthetic data first")
+    args = parser.parse_args()
+
+    import bcrypt
+    import friend_graph
+
+    args.password_hash = bcrypt.hashpw(PASSWORD.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+    db = get_db()
+    if args.drop:
+        started = time.perf_counter()
+        drop_synthetic(db)
+        print(f"dropped earlier synthetic data in {time.perf_counter() - started:.1f}s")
+
+    # The unique edge index absorbs friendships picked twice
+    friend_graph.init_collections(db)
+    friend_graph.ensure_indexes()
+    lessons = load_lesson_ids(db)
+    now = datetime.utcnow()
+    # Chunks start on cohort boundaries so each league document is written by exactly one worker
+    chunk = max(LEAGUE_COHORT_SIZE, args.chunk_users - args.chunk_users % LEAGUE_COHORT_SIZE)
+    tasks = [(start, min(start + chunk, args.users), args, lessons, now) for start in range(0, args.users, chunk)]
+
+    started = time.perf_counter()
+    totals = {}
+    with Pool(args.workers) as pool:
+        for done, counts in enumerate(pool.imap_unordered(insert_chunk, tasks), 1):
+            for name, count in counts.items():
+                totals[name] = totals.get(name, 0) + count
+            print(f"\r{done}/{len(tasks)} chunks, {sum(totals.values()):,} documents", end="", flush=True)
+
+    elapsed = time.perf_counter() - started
+    print()
+    for name, count in sorted(totals.items()):
+        print(f"{name:<16} {count:>14,}")
+    print(f"{sum(totals.values()):,} documents in {elapsed:.1f}s ({sum(totals.values()) / elapsed:,.0f} docs/s)")
+
+
+if __name__ == "__main__":
+    main()
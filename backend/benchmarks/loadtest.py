@@ -0,0 +1,215 @@
+"""
+Scenario load test
+
+Simulates concurrent learners against a running API and reports per-endpoint
+p50/p95/p99 latency and overall req/s. Run it against a local mongod and the
+deterministic fake LLM so numbers only reflect our own code:
+
+    LLM_PROVIDER=fake uvicorn server:app --port 8001
+    python benchmarks/loadtest.py --users 50 --iterations 5 --output loadtest.json
+
+Each virtual user repeatedly runs: login -> skill tree -> lesson -> 6 exercise
+submits -> complete lesson -> practice session. Pass --baseline to compare with
+an earlier --output file; the run fails (exit 1) when an endpoint's p95 or the
+overall throughput regresses by more than --tolerance.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import sys
+import time
+import uuid
+from collections import defaultdict
+
+import httpx
+
+EXERCISES_PER_LESSON = 6
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    async def call(self, client: httpx.AsyncClient, label: str, method: str, url: str, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.errors[label] += 1
+            return None
+        self.latencies[label].append(time.perf_counter() - started)
+        if response.status_code >= 400:
+            self.errors[label] += 1
+            return None
+        return response.json()
+
+
+def percentile(sorted_values, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = max(math.ceil(pct / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[index]
+
+
+def summarize(recorder: Recorder, elapsed: float):
+    endpoints = {}
+    total = 0
+    for label in sorted(set(recorder.latencies) | set(recorder.errors)):
+        values = sorted(recorder.latencies[label])
+        total += len(values)
+        endpoints[label] = {
+            "count": len(values),
+            "errors": recorder.errors[label],
+            "p50_ms": round(percentile(values, 50) * 1000, 2),
+            "p95_ms": round(percentile(values, 95) * 1000, 2),
+            "p99_ms": round(percentile(values, 99) * 1000, 2),
+        }
+    return {
+        "elapsed_s": round(elapsed, 2),
+        "requests": total,
+        "requests_per_s": round(total / elapsed, 1) if elapsed else 0.0,
+        "endpoints": endpoints,
+    }
+
+
+def print_report(summary):
+    print(f"{'endpoint':<40} {'count':>7} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for label, stats in summary["endpoints"].items():
+        print(
+            f"{label:<40} {stats['count']:>7} {stats['errors']:>7} "
+            f"{stats['p50_ms']:>9.1f} {stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f}"
+        )
+    print(f"\n{summary['requests']} requests in {summary['elapsed_s']}s = {summary['requests_per_s']} req/s")
+
+
+def compare(summary, baseline, tolerance: float):
+    """Return human-readable regressions against a baseline summary"""
+    regressions = []
+    for label, stats in summary["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(label)
+        if before and before["p95_ms"] and stats["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{label}: p95 {before['p95_ms']}ms -> {stats['p95_ms']}ms")
+    if baseline.get("requests_per_s") and summary["requests_per_s"] < baseline["requests_per_s"] * (1 - tolerance):
+        regressions.append(f"throughput: {baseline['requests_per_s']} -> {summary['requests_per_s']} req/s")
+    return regressions
+
+
+def pick_answer(exercise: dict, rng: random.Random, error_rate: float) -> str:
+    if rng.random() < error_rate:
+        return "yanlış cevap"
+    return exercise.get("correct_answer") or ""
+
+
+async def seed_lessons(client: httpx.AsyncClient, headers, levels: int):
+    """Make sure lessons 1..levels exist (generated through the fake LLM) and return them"""
+    lessons = []
+    for level in range(1, levels + 1):
+        response = await client.post(
+            "/api/lessons/generate", json={"level": level, "topic": f"loadtest-{level}"}, headers=headers
+        )
+        response.raise_for_status()
+        lessons.append(response.json()["lesson"])
+    return lessons
+
+
+async def register_user(client: httpx.AsyncClient, run_id: str, index: int):
+    credentials = {
+        "username": f"lt_{run_id}_{index}",
+        "email": f"lt_{run_id}_{index}@example.com",
+        "password": "loadtest123",
+    }
+    response = await client.post("/api/auth/register", json=credentials)
+    response.raise_for_status()
+    return credentials
+
+
+async def learner(client, recorder: Recorder, credentials, lessons, iterations: int, error_rate: float, seed: int):
+    rng = random.Random(seed)
+    for iteration in range(iterations):
+        login = await recorder.call(
+            client, "POST /api/auth/login", "POST", "/api/auth/login",
+            json={"email": credentials["email"], "password": credentials["password"]},
+        )
+        if not login:
+            return
+        headers = {"Authorization": f"Bearer {login['token']}"}
+
+        await recorder.call(client, "GET /api/skill-tree", "GET", "/api/skill-tree", headers=headers)
+        lesson_id = lessons[(seed + iteration) % len(lessons)]["id"]
+        lesson = await recorder.call(
+            client, "GET /api/lessons/{lesson_id}", "GET", f"/api/lessons/{lesson_id}", headers=headers
+        )
+        if not lesson:
+            continue
+
+        correct = 0
+        for index, exercise in enumerate(lesson["exercises"][:EXERCISES_PER_LESSON]):
+            result = await recorder.call(
+                client, "POST /api/exercises/submit", "POST", "/api/exercises/submit", headers=headers,
+                json={"lesson_id": lesson_id, "exercise_index": index, "user_answer": pick_answer(exercise, rng, error_rate)},
+            )
+            correct += bool(result and result.get("correct"))
+
+        score = round(100 * correct / max(len(lesson["exercises"][:EXERCISES_PER_LESSON]), 1))
+        await recorder.call(
+            client, "POST /api/lessons/{lesson_id}/complete", "POST", f"/api/lessons/{lesson_id}/complete",
+            params={"score": score}, headers=headers,
+        )
+        await recorder.call(client, "POST /api/practice/session", "POST", "/api/practice/session", headers=headers)
+
+
+async def run(args):
+    limits = httpx.Limits(max_connections=args.users, max_keepalive_connections=args.users)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        run_id = uuid.uuid4().hex[:8]
+        users = await asyncio.gather(*(register_user(client, run_id, i) for i in range(args.users)))
+
+        login = (await client.post("/api/auth/login", json={"email": users[0]["email"], "password": users[0]["password"]})).json()
+        lessons = await seed_lessons(client, {"Authorization": f"Bearer {login['token']}"}, args.lessons)
+
+        recorder = Recorder()
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            learner(client, recorder, credentials, lessons, args.iterations, args.error_rate, seed=i)
+            for i, credentials in enumerate(users)
+        ))
+        return summarize(recorder, time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Romingo scenario load test")
+    parser.add_argument("--base-url", default="http://localhost:8001")
+    parser.add_argument("--users", type=int, default=20, help="concurrent virtual learners")
+    parser.add_argument("--iterations", type=int, default=3, help="scenario runs per learner")
+    parser.add_argument("--lessons", type=int, default=5, help="lesson levels to seed and rotate through")
+    parser.add_argument("--error-rate", type=float, default=0.2, help="share of deliberately wrong answers")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--output", help="write the summary as JSON")
+    parser.add_argument("--baseline", help="summary JSON from an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95 / throughput regression (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    summary = asyncio.run(run(args))
+    print_report(summary)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summary, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(summary, json.load(f), args.tolerance)
+        if regressions:
+            print("\nRegressions against baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("\nNo regressions against baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import gzip
+import hashlib
+import orjson
+from fastapi import Request, Response
+from cache import TTLCache
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+# Encoded, precompressed response bodies for content that rarely changes
+# (lessons, stories, the shop catalogue). Each entry is encoded and compressed
+# once when it is stored and then served as-is, with a strong ETag per
+# representation and 304s for conditional requests.
+
+MIN_COMPRESS_BYTES = 512
+
+def serialize_doc(doc):
+    """Convert MongoDB document to JSON-serializable dict (the document itself is left untouched)"""
+    if doc is None:
+        return None
+    data = {key: value for key, value in doc.items() if key != "_id"}
+    data["id"] = str(doc["_id"])
+    return data
+
+class ContentEntry:
+    def __init__(self, body: bytes, cache_control: str):
+        self.cache_control = cache_control
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        self.variants = {"identity": (body, f'"{digest}"')}
+        if len(body) >= MIN_COMPRESS_BYTES:
+            self.variants["gzip"] = (gzip.compress(body, compresslevel=9, mtime=0), f'"{digest}-gzip"')
+            if brotli is not None:
+                self.variants["br"] = (brotli.compress(body, quality=11), f'"{digest}-br"')
+        self.etags = {etag for _, etag in self.variants.values()}
+
+    def pick_encoding(self, accept_encoding: str) -> str:
+        accepted = set()
+        for token in accept_encoding.lower().split(","):
+            name, _, params = token.strip().partition(";")
+            weight = params.strip().removeprefix("q=")
+            try:
+                if name and (not weight or float(weight) > 0):
+                    accepted.add(name)
+            except ValueError:
+                accepted.add(name)
+        for encoding in ("br", "gzip"):
+            if encoding in self.variants and encoding in accepted:
+                return encoding
+        return "identity"
+
+    def matches(self, if_none_match: str) -> bool:
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == "*":
+            return True
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return not tags.isdisjoint(self.etags)
+
+class ContentStore:
+    def __init__(self, ttl_seconds: float = 24 * 3600, max_entries: int = 5000):
+        self._entries = TTLCache(ttl_seconds=ttl_seconds, max_entries=max_entries)
+
+    def get(self, key: str):
+        return self._entries.get(key)
+
+    def put(self, key: str, data, cache_control: str) -> ContentEntry:
+        entry = ContentEntry(orjson.dumps(data), cache_control)
+        self._entries.set(key, entry)
+        return entry
+
+    def invalidate(self, key: str):
+        self._entries.invalidate(key)
+
+    @property
+    def hits(self):
+        return self._entries.hits
+
+    @property
+    def misses(self):
+        return self._entries.misses
+
+def content_response(request: Request, entry: ContentEntry) -> Response:
+    """Serve a stored entry: 304 on a matching If-None-Match, else the best accepted encoding"""
+    encoding = entry.pick_encoding(request.headers.get("accept-encoding", ""))
+    body, etag = entry.variants[encoding]
+    headers = {"ETag": etag, "Cache-Control": entry.cache_control, "Vary": "Accept-Encoding"}
+
+    if entry.matches(request.headers.get("if-none-match", "")):
+        return Response(status_code=304, headers=headers)
+
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
+
+store = ContentStore()
@@ -2,8 +2,13 @@ from fastapi import HTTPException, Depends
 from fastapi.security import HTTPAuthorizationCredentials
 from datetime import datetime, timedelta
 from bson import ObjectId
+from pymongo import DESCENDING, ASCENDING, UpdateOne, ReturnDocument
+from pymongo.errors import DuplicateKeyError
 from typing import List, Dict
 import random
+from timeutils import as_datetime
+from league_ranks import LeagueRankIndex
+import xp_ledger
 
 # This will be imported from server.py
 users_collection = None
@@ -106,155 +111,351 @@ async def initialize_shop():
             "category": "consumable"
         },
     ]
+    # Upsert on the unique item_type: every worker runs this at startup
     for item in shop_items:
-        existing = shop_items_collection.find_one({"item_type": item["item_type"]})
-        if not existing:
-            shop_items_collection.insert_one(item)
+        shop_items_collection.update_one(
+            {"item_type": item["item_type"]},
+            {"$setOnInsert": item},
+            upsert=True
+        )
+
+def dedupe_shop_items():
+    """Delete duplicate shop rows (keeping the oldest per item_type) before item_type is made unique.
+
+    Startup seeding used to be find-then-insert, which could race between
+    workers. Returns the number of rows deleted.
+    """
+    duplicates = shop_items_collection.aggregate([
+        {"$sort": {"_id": 1}},
+        {"$group": {"_id": "$item_type", "ids": {"$push": "$_id"}}},
+        {"$match": {"ids.1": {"$exists": True}}},
+    ])
+    extra = [item_id for row in duplicates for item_id in row["ids"][1:]]
+    if extra:
+        shop_items_collection.delete_many({"_id": {"$in": extra}})
+    return len(extra)
 
 # Hearts system
+# Only (hearts, last_heart_refill) are stored; the refill since the anchor is
+# derived on read, so regenerating hearts never needs a write.
+HEART_REFILL_MINUTES = 30
+DEFAULT_MAX_HEARTS = 5
+
+def current_hearts(user, now: datetime = None) -> int:
+    """Hearts available right now: stored count plus one per 30 minutes since the anchor"""
+    now = now or datetime.utcnow()
+    max_hearts = user.get("max_hearts", DEFAULT_MAX_HEARTS)
+    hearts = user.get("hearts", max_hearts)
+    if hearts >= max_hearts:
+        return hearts
+    
+    anchor = as_datetime(user.get("last_heart_refill"), now)
+    refilled = int((now - anchor).total_seconds() // (HEART_REFILL_MINUTES * 60))
+    return min(max_hearts, hearts + max(refilled, 0))
+
 async def refill_hearts_if_needed(user):
-    """Refill one heart every 30 minutes"""
-    if user.get("hearts", 5) < user.get("max_hearts", 5):
-        last_refill = datetime.fromisoformat(user.get("last_heart_refill", datetime.utcnow().isoformat()))
-        now = datetime.utcnow()
-        time_diff = (now - last_refill).total_seconds() / 60  # minutes
-        
-        hearts_to_add = int(time_diff / 30)  # 1 heart per 30 minutes
-        if hearts_to_add > 0:
-            new_hearts = min(user["hearts"] + hearts_to_add, user.get("max_hearts", 5))
-            users_collection.update_one(
-                {"_id": user["_id"]},
-                {
-                    "$set": {
-                        "hearts": new_hearts,
-                        "last_heart_refill": now.isoformat()
-                    }
-                }
-            )
-            return new_hearts
-    return user.get("hearts", 5)
+    """Refill one heart every 30 minutes (computed on read)"""
+    return current_hearts(user)
 
 async def deduct_heart(user):
-    """Deduct a heart on wrong answer"""
-    if user.get("hearts", 0) <= 0:
-        return False
+    """Deduct a heart on wrong answer, or consume a mistake shield instead.
+
+    One conditional atomic update: it only matches while the user has a shield
+    or at least one (derived) heart, so concurrent wrong answers can never take
+    hearts below zero. Returns {"hearts", "shield_used"}, or None when out of hearts.
+    """
+    now = datetime.utcnow()
+    period_ms = HEART_REFILL_MINUTES * 60 * 1000
+    max_hearts = {"$ifNull": ["$max_hearts", DEFAULT_MAX_HEARTS]}
+    stored = {"$ifNull": ["$hearts", max_hearts]}
+    # $convert also parses legacy ISO strings (not yet converted by migrate-dates)
+    anchor = {"$convert": {"input": "$last_heart_refill", "to": "date", "onError": now, "onNull": now}}
+    refilled = {"$floor": {"$divide": [{"$subtract": [now, anchor]}, period_ms]}}
+    effective = {"$min": [max_hearts, {"$add": [stored, {"$max": [refilled, 0]}]}]}
+    shields = {"$ifNull": ["$mistake_shields", 0]}
+    has_shield = {"$gt": [shields, 0]}
     
-    users_collection.update_one(
-        {"_id": user["_id"]},
-        {"$inc": {"hearts": -1}}
+    before = users_collection.find_one_and_update(
+        {"_id": user["_id"], "$expr": {"$or": [has_shield, {"$gt": [effective, 0]}]}},
+        [
+            {"$set": {
+                "mistake_shields": {"$cond": [has_shield, {"$subtract": [shields, 1]}, shields]},
+                "hearts": {"$cond": [has_shield, stored, {"$subtract": [effective, 1]}]},
+                # Keep partial progress towards the next heart; a full bar starts the timer now
+                "last_heart_refill": {"$cond": [
+                    has_shield,
+                    anchor,
+                    {"$cond": [
+                        {"$gte": [effective, max_hearts]},
+                        now,
+                        {"$add": [anchor, {"$multiply": [{"$max": [refilled, 0]}, period_ms]}]}
+                    ]}
+                ]}
+            }}
+        ],
+        projection={"hearts": 1, "max_hearts": 1, "last_heart_refill": 1, "mistake_shields": 1},
+        return_document=ReturnDocument.BEFORE
     )
-    return True
+    if not before:
+        return None
+    
+    hearts_before = current_hearts(before, now)
+    if before.get("mistake_shields", 0) > 0:
+        return {"hearts": hearts_before, "shield_used": True}
+    return {"hearts": hearts_before - 1, "shield_used": False}
 
 # League system
 LEAGUE_TIERS = ["bronze", "silver", "gold", "sapphire", "ruby", "emerald", "diamond"]
 
+def current_week_key(now: datetime = None) -> str:
+    now = now or datetime.utcnow()
+    week_start = now - timedelta(days=now.weekday())
+    return week_start.strftime("%Y-W%W")
+
+STANDINGS_LIMIT = 20
+
+# Leagues are split into fixed-size cohorts per (tier, week)
+LEAGUE_COHORT_SIZE = 30
+PROMOTION_SLOTS = 7
+DEMOTION_SLOTS = 5
+
+league_index = LeagueRankIndex()
+
 async def update_league_standings(user_id: str):
-    """Update user's position in their league"""
+    """Join this week's league cohort. Returns the league id."""
     user = users_collection.find_one({"_id": ObjectId(user_id)})
     if not user:
-        return
-    
-    # Get current league
-    league = user.get("league", "bronze")
+        return None
     
-    # Get or create league for this week
-    week_start = datetime.utcnow() - timedelta(days=datetime.utcnow().weekday())
-    week_key = week_start.strftime("%Y-W%W")
+    week_key = current_week_key()
     
-    league_doc = leagues_collection.find_one({
-        "tier": league,
-        "week": week_key
-    })
+    # Already placed in a cohort this week
+    member = league_members_collection.find_one({"user_id": user_id, "week": week_key}, {"league_id": 1})
+    if member:
+        league_id = member["league_id"]
+    else:
+        league_id = _join_cohort(user, user.get("league", "bronze"), week_key)
     
-    if not league_doc:
-        # Create new league
-        league_doc = {
-            "tier": league,
-            "week": week_key,
-            "created_at": datetime.utcnow().isoformat()
-        }
-        leagues_collection.insert_one(league_doc)
-    
-    # Update or create member entry
-    member = league_members_collection.find_one({
-        "user_id": user_id,
-        "league_id": str(league_doc["_id"])
-    })
+    # Remember the membership so XP awards can skip the league lookup
+    users_collection.update_one(
+        {"_id": user["_id"]},
+        {"$set": {"league_id": league_id, "league_week": week_key}}
+    )
+    return league_id
+
+def _join_cohort(user, tier: str, week_key: str) -> str:
+    """Claim a seat in a (tier, week) cohort that still has room, creating one when all are full"""
+    user_id = str(user["_id"])
+    league_doc = leagues_collection.find_one_and_update(
+        {"tier": tier, "week": week_key, "member_count": {"$lt": LEAGUE_COHORT_SIZE}},
+        {"$inc": {"member_count": 1}, "$setOnInsert": {"created_at": datetime.utcnow()}},
+        projection={"_id": 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    league_id = str(league_doc["_id"])
     
-    if not member:
+    try:
         league_members_collection.insert_one({
             "user_id": user_id,
-            "league_id": str(league_doc["_id"]),
+            "league_id": league_id,
+            "username": user["username"],
+            "tier": tier,
+            "week": week_key,
             "xp_this_week": 0,
-            "joined_at": datetime.utcnow().isoformat()
+            "joined_at": datetime.utcnow()
         })
+    except DuplicateKeyError:
+        # A concurrent request placed this user first; give the seat back
+        leagues_collection.update_one({"_id": league_doc["_id"]}, {"$inc": {"member_count": -1}})
+        return league_members_collection.find_one({"user_id": user_id, "week": week_key})["league_id"]
+    
+    league_index.set_xp(league_id, user_id, 0, user["username"])
+    return league_id
 
-async def get_league_standings(user_id: str):
-    """Get current league standings"""
-    user = users_collection.find_one({"_id": ObjectId(user_id)})
-    if not user:
-        return []
+async def record_league_xp(user, xp_earned: int):
+    """Add XP to the user's weekly league total, joining this week's league if needed"""
+    user_id = str(user["_id"])
+    league_id = user.get("league_id")
+    if user.get("league_week") != current_week_key() or not league_id:
+        league_id = await update_league_standings(user_id)
+        if not league_id:
+            return
     
-    league = user.get("league", "bronze")
-    week_start = datetime.utcnow() - timedelta(days=datetime.utcnow().weekday())
-    week_key = week_start.strftime("%Y-W%W")
+    member = league_members_collection.find_one_and_update(
+        {"league_id": league_id, "user_id": user_id},
+        {"$inc": {"xp_this_week": xp_earned}},
+        projection={"xp_this_week": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    if member:
+        league_index.set_xp(league_id, user_id, member["xp_this_week"], user.get("username"))
+
+def _load_league(league_id: str):
+    """Load one league's members into the rank index"""
+    members = list(league_members_collection.find(
+        {"league_id": league_id},
+        {"user_id": 1, "username": 1, "xp_this_week": 1}
+    ))
+    _fill_missing_usernames(members)
+    league_index.load_league(league_id, members)
+
+def _current_league_id(user):
+    if user.get("league_week") == current_week_key() and user.get("league_id"):
+        return user["league_id"]
+    member = league_members_collection.find_one(
+        {"user_id": str(user["_id"]), "week": current_week_key()},
+        {"league_id": 1}
+    )
+    return member["league_id"] if member else None
+
+def _fill_missing_usernames(rows):
+    """Backfill usernames on membership rows written before they were denormalized"""
+    missing = [row for row in rows if not row.get("username")]
+    if not missing:
+        return
     
-    league_doc = leagues_collection.find_one({
-        "tier": league,
-        "week": week_key
-    })
+    users = users_collection.find(
+        {"_id": {"$in": [ObjectId(row["user_id"]) for row in missing]}},
+        {"username": 1}
+    )
+    usernames = {str(u["_id"]): u["username"] for u in users}
     
-    if not league_doc:
+    updates = []
+    for row in missing:
+        row["username"] = usernames.get(row["user_id"])
+        if row["username"]:
+            updates.append(UpdateOne({"_id": row["_id"]}, {"$set": {"username": row["username"]}}))
+    if updates:
+        league_members_collection.bulk_write(updates, ordered=False)
+
+async def get_league_standings(user):
+    """Get current league standings (top 20 plus the caller's own rank)"""
+    user_id = str(user["_id"])
+    league_id = _current_league_id(user)
+    if not league_id:
         return []
     
-    # Get all members and their weekly XP
-    members = list(league_members_collection.find({"league_id": str(league_doc["_id"])}))
+    if not league_index.is_fresh(league_id):
+        _load_league(league_id)
     
-    standings = []
-    for member in members:
-        member_user = users_collection.find_one({"_id": ObjectId(member["user_id"])})
-        if member_user:
-            standings.append({
-                "user_id": member["user_id"],
-                "username": member_user["username"],
-                "xp_this_week": member.get("xp_this_week", 0),
-                "is_current_user": member["user_id"] == user_id
-            })
+    standings = league_index.top(league_id, STANDINGS_LIMIT)
+    for standing in standings:
+        standing["is_current_user"] = standing["user_id"] == user_id
     
-    # Sort by XP
-    standings.sort(key=lambda x: x["xp_this_week"], reverse=True)
+    if not any(standing["is_current_user"] for standing in standings):
+        rank = league_index.rank(league_id, user_id)
+        if rank:
+            me = league_index.around(league_id, user_id, radius=0)[0]
+            me["is_current_user"] = True
+            standings.append(me)
+    
+    return standings
+
+async def get_league_neighbours(user, radius: int = 2):
+    """Members ranked just above and below the caller"""
+    user_id = str(user["_id"])
+    league_id = _current_league_id(user)
+    if not league_id:
+        return []
     
-    # Add ranks
-    for idx, standing in enumerate(standings):
-        standing["rank"] = idx + 1
+    if not league_index.is_fresh(league_id):
+        _load_league(league_id)
     
-    return standings[:20]  # Top 20
+    neighbours = league_index.around(league_id, user_id, radius)
+    for standing in neighbours:
+        standing["is_current_user"] = standing["user_id"] == user_id
+    return neighbours
 
-# Daily goal system
-async def update_daily_goal_progress(user, xp_earned: int):
-    """Update progress towards daily XP goal"""
-    today = datetime.utcnow().date()
-    last_login_date = datetime.fromisoformat(user.get("last_login", datetime.utcnow().isoformat())).date()
+def plan_cohort_rollover(tier: str, members):
+    """Decide tier moves for one finished cohort.
+
+    `members` must be sorted by xp_this_week descending. Returns a list of
+    (user_id, new_tier, final_rank). Only members who earned XP are promoted.
+    """
+    tier_index = LEAGUE_TIERS.index(tier) if tier in LEAGUE_TIERS else 0
+    can_promote = tier_index < len(LEAGUE_TIERS) - 1
+    can_demote = tier_index > 0
+    demotion_start = max(len(members) - DEMOTION_SLOTS, PROMOTION_SLOTS)
     
-    if today != last_login_date:
-        # Reset daily goal if new day
-        users_collection.update_one(
-            {"_id": user["_id"]},
-            {"$set": {"daily_goal_progress": 0}}
-        )
+    moves = []
+    for idx, member in enumerate(members):
+        new_tier = tier
+        if idx < PROMOTION_SLOTS and can_promote and member.get("xp_this_week", 0) > 0:
+            new_tier = LEAGUE_TIERS[tier_index + 1]
+        elif idx >= demotion_start and can_demote:
+            new_tier = LEAGUE_TIERS[tier_index - 1]
+        moves.append((member["user_id"], new_tier, idx + 1))
+    return moves
+
+def rollover_week(week_key: str, batch_size: int = 1000):
+    """Weekly job: promote/demote every cohort of a finished week with bulk writes.
+
+    Members are streamed in one pass sorted by (league_id, xp desc); each league is
+    marked rolled_over so re-running the job is a no-op. Returns the number of
+    members processed.
+    """
+    tiers = {
+        str(doc["_id"]): doc["tier"]
+        for doc in leagues_collection.find({"week": week_key, "rolled_over": {"$ne": True}}, {"tier": 1})
+    }
+    if not tiers:
+        return 0
     
-    users_collection.update_one(
-        {"_id": user["_id"]},
-        {"$inc": {"daily_goal_progress": xp_earned}}
-    )
+    user_ops, member_ops = [], []
+    processed = 0
+    
+    def flush(force=False):
+        if user_ops and (force or len(user_ops) >= batch_size):
+            users_collection.bulk_write(user_ops, ordered=False)
+            user_ops.clear()
+        if member_ops and (force or len(member_ops) >= batch_size):
+            league_members_collection.bulk_write(member_ops, ordered=False)
+            member_ops.clear()
+    
+    def finish_cohort(league_id, members):
+        for user_id, new_tier, rank in plan_cohort_rollover(tiers[league_id], members):
+            member_ops.append(UpdateOne(
+                {"league_id": league_id, "user_id": user_id},
+                {"$set": {"final_rank": rank, "next_tier": new_tier}}
+            ))
+            if new_tier != tiers[league_id]:
+                user_ops.append(UpdateOne({"_id": ObjectId(user_id)}, {"$set": {"league": new_tier}}))
+        flush()
+    
+    cursor = league_members_collection.find(
+        {"league_id": {"$in": list(tiers)}},
+        {"league_id": 1, "user_id": 1, "xp_this_week": 1}
+    ).sort([("league_id", ASCENDING), ("xp_this_week", DESCENDING)])
     
-    new_progress = user.get("daily_goal_progress", 0) + xp_earned
+    current_league, members = None, []
+    for member in cursor:
+        if member["league_id"] != current_league:
+            if members:
+                finish_cohort(current_league, members)
+            current_league, members = member["league_id"], []
+        members.append(member)
+        processed += 1
+    if members:
+        finish_cohort(current_league, members)
+    flush(force=True)
+    
+    leagues_collection.update_many(
+        {"_id": {"$in": [ObjectId(league_id) for league_id in tiers]}},
+        {"$set": {"rolled_over": True, "rolled_over_at": datetime.utcnow()}}
+    )
+    return processed
+
+# Daily goal system
+async def update_daily_goal_progress(user, xp_earned: int, source: str = "exercise"):
+    """Record XP in the ledger and report progress towards the daily XP goal"""
+    progress = xp_ledger.record_xp(str(user["_id"]), xp_earned, source)
     goal = user.get("daily_goal", 50)
     
     return {
-        "progress": new_progress,
+        "progress": progress,
         "goal": goal,
-        "completed": new_progress >= goal
+        "completed": progress >= goal
     }
 
 # Skill tree / Path system
@@ -262,31 +463,32 @@ async def get_skill_tree_lessons(user):
     """Get lessons organized as skill tree"""
     from server import user_progress_collection
     
-    all_lessons = list(lessons_collection.find().sort("level", 1))
+    all_lessons = list(lessons_collection.find({}, {"title": 1, "level": 1, "description": 1}).sort("level", 1))
     user_id = str(user["_id"])
+    progress_by_lesson = {
+        progress["lesson_id"]: progress
+        for progress in user_progress_collection.find(
+            {"user_id": user_id, "lesson_id": {"$exists": True}},
+            {"lesson_id": 1, "completed": 1, "score": 1}
+        )
+    }
+    lesson_ids_by_level = {}
+    for lesson in all_lessons:
+        lesson_ids_by_level.setdefault(lesson.get("level", 1), []).append(str(lesson["_id"]))
     
     tree = []
     for lesson in all_lessons:
         lesson_id = str(lesson["_id"])
         
-        # Check if lesson is unlocked (previous lessons completed)
+        # Unlocked once every lesson of the previous level is completed
         is_unlocked = True
         if lesson.get("level", 1) > 1:
-            # Check if previous level is completed
-            prev_level_lessons = lessons_collection.count_documents({"level": lesson["level"] - 1})
-            from server import user_progress_collection
-            completed_prev = user_progress_collection.count_documents({
-                "user_id": user_id,
-                "completed": True,
-                "lesson_id": {"$in": [str(l["_id"]) for l in lessons_collection.find({"level": lesson["level"] - 1})]}
-            })
-            is_unlocked = completed_prev >= prev_level_lessons
+            is_unlocked = all(
+                progress_by_lesson.get(prev_id, {}).get("completed", False)
+                for prev_id in lesson_ids_by_level.get(lesson["level"] - 1, [])
+            )
         
-        # Get lesson progress
-        progress = user_progress_collection.find_one({
-            "user_id": user_id,
-            "lesson_id": lesson_id
-        })
+        progress = progress_by_lesson.get(lesson_id)
         
         tree.append({
             "id": lesson_id,
@@ -311,12 +513,3 @@ async def generate_story_with_ai():
             {"type": "question", "text": "Ana ne sipariş ediyor?", "options": ["Kahve", "Çay", "Su"], "correct": 0}
         ]
     }
-
-def serialize_doc(doc):
-    """Convert MongoDB document to JSON-serializable dict"""
-    if doc is None:
-        return None
-    if "_id" in doc:
-        doc["id"] = str(doc["_id"])
-        del doc["_id"]
-    return doc
@@ -0,0 +1,82 @@
+"""
+Deterministic stand-in for emergentintegrations' LlmChat, for load tests and
+local runs without an LLM key. Enabled with LLM_PROVIDER=fake.
+
+Lessons are served from the generated_lesson_*.json fixtures (by level) and
+stories from a fixed template; FAKE_LLM_LATENCY_MS adds a constant delay so
+load tests still see realistic request overlap.
+"""
+
+import asyncio
+import json
+import os
+
+FAKE_LLM_LATENCY_MS = int(os.getenv("FAKE_LLM_LATENCY_MS", "0"))
+FIXTURE_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURE_LESSONS = 20
+
+class UserMessage:
+    def __init__(self, text: str):
+        self.text = text
+
+class LlmChat:
+    def __init__(self, api_key: str = None, session_id: str = "", system_message: str = ""):
+        self.session_id = session_id
+
+    def with_model(self, provider: str, model: str):
+        return self
+
+    async def send_message(self, message: UserMessage) -> str:
+        if FAKE_LLM_LATENCY_MS:
+            await asyncio.sleep(FAKE_LLM_LATENCY_MS / 1000)
+
+        kind, _, rest = self.session_id.partition("_gen_")
+        level = int(rest.split("_")[0] or 1)
+        if kind == "lesson":
+            return json.dumps(fixture_lesson(level), ensure_ascii=False)
+        return json.dumps(fixture_story(level), ensure_ascii=False)
+
+def fixture_lesson(level: int) -> dict:
+    fixture = (level - 1) % FIXTURE_LESSONS + 1
+    with open(os.path.join(FIXTURE_DIR, f"generated_lesson_{fixture}.json"), encoding="utf-8") as f:
+        lesson = json.load(f)
+    lesson.pop("id", None)
+    lesson.pop("created_at", None)
+    return lesson
+
+def fixture_story(level: int) -> dict:
+    return {
+        "title": f"Kafede Bir Gün ({level})",
+        "level": level,
+        "topic": "Kafe",
+        "parts": [
+            {
+                "text": "Ana intră în cafenea și spune: Bună ziua! (Ana kafeye girer ve 'İyi günler!' der.)",
+                "question": "Ana kafeye girince ne der?",
+                "options": ["Bună ziua!", "La revedere!", "Noapte bună!"],
+                "correct_answer": 0,
+                "explanation": "'Bună ziua!' gün içinde kullanılan selamdır.",
+            },
+            {
+                "text": "Ea comandă o cafea cu lapte. (Sütlü bir kahve sipariş eder.)",
+                "question": "Ana ne sipariş eder?",
+                "options": ["Ceai", "O cafea cu lapte", "Apă"],
+                "correct_answer": 1,
+                "explanation": "'O cafea cu lapte' sütlü kahve demektir.",
+            },
+            {
+                "text": "La final, Ana spune: Mulțumesc! (Sonunda Ana 'Teşekkürler!' der.)",
+                "question": "'Mulțumesc' ne demektir?",
+                "options": ["Lütfen", "Teşekkürler", "Özür dilerim"],
+                "correct_answer": 1,
+                "explanation": "'Mulțumesc' teşekkür etmek için kullanılır.",
+            },
+        ],
+        "vocabulary": [
+            {"romanian": "cafenea", "turkish": "kafe"},
+            {"romanian": "cafea", "turkish": "kahve"},
+            {"romanian": "lapte", "turkish": "süt"},
+            {"romanian": "mulțumesc", "turkish": "teşekkürler"},
+            {"romanian": "bună ziua", "turkish": "iyi günler"},
+        ],
+    }
@@ -0,0 +1,198 @@
+from collections import Counter
+from datetime import datetime
+from typing import List
+from bson import ObjectId
+from pymongo import UpdateOne, ReplaceOne
+
+# Friend graph stored as directed edge documents in the friends collection:
+#   {"user_id", "friend_id", "created_at"}
+# A friendship is two edges (one per direction) under a unique
+# (user_id, friend_id) index, so user documents stay fixed-size.
+
+friends_collection = None
+users_collection = None
+league_members_collection = None
+friend_suggestions_collection = None
+
+def init_collections(db):
+    """Initialize collections from main server"""
+    global friends_collection, users_collection, league_members_collection, friend_suggestions_collection
+
+    friends_collection = db.friends
+    users_collection = db.users
+    league_members_collection = db.league_members
+    friend_suggestions_collection = db.friend_suggestions
+
+def ensure_indexes():
+    friends_collection.create_index([("user_id", 1), ("friend_id", 1)], unique=True)
+    friend_suggestions_collection.create_index("user_id", unique=True)
+
+def get_friend_ids(user_id: str) -> List[str]:
+    return [edge["friend_id"] for edge in friends_collection.find({"user_id": user_id}, {"friend_id": 1, "_id": 0})]
+
+def are_friends(user_id: str, friend_id: str) -> bool:
+    return friends_collection.count_documents({"user_id": user_id, "friend_id": friend_id}, limit=1) > 0
+
+def _edge_upsert(user_id: str, friend_id: str, now: datetime):
+    return UpdateOne(
+        {"user_id": user_id, "friend_id": friend_id},
+        {"$setOnInsert": {"created_at": now}},
+        upsert=True
+    )
+
+def add_friendship(user_id: str, friend_id: str):
+    """Create both edges (idempotent)"""
+    now = datetime.utcnow()
+    friends_collection.bulk_write([
+        _edge_upsert(user_id, friend_id, now),
+        _edge_upsert(friend_id, user_id, now),
+    ], ordered=False)
+
+def remove_friendship(user_id: str, friend_id: str):
+    friends_collection.delete_many({"$or": [
+        {"user_id": user_id, "friend_id": friend_id},
+        {"user_id": friend_id, "friend_id": user_id},
+    ]})
+
+def migrate_embedded_friends(batch_size: int = 1000):
+    """Move users' embedded `friends` arrays into edge documents and unset the arrays.
+
+    Edges are upserted before the array is removed, so the job can be re-run
+    after an interruption. Returns the number of users migrated.
+    """
+    migrated = 0
+    edge_ops, user_ids = [], []
+    now = datetime.utcnow()
+
+    def flush():
+        if edge_ops:
+            friends_collection.bulk_write(edge_ops, ordered=False)
+            edge_ops.clear()
+        if user_ids:
+            users_collection.update_many({"_id": {"$in": user_ids}}, {"$unset": {"friends": ""}})
+            user_ids.clear()
+
+    for user in users_collection.find({"friends": {"$exists": True}}, {"friends": 1}, batch_size=batch_size):
+        user_id = str(user["_id"])
+        for friend_id in user.get("friends") or []:
+            if friend_id != user_id:
+                edge_ops.append(_edge_upsert(user_id, friend_id, now))
+                edge_ops.append(_edge_upsert(friend_id, user_id, now))
+        user_ids.append(user["_id"])
+        migrated += 1
+        if len(user_ids) >= batch_size:
+            flush()
+    flush()
+    return migrated
+
+# Friend suggestions, precomputed by a batch job (python jobs.py friend-suggestions)
+SUGGESTION_LIMIT = 20
+MUTUAL_FRIEND_WEIGHT = 3
+SAME_LEAGUE_WEIGHT = 2
+SIMILAR_LEVEL_WEIGHT = 1
+
+def get_friend_suggestions(user_id: str):
+    """Single read of the precomputed suggestions"""
+    doc = friend_suggestions_collection.find_one({"user_id": user_id}, {"suggestions": 1, "computed_at": 1})
+    if not doc:
+        return {"suggestions": [], "computed_at": None}
+    return {"suggestions": doc.get("suggestions", []), "computed_at": doc.get("computed_at")}
+
+def _score_candidates(user, friend_ids, friends_of_friend, cohort_members):
+    user_id = str(user["_id"])
+    excluded = set(friend_ids) | {user_id}
+
+    mutual = Counter()
+    for friend_id in friend_ids:
+        for candidate in friends_of_friend.get(friend_id, ()):
+            if candidate not in excluded:
+                mutual[candidate] += 1
+
+    same_league = {member for member in cohort_members if member not in excluded}
+    return mutual, same_league
+
+def rebuild_friend_suggestions(week_key: str, batch_size: int = 1000):
+    """Recompute friends-of-friends suggestions for every user.
+
+    Works through users in batches: each batch costs a fixed number of $in
+    reads (edges, second-degree edges, league cohorts, candidate profiles) and
+    one bulk write, never a per-user graph traversal. Returns users processed.
+    """
+    processed = 0
+    batch = []
+    for user in users_collection.find({}, {"level": 1, "league_id": 1, "league_week": 1}, batch_size=batch_size):
+        batch.append(user)
+        if len(batch) >= batch_size:
+            processed += _rebuild_suggestions_batch(batch, week_key)
+            batch = []
+    if batch:
+        processed += _rebuild_suggestions_batch(batch, week_key)
+    return processed
+
+def _rebuild_suggestions_batch(users, week_key: str):
+    user_ids = [str(user["_id"]) for user in users]
+
+    friends_of = {user_id: [] for user_id in user_ids}
+    for edge in friends_collection.find({"user_id": {"$in": user_ids}}, {"user_id": 1, "friend_id": 1}):
+        friends_of[edge["user_id"]].append(edge["friend_id"])
+
+    first_degree = list({friend_id for ids in friends_of.values() for friend_id in ids})
+    friends_of_friend = {}
+    for edge in friends_collection.find({"user_id": {"$in": first_degree}}, {"user_id": 1, "friend_id": 1}):
+        friends_of_friend.setdefault(edge["user_id"], []).append(edge["friend_id"])
+
+    league_ids = list({user["league_id"] for user in users if user.get("league_week") == week_key and user.get("league_id")})
+    cohorts = {}
+    for member in league_members_collection.find({"league_id": {"$in": league_ids}}, {"league_id": 1, "user_id": 1}):
+        cohorts.setdefault(member["league_id"], []).append(member["user_id"])
+
+    scored = {}
+    candidate_ids = set()
+    for user in users:
+        user_id = str(user["_id"])
+        cohort = cohorts.get(user.get("league_id"), []) if user.get("league_week") == week_key else []
+        mutual, same_league = _score_candidates(user, friends_of[user_id], friends_of_friend, cohort)
+        scored[user_id] = (mutual, same_league)
+        candidate_ids.update(mutual)
+        candidate_ids.update(same_league)
+
+    profiles = {
+        str(profile["_id"]): profile
+        for profile in users_collection.find(
+            {"_id": {"$in": [ObjectId(candidate) for candidate in candidate_ids]}},
+            {"username": 1, "level": 1}
+        )
+    }
+
+    now = datetime.utcnow()
+    operations = []
+    for user in users:
+        user_id = str(user["_id"])
+        mutual, same_league = scored[user_id]
+        suggestions = []
+        for candidate in set(mutual) | same_league:
+            profile = profiles.get(candidate)
+            if not profile:
+                continue
+            similar_level = abs(profile.get("level", 1) - user.get("level", 1)) <= 1
+            suggestions.append({
+                "user_id": candidate,
+                "username": profile["username"],
+                "level": profile.get("level", 1),
+                "mutual_friends": mutual.get(candidate, 0),
+                "same_league": candidate in same_league,
+                "score": (
+                    MUTUAL_FRIEND_WEIGHT * mutual.get(candidate, 0)
+                    + SAME_LEAGUE_WEIGHT * (candidate in same_league)
+                    + SIMILAR_LEVEL_WEIGHT * similar_level
+                ),
+            })
+        suggestions.sort(key=lambda item: (-item["score"], item["username"]))
+        operations.append(ReplaceOne(
+            {"user_id": user_id},
+            {"user_id": user_id, "suggestions": suggestions[:SUGGESTION_LIMIT], "computed_at": now},
+            upsert=True
+        ))
+
+    friend_suggestions_collection.bulk_write(operations, ordered=False)
+    return len(operations)
@@ -0,0 +1,51 @@
+import difflib
+
+# Answer grading for exercise submissions.
+# Pure functions (no database access), so the per-answer hot path can be
+# benchmarked on its own: see benchmarks/bench_grading.py.
+
+PRONUNCIATION_PASS_SIMILARITY = 0.78
+
+def normalize_text(text: str) -> str:
+    return " ".join((text or "").lower().strip().split())
+
+def get_text_similarity(user_answer: str, correct_answer: str) -> float:
+    return difflib.SequenceMatcher(None, normalize_text(user_answer), normalize_text(correct_answer)).ratio()
+
+def detect_error_type(exercise: dict) -> str:
+    exercise_type = exercise.get("type")
+    if exercise_type in ["speaking", "listening"]:
+        return f"{exercise_type}_accuracy"
+    if exercise_type in ["translation", "sentence_complete"]:
+        return "grammar"
+    if exercise_type in ["word_match", "multiple_choice"]:
+        return "vocabulary"
+    return "general"
+
+def grade_answer(exercise: dict, user_answer: str) -> dict:
+    """Grade one answer. Returns the normalized answer, correctness, similarity and feedback details."""
+    correct_answer = normalize_text(exercise.get("correct_answer", ""))
+    user_answer = normalize_text(user_answer)
+
+    # Both sides are already normalized, so compare them directly
+    similarity = difflib.SequenceMatcher(None, user_answer, correct_answer).ratio()
+    feedback_details = {}
+    if exercise.get("type") == "translation":
+        # Check acceptable answers for translation
+        acceptable = [correct_answer] + [normalize_text(ans) for ans in exercise.get("acceptable_answers", [])]
+        is_correct = user_answer in acceptable
+        feedback_details["similarity"] = round(similarity * 100)
+    elif exercise.get("type") in ["speaking", "listening"]:
+        pronunciation_score = int(similarity * 100)
+        is_correct = similarity >= PRONUNCIATION_PASS_SIMILARITY
+        feedback_details["pronunciation_score"] = pronunciation_score
+        feedback_details["evaluation"] = "good" if pronunciation_score >= 90 else "okay" if pronunciation_score >= 78 else "needs_practice"
+    else:
+        is_correct = user_answer == correct_answer
+
+    return {
+        "user_answer": user_answer,
+        "is_correct": is_correct,
+        "similarity": similarity,
+        "feedback_details": feedback_details,
+    }
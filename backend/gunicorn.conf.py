@@ -0,0 +1,64 @@
+"""
+Production profile: gunicorn managing one uvicorn worker per core
+
+    gunicorn -c gunicorn.conf.py server:app
+
+Every worker is an independent process with its own event loop, MongoClient
+and in-process caches, so throughput grows with WEB_CONCURRENCY up to the
+core count as long as MongoDB keeps up. Sizing:
+
+- WEB_CONCURRENCY (default: CPU count). Routes run pymongo synchronously on the
+  event loop, so more workers than cores only adds context switching.
+- MONGO_MAX_POOL_SIZE (default 10) is per worker: a replica opens at most
+  WEB_CONCURRENCY x MONGO_MAX_POOL_SIZE connections, and MONGO_MIN_POOL_SIZE of
+  them stay warm. Keep replicas x that product under the server's connection limit.
+- MONGO_COMPRESSORS (default "zstd,zlib"), MONGO_SERVER_SELECTION_TIMEOUT_MS,
+  MONGO_CONNECT_TIMEOUT_MS and MONGO_SOCKET_TIMEOUT_MS tune the rest of the client.
+
+Fork safety: server.py is imported once in the master (preload_app), but the
+MongoClient is only created in the app's lifespan, which runs inside each
+worker after the fork. Index creation and shop seeding run per worker and are
+idempotent.
+
+In-process state is per worker: the leaderboard snapshot, league rank index
+(leagues loaded on first read, reloaded from Mongo after 30s, dropped after
+10 idle minutes), content store and friends leaderboard cache.
+Prometheus samples from all workers are merged through PROMETHEUS_MULTIPROC_DIR
+(set below, cleared at startup); per-process cache hit counters are not exported
+in this mode.
+
+For a single process (development): uvicorn server:app --port 8001
+"""
+
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+bind = os.getenv("BIND", "0.0.0.0:8001")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+
+# Lesson and story generation await the LLM for up to a minute
+timeout = int(os.getenv("WORKER_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers now and then; jitter keeps them from restarting together
+max_requests = int(os.getenv("MAX_REQUESTS", "20000"))
+max_requests_jitter = max_requests // 10
+
+# prometheus_client picks its value store when it is imported, i.e. before the app is loaded
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "romingo-prometheus"))
+
+def on_starting(server):
+    # Files left by a previous run would be merged into /metrics
+    directory = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,179 @@
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+from timeutils import as_datetime
+
+# Shop purchases and owned items.
+# A purchase is a single conditional update on the user ({"gems": {"$gte": price}}),
+# so concurrent buys can never overspend. Effects that live on the user
+# document (hearts, shields, freezes, timed power-ups) are applied in that same
+# update; countable items are per-(user, item_type) counters in user_inventory:
+#   {"_id": "<user_id>:<item_type>", "user_id", "item_type", "quantity"}
+# Timed power-ups are kept on the user as {"active_effects": {item_type: active_until}},
+# so reading them costs no extra query.
+
+POWER_UP_MINUTES = 15
+XP_BOOST_MULTIPLIER = 2
+TIMED_EFFECTS = ("xp_boost", "timer_boost")
+COUNTED_ITEMS = ("hint_token", "level_skip", "bonus_lesson")
+# Items counted on the user document instead (item_type -> users field)
+USER_COUNTERS = {"streak_freeze": "streak_freezes", "mistake_shield": "mistake_shields"}
+
+users_collection = None
+user_inventory_collection = None
+
+def init_collections(db):
+    """Initialize collections from main server"""
+    global users_collection, user_inventory_collection
+
+    users_collection = db.users
+    user_inventory_collection = db.user_inventory
+
+def ensure_indexes():
+    user_inventory_collection.create_index("user_id")
+
+def counter_id(user_id: str, item_type: str) -> str:
+    return f"{user_id}:{item_type}"
+
+def active_until(user: dict, effect: str, now: datetime = None):
+    """Expiry of a timed power-up on an already loaded user document, or None"""
+    now = now or datetime.utcnow()
+    until = user.get("active_effects", {}).get(effect)
+    return until if until and until > now else None
+
+def effective_xp_multiplier(user: dict, now: datetime = None) -> int:
+    """XP multiplier from the user's active power-ups (no query: reads the loaded document)"""
+    return XP_BOOST_MULTIPLIER if active_until(user, "xp_boost", now) else 1
+
+def purchase_update(user: dict, item_type: str, now: datetime) -> dict:
+    """User-document update applying an item's effect (gems are added by purchase_item)"""
+    if item_type == "heart_refill":
+        return {"$set": {"hearts": user.get("max_hearts", 5), "last_heart_refill": now}}
+    if item_type == "streak_freeze":
+        # Consumed by the nightly streaks job
+        return {"$inc": {"streak_freezes": 1}}
+    if item_type == "heart_increase":
+        return {"$inc": {"max_hearts": 1}}
+    if item_type == "mistake_shield":
+        # Consumed atomically by deduct_heart
+        return {"$inc": {"mistake_shields": 1}}
+    if item_type in TIMED_EFFECTS:
+        # Buying again while active extends the running power-up
+        start = active_until(user, item_type, now) or now
+        return {"$set": {f"active_effects.{item_type}": start + timedelta(minutes=POWER_UP_MINUTES)}}
+    return {}
+
+def purchase_item(user: dict, item: dict, now: datetime = None):
+    """Charge the item's price and apply it. Returns the updated gem balance, or None if unaffordable."""
+    now = now or datetime.utcnow()
+    price = item["price"]
+
+    update = purchase_update(user, item["item_type"], now)
+    update.setdefault("$inc", {})["gems"] = -price
+
+    updated = users_collection.find_one_and_update(
+        {"_id": user["_id"], "gems": {"$gte": price}},
+        update,
+        projection={"gems": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    if updated is None:
+        return None
+
+    if item["item_type"] in COUNTED_ITEMS:
+        add_item(str(user["_id"]), item["item_type"], 1, now)
+    return updated["gems"]
+
+def add_item(user_id: str, item_type: str, quantity: int = 1, now: datetime = None):
+    user_inventory_collection.update_one(
+        {"_id": counter_id(user_id, item_type)},
+        {
+            "$inc": {"quantity": quantity},
+            "$set": {"user_id": user_id, "item_type": item_type, "updated_at": now or datetime.utcnow()}
+        },
+        upsert=True
+    )
+
+def get_inventory(user: dict, now: datetime = None):
+    """Owned items and running power-ups for the inventory screen"""
+    now = now or datetime.utcnow()
+    user_id = str(user["_id"])
+    effects = {effect: active_until(user, effect, now) for effect in TIMED_EFFECTS if active_until(user, effect, now)}
+    items = {}
+    # Until migrate_inventory has run, legacy per-purchase rows (no quantity) sit next to the counters
+    for row in user_inventory_collection.find({"user_id": user_id}, {"item_type": 1, "quantity": 1, "active_until": 1}):
+        item_type = row["item_type"]
+        if item_type in TIMED_EFFECTS:
+            until = as_datetime(row.get("active_until"))
+            if until and until > now and until > effects.get(item_type, now):
+                effects[item_type] = until
+        elif item_type not in USER_COUNTERS:
+            items[item_type] = items.get(item_type, 0) + row.get("quantity", 1)
+    items = {item_type: quantity for item_type, quantity in items.items() if quantity > 0}
+    # Only the user counters can be spent, so unmigrated rows of these items are not listed
+    for item_type, field in USER_COUNTERS.items():
+        if user.get(field, 0) > 0:
+            items[item_type] = user[field]
+
+    return {"items": items, "active_effects": effects}
+
+def migrate_inventory(batch_size: int = 1000, now: datetime = None) -> int:
+    """Fold legacy one-row-per-purchase inventory into counters and active_effects.
+
+    Legacy rows are the ones with an ObjectId _id. mistake_shield rows are added
+    to users.mistake_shields; streak_freeze rows are handled by the
+    streaks-migrate-freezes job. Returns the number of rows folded.
+    """
+    from bson import ObjectId
+    from pymongo import UpdateOne
+
+    now = now or datetime.utcnow()
+    legacy = {"_id": {"$type": "objectId"}, "item_type": {"$in": [*COUNTED_ITEMS, *TIMED_EFFECTS, "mistake_shield"]}}
+    rows = user_inventory_collection.aggregate([
+        {"$match": legacy},
+        {"$group": {
+            "_id": {"user_id": "$user_id", "item_type": "$item_type"},
+            "quantity": {"$sum": {"$ifNull": ["$quantity", 1]}},
+            # Legacy rows may hold ISO strings, which BSON orders below dates: compare in Python
+            "active_until": {"$addToSet": "$active_until"},
+            "rows": {"$sum": 1},
+        }},
+    ], allowDiskUse=True)
+
+    folded = 0
+    counter_ops = []
+    user_ops = []
+
+    def flush():
+        if counter_ops:
+            user_inventory_collection.bulk_write(counter_ops, ordered=False)
+            counter_ops.clear()
+        if user_ops:
+            users_collection.bulk_write(user_ops, ordered=False)
+            user_ops.clear()
+
+    for row in rows:
+        user_id, item_type = row["_id"]["user_id"], row["_id"]["item_type"]
+        folded += row["rows"]
+        until = max(filter(None, map(as_datetime, row.get("active_until", []))), default=None)
+        if item_type in COUNTED_ITEMS:
+            counter_ops.append(UpdateOne(
+                {"_id": counter_id(user_id, item_type)},
+                {"$inc": {"quantity": row["quantity"]}, "$set": {"user_id": user_id, "item_type": item_type, "updated_at": now}},
+                upsert=True
+            ))
+        elif item_type == "mistake_shield":
+            user_ops.append(UpdateOne(
+                {"_id": ObjectId(user_id)},
+                {"$inc": {USER_COUNTERS[item_type]: row["quantity"]}}
+            ))
+        elif until and until > now:
+            user_ops.append(UpdateOne(
+                {"_id": ObjectId(user_id)},
+                {"$max": {f"active_effects.{item_type}": until}}
+            ))
+        if len(counter_ops) + len(user_ops) >= batch_size:
+            flush()
+    flush()
+
+    user_inventory_collection.delete_many(legacy)
+    return folded
@@ -0,0 +1,131 @@
+"""
+Romingo maintenance jobs
+
+Run from the backend directory, e.g. from a nightly cron entry:
+    python jobs.py srs-migrate
+    python jobs.py migrate-dates
+    python jobs.py review-stats-rebuild
+    python jobs.py league-rollover [--week 2026-W41]
+    python jobs.py friends-migrate
+    python jobs.py friend-suggestions
+    python jobs.py streaks-migrate-activity
+    python jobs.py streaks-nightly
+    python jobs.py streaks-migrate-freezes
+    python jobs.py inventory-migrate
+    python jobs.py achievements-backfill
+"""
+
+import argparse
+import os
+import time
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from pymongo import MongoClient
+
+import achievements
+import duolingo_features
+import friend_graph
+import inventory
+import review_stats
+import srs
+import streaks
+import timeutils
+
+load_dotenv()
+
+def get_db():
+    client = MongoClient(os.getenv("MONGO_URL"))
+    return client[os.getenv("DB_NAME")]
+
+def run_srs_migrate(db, args):
+    """One-off: derive SM-2 state for mistakes tracked by the old fixed schedule, then the due counters"""
+    migrated = srs.migrate_legacy_mistakes(db.user_mistakes, batch_size=args.batch_size)
+    run_review_stats_rebuild(db, args)
+    return migrated
+
+def run_review_stats_rebuild(db, args):
+    """Recompute per-user SRS counters from user_mistakes"""
+    review_stats.init_collections(db)
+    return review_stats.rebuild_review_stats(batch_size=args.batch_size)
+
+def run_migrate_dates(db, args):
+    """Convert legacy ISO string timestamps to native BSON dates"""
+    return timeutils.migrate_date_fields(db, batch_size=args.batch_size)
+
+def run_league_rollover(db, args):
+    """Promote/demote every cohort of a finished league week (default: last week)"""
+    duolingo_features.init_collections(db)
+    week = args.week or duolingo_features.current_week_key(datetime.utcnow() - timedelta(days=7))
+    return duolingo_features.rollover_week(week, batch_size=args.batch_size)
+
+def run_friends_migrate(db, args):
+    """Move embedded users.friends arrays into friends edge documents"""
+    friend_graph.init_collections(db)
+    friend_graph.ensure_indexes()
+    return friend_graph.migrate_embedded_friends(batch_size=args.batch_size)
+
+def run_friend_suggestions(db, args):
+    """Recompute the friends-of-friends suggestion index"""
+    friend_graph.init_collections(db)
+    friend_graph.ensure_indexes()
+    return friend_graph.rebuild_friend_suggestions(duolingo_features.current_week_key(), batch_size=args.batch_size)
+
+def run_streaks_nightly(db, args):
+    """Reset broken streaks, spend streak freezes and precompute today's streak-at-risk list"""
+    streaks.init_collections(db)
+    streaks.ensure_indexes()
+    # Legacy users are skipped by the reset until they have a last_activity_day
+    counts = {"migrated": streaks.migrate_activity_days(batch_size=args.batch_size)}
+    counts.update(streaks.run_nightly_maintenance(batch_size=args.batch_size))
+    print(f"streaks-nightly: {counts}")
+    return sum(counts.values())
+
+def run_streaks_migrate_activity(db, args):
+    """Derive users.last_activity_day from the XP ledger and last login (also run by streaks-nightly)"""
+    streaks.init_collections(db)
+    return streaks.migrate_activity_days(batch_size=args.batch_size)
+
+def run_streaks_migrate_freezes(db, args):
+    """Move streak_freeze inventory rows into the users.streak_freezes counter"""
+    streaks.init_collections(db)
+    return streaks.migrate_streak_freezes(batch_size=args.batch_size)
+
+def run_inventory_migrate(db, args):
+    """Fold per-purchase inventory rows into counters, users.mistake_shields and users.active_effects"""
+    inventory.init_collections(db)
+    return inventory.migrate_inventory(batch_size=args.batch_size)
+
+def run_achievements_backfill(db, args):
+    """Derive users.badges_mask and total_lessons_completed from existing documents"""
+    achievements.init_collections(db)
+    return achievements.backfill_badges(batch_size=args.batch_size)
+
+JOBS = {
+    "srs-migrate": run_srs_migrate,
+    "migrate-dates": run_migrate_dates,
+    "review-stats-rebuild": run_review_stats_rebuild,
+    "league-rollover": run_league_rollover,
+    "friends-migrate": run_friends_migrate,
+    "friend-suggestions": run_friend_suggestions,
+    "streaks-migrate-activity": run_streaks_migrate_activity,
+    "streaks-nightly": run_streaks_nightly,
+    "streaks-migrate-freezes": run_streaks_migrate_freezes,
+    "inventory-migrate": run_inventory_migrate,
+    "achievements-backfill": run_achievements_backfill,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="Romingo maintenance jobs")
+    parser.add_argument("job", choices=sorted(JOBS))
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--week", help="league week key for league-rollover, e.g. 2026-W41")
+    args = parser.parse_args()
+
+    db = get_db()
+    started = time.perf_counter()
+    processed = JOBS[args.job](db, args)
+    elapsed = time.perf_counter() - started
+    print(f"{args.job}: {processed} documents in {elapsed:.1f}s")
+
+if __name__ == "__main__":
+    main()
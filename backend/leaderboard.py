@@ -0,0 +1,183 @@
+import asyncio
+import bisect
+from datetime import datetime, timedelta
+from pymongo.errors import DuplicateKeyError
+
+# Global XP leaderboard served from memory.
+# The top-K users and an XP histogram (Fenwick tree over fixed-width XP
+# buckets) are computed by one process per refresh interval, whichever wins
+# the lease on the shared leaderboard_snapshots document, and stored there;
+# every worker loads that document when it changes. XP awarded in this
+# process is applied to the loaded snapshot right away, so reads never touch
+# the users collection.
+
+LEADERBOARD_TOP_K = 1000
+LEADERBOARD_PAGE_LIMIT = 100
+LEADERBOARD_REFRESH_SECONDS = 60
+XP_BUCKET_SIZE = 10
+SNAPSHOT_ID = "global"
+
+users_collection = None
+leaderboard_snapshots_collection = None
+
+def init_collections(db):
+    """Initialize collections from main server"""
+    global users_collection, leaderboard_snapshots_collection
+    users_collection = db.users
+    leaderboard_snapshots_collection = db.leaderboard_snapshots
+
+class FenwickTree:
+    """Binary indexed tree over bucket counts: O(log n) point update and prefix sum"""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._tree = [0] * (size + 1)
+
+    def add(self, index: int, delta: int):
+        index += 1
+        while index <= self.size:
+            self._tree[index] += delta
+            index += index & -index
+
+    def prefix_sum(self, index: int) -> int:
+        """Sum of buckets [0, index]"""
+        index = min(index, self.size - 1) + 1
+        total = 0
+        while index > 0:
+            total += self._tree[index]
+            index -= index & -index
+        return total
+
+def leaderboard_entry(user: dict, xp: int = None) -> dict:
+    return {
+        "id": str(user["_id"]),
+        "username": user.get("username"),
+        "xp": user.get("xp", 0) if xp is None else xp,
+        "level": user.get("level", 1),
+        "streak": user.get("streak", 0),
+    }
+
+class LeaderboardSnapshot:
+    def __init__(self, entries, bucket_counts, refreshed_at: datetime = None):
+        # Top users ordered by (xp desc, id asc); _keys mirrors it for bisect
+        self.entries = list(entries)
+        self._keys = [(-entry["xp"], entry["id"]) for entry in self.entries]
+        self._xp_by_id = {entry["id"]: entry["xp"] for entry in self.entries}
+
+        max_bucket = max(bucket_counts, default=0)
+        self.histogram = FenwickTree(max_bucket + 2)
+        for bucket, count in bucket_counts.items():
+            self.histogram.add(bucket, count)
+        self.total_users = sum(bucket_counts.values())
+        self.refreshed_at = refreshed_at or datetime.utcnow()
+
+    def page(self, limit: int, after_xp: int = None, after_id: str = None):
+        """Keyset pagination on (xp desc, id asc)"""
+        start = 0
+        if after_xp is not None:
+            start = bisect.bisect_right(self._keys, (-after_xp, after_id or ""))
+        return [
+            {"rank": start + offset + 1, **entry}
+            for offset, entry in enumerate(self.entries[start:start + limit])
+        ]
+
+    def rank_for_xp(self, xp: int):
+        """Rank of a user with `xp` XP. Exact inside the top-K, bucket-accurate below it."""
+        if self.entries and xp >= self.entries[-1]["xp"]:
+            return bisect.bisect_left(self._keys, (-xp, "")) + 1, True
+        bucket = xp // XP_BUCKET_SIZE
+        users_at_or_below = self.histogram.prefix_sum(bucket)
+        return max(self.total_users - users_at_or_below, len(self.entries)) + 1, False
+
+    def record_xp_change(self, user: dict, old_xp: int, new_xp: int):
+        """Apply an XP award between refreshes: histogram buckets and the user's top-K entry"""
+        old_bucket, new_bucket = old_xp // XP_BUCKET_SIZE, new_xp // XP_BUCKET_SIZE
+        if old_bucket != new_bucket and new_bucket < self.histogram.size:
+            self.histogram.add(old_bucket, -1)
+            self.histogram.add(new_bucket, 1)
+
+        # Located by id: the snapshot may hold an older XP value than old_xp
+        user_id = str(user["_id"])
+        if user_id in self._xp_by_id:
+            index = bisect.bisect_left(self._keys, (-self._xp_by_id.pop(user_id), user_id))
+            del self._keys[index], self.entries[index]
+        elif len(self.entries) >= LEADERBOARD_TOP_K and (-new_xp, user_id) > self._keys[-1]:
+            return
+
+        index = bisect.bisect_left(self._keys, (-new_xp, user_id))
+        self._keys.insert(index, (-new_xp, user_id))
+        self.entries.insert(index, leaderboard_entry(user, new_xp))
+        self._xp_by_id[user_id] = new_xp
+        if len(self.entries) > LEADERBOARD_TOP_K:
+            del self._xp_by_id[self._keys[-1][1]], self._keys[-1], self.entries[-1]
+
+_snapshot = None
+
+def compute_leaderboard():
+    """Top-K entries and XP bucket counts: one sorted/limited find plus one histogram aggregation"""
+    top_users = users_collection.find(
+        {},
+        {"username": 1, "xp": 1, "level": 1, "streak": 1}
+    ).sort([("xp", -1), ("_id", 1)]).limit(LEADERBOARD_TOP_K)
+
+    buckets = users_collection.aggregate([
+        {"$group": {
+            "_id": {"$floor": {"$divide": [{"$ifNull": ["$xp", 0]}, XP_BUCKET_SIZE]}},
+            "count": {"$sum": 1},
+        }}
+    ])
+    return [leaderboard_entry(user) for user in top_users], {int(row["_id"]): row["count"] for row in buckets}
+
+def claim_refresh(now: datetime, interval: float) -> bool:
+    """Take the refresh lease for this interval; False when another process holds it"""
+    try:
+        leaderboard_snapshots_collection.update_one(
+            {"_id": SNAPSHOT_ID, "$or": [{"lease_until": {"$lte": now}}, {"lease_until": {"$exists": False}}]},
+            {"$set": {"lease_until": now + timedelta(seconds=interval)}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        return False
+    return True
+
+def refresh_leaderboard(interval: float = LEADERBOARD_REFRESH_SECONDS):
+    """Recompute the shared snapshot if the lease is free, then load it if it changed"""
+    global _snapshot
+    now = datetime.utcnow()
+    if claim_refresh(now, interval):
+        entries, bucket_counts = compute_leaderboard()
+        leaderboard_snapshots_collection.update_one(
+            {"_id": SNAPSHOT_ID},
+            {"$set": {
+                "entries": entries,
+                "buckets": [[bucket, count] for bucket, count in bucket_counts.items()],
+                "refreshed_at": now,
+            }}
+        )
+
+    query = {"_id": SNAPSHOT_ID, "refreshed_at": {"$exists": True}}
+    if _snapshot is not None:
+        query["refreshed_at"] = {"$gt": _snapshot.refreshed_at}
+    doc = leaderboard_snapshots_collection.find_one(query)
+    if doc:
+        _snapshot = LeaderboardSnapshot(doc["entries"], dict(doc["buckets"]), doc["refreshed_at"])
+    elif _snapshot is None:
+        # Another process holds the lease but has not stored a snapshot yet
+        _snapshot = LeaderboardSnapshot(*compute_leaderboard())
+    return _snapshot
+
+def get_snapshot():
+    return _snapshot or refresh_leaderboard()
+
+def record_xp_change(user: dict, old_xp: int, new_xp: int):
+    if _snapshot is not None:
+        _snapshot.record_xp_change(user, old_xp, new_xp)
+
+async def refresh_periodically(interval: float = LEADERBOARD_REFRESH_SECONDS):
+    """Background task started with the app (in every worker; only the lease holder aggregates)"""
+    while True:
+        try:
+            await asyncio.to_thread(refresh_leaderboard, interval)
+        except Exception as e:
+            print(f"Leaderboard refresh failed: {e}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,111 @@
+import time
+from sortedcontainers import SortedList
+
+class LeagueRankIndex:
+    """In-memory order-statistics index of weekly league XP.
+
+    Each league keeps a SortedList of (-xp, user_id), so updating a member's XP,
+    looking up a rank and reading the members around a rank are all O(log n).
+    Mongo stays the source of truth: leagues are (re)loaded from league_members
+    when missing or older than max_age_seconds, which also bounds how stale a
+    worker can be when several processes write XP. Leagues nobody has read for
+    evict_after_seconds (e.g. last week's) are dropped, so memory follows the
+    leagues in use rather than every league ever loaded.
+    """
+
+    def __init__(self, max_age_seconds: float = 30, evict_after_seconds: float = 600):
+        self.max_age_seconds = max_age_seconds
+        self.evict_after_seconds = evict_after_seconds
+        self._entries = {}  # league_id -> SortedList[(-xp, user_id)]
+        self._xp = {}  # league_id -> {user_id: xp}
+        self._usernames = {}  # league_id -> {user_id: username}
+        self._loaded_at = {}  # league_id -> monotonic load time
+        self._swept_at = time.monotonic()
+
+    def clear(self):
+        self._entries.clear()
+        self._xp.clear()
+        self._usernames.clear()
+        self._loaded_at.clear()
+
+    def load_league(self, league_id: str, members):
+        """Replace a league's entries with membership rows read from Mongo"""
+        xp_by_user = {}
+        usernames = {}
+        for member in members:
+            xp_by_user[member["user_id"]] = member.get("xp_this_week", 0)
+            if member.get("username"):
+                usernames[member["user_id"]] = member["username"]
+
+        now = time.monotonic()
+        self._xp[league_id] = xp_by_user
+        self._usernames[league_id] = usernames
+        self._entries[league_id] = SortedList((-xp, user_id) for user_id, xp in xp_by_user.items())
+        self._loaded_at[league_id] = now
+        if now - self._swept_at >= self.max_age_seconds:
+            self.evict_idle(now)
+
+    def evict_idle(self, now: float = None) -> int:
+        """Drop leagues not (re)loaded for evict_after_seconds. Returns how many were dropped."""
+        now = time.monotonic() if now is None else now
+        self._swept_at = now
+        idle = [league_id for league_id, loaded_at in self._loaded_at.items() if now - loaded_at >= self.evict_after_seconds]
+        for league_id in idle:
+            del self._entries[league_id], self._xp[league_id], self._usernames[league_id], self._loaded_at[league_id]
+        return len(idle)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def is_fresh(self, league_id: str) -> bool:
+        loaded_at = self._loaded_at.get(league_id)
+        return loaded_at is not None and time.monotonic() - loaded_at < self.max_age_seconds
+
+    def set_xp(self, league_id: str, user_id: str, xp: int, username: str = None):
+        """Record a member's current weekly XP (absolute value, as returned by Mongo)"""
+        if league_id not in self._entries:
+            return
+        if username:
+            self._usernames[league_id][user_id] = username
+
+        entries = self._entries[league_id]
+        xp_by_user = self._xp[league_id]
+        if user_id in xp_by_user:
+            entries.remove((-xp_by_user[user_id], user_id))
+        xp_by_user[user_id] = xp
+        entries.add((-xp, user_id))
+
+    def size(self, league_id: str) -> int:
+        return len(self._entries.get(league_id, ()))
+
+    def rank(self, league_id: str, user_id: str):
+        """1-based rank of a member, or None if they are not in the league"""
+        xp = self._xp.get(league_id, {}).get(user_id)
+        if xp is None:
+            return None
+        return self._entries[league_id].index((-xp, user_id)) + 1
+
+    def top(self, league_id: str, limit: int):
+        return self._slice(league_id, 0, limit)
+
+    def around(self, league_id: str, user_id: str, radius: int = 2):
+        """The member plus up to `radius` neighbours above and below"""
+        rank = self.rank(league_id, user_id)
+        if rank is None:
+            return []
+        start = max(rank - 1 - radius, 0)
+        return self._slice(league_id, start, rank + radius)
+
+    def _slice(self, league_id: str, start: int, stop: int):
+        entries = self._entries.get(league_id)
+        if not entries:
+            return []
+        return [
+            {
+                "user_id": user_id,
+                "username": self._usernames[league_id].get(user_id),
+                "xp_this_week": -negative_xp,
+                "rank": start + offset + 1,
+            }
+            for offset, (negative_xp, user_id) in enumerate(entries.islice(start, stop))
+        ]
@@ -0,0 +1,149 @@
+import os
+import time
+from contextlib import asynccontextmanager
+from fastapi import Request, Response
+from prometheus_client import Counter, Gauge, Histogram, CollectorRegistry, CONTENT_TYPE_LATEST, REGISTRY, generate_latest, multiprocess
+from prometheus_client.core import CounterMetricFamily
+from pymongo import monitoring
+from starlette.routing import Match
+
+# Prometheus metrics for the API, MongoDB and LLM calls.
+# Routes are labelled by their path template (/api/lessons/{lesson_id}), never
+# by the raw path, so label cardinality stays fixed.
+# Under several workers (gunicorn.conf.py sets PROMETHEUS_MULTIPROC_DIR) every
+# process writes its samples to that directory and /metrics merges them.
+
+REQUEST_LATENCY = Histogram(
+    "romingo_http_request_duration_seconds",
+    "HTTP request latency by route",
+    ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "romingo_http_requests_in_flight",
+    "HTTP requests currently being served, by route",
+    ["method", "route"],
+    multiprocess_mode="livesum",
+)
+
+MONGO_COMMANDS = Counter(
+    "romingo_mongo_commands_total",
+    "MongoDB commands by collection, command and outcome",
+    ["collection", "command", "outcome"],
+)
+MONGO_COMMAND_LATENCY = Histogram(
+    "romingo_mongo_command_duration_seconds",
+    "MongoDB command latency by collection and command",
+    ["collection", "command"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+
+LLM_LATENCY = Histogram(
+    "romingo_llm_request_duration_seconds",
+    "LLM call latency by kind",
+    ["kind"],
+    buckets=(0.5, 1, 2.5, 5, 10, 20, 30, 60, 120),
+)
+LLM_FAILURES = Counter(
+    "romingo_llm_failures_total",
+    "LLM calls that raised, by kind",
+    ["kind"],
+)
+
+UNMATCHED_ROUTE = "unmatched"
+
+def route_template(request: Request) -> str:
+    for route in request.app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return getattr(route, "path", UNMATCHED_ROUTE)
+    return UNMATCHED_ROUTE
+
+async def track_requests(request: Request, call_next):
+    """HTTP middleware: in-flight gauge and latency histogram per route template"""
+    route = route_template(request)
+    in_flight = REQUESTS_IN_FLIGHT.labels(request.method, route)
+    in_flight.inc()
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        in_flight.dec()
+        REQUEST_LATENCY.labels(request.method, route, str(status)).observe(time.perf_counter() - started)
+
+async def metrics_endpoint():
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        # Cache hit counters live in each process and are left out here:
+        # a scrape only reaches one worker, so they would jump between scrapes
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return Response(content=generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+@asynccontextmanager
+async def track_llm(kind: str):
+    """Time an LLM call and count it as failed if it raises"""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        LLM_FAILURES.labels(kind).inc()
+        raise
+    finally:
+        LLM_LATENCY.labels(kind).observe(time.perf_counter() - started)
+
+def command_collection(event) -> str:
+    """Collection a command targets (getMore carries it in "collection")"""
+    if event.command_name == "getMore":
+        return str(event.command.get("collection", ""))
+    target = event.command.get(event.command_name)
+    return target if isinstance(target, str) else ""
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """pymongo command listener feeding the Mongo counters and histograms"""
+
+    def __init__(self):
+        self._collections = {}  # (connection_id, request_id) -> collection
+
+    def started(self, event):
+        self._collections[(event.connection_id, event.request_id)] = command_collection(event)
+
+    def succeeded(self, event):
+        self._finish(event, "success")
+
+    def failed(self, event):
+        self._finish(event, "failure")
+
+    def _finish(self, event, outcome):
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        MONGO_COMMANDS.labels(collection, event.command_name, outcome).inc()
+        MONGO_COMMAND_LATENCY.labels(collection, event.command_name).observe(event.duration_micros / 1e6)
+
+mongo_listener = MongoCommandMetrics()
+
+class CacheCollector:
+    """Exports hit/miss counters of in-process caches (anything with .hits and .misses)"""
+
+    def __init__(self):
+        self._caches = {}
+
+    def register(self, name: str, cache):
+        self._caches[name] = cache
+
+    def collect(self):
+        hits = CounterMetricFamily("romingo_cache_hits", "In-process cache hits", labels=["cache"])
+        misses = CounterMetricFamily("romingo_cache_misses", "In-process cache misses", labels=["cache"])
+        for name, cache in self._caches.items():
+            hits.add_metric([name], cache.hits)
+            misses.add_metric([name], cache.misses)
+        yield hits
+        yield misses
+
+cache_collector = CacheCollector()
+REGISTRY.register(cache_collector)
+
+def register_cache(name: str, cache):
+    cache_collector.register(name, cache)
@@ -0,0 +1,114 @@
+from datetime import datetime, timedelta
+import srs
+import review_stats
+from grading import detect_error_type
+
+# Per-user mistake bank: one document per (user, lesson, exercise) carrying
+# its SM-2 review state. Written on every graded answer.
+
+mistakes_collection = None
+
+def init_collections(db):
+    """Initialize collections from main server"""
+    global mistakes_collection
+    mistakes_collection = db.user_mistakes
+
+def update_mistake_bank(user_id: str, lesson_id: str, exercise_index: int, exercise: dict, user_answer: str, is_correct: bool, similarity: float = 0.0):
+    now = datetime.utcnow()
+    key = {
+        "user_id": user_id,
+        "lesson_id": lesson_id,
+        "exercise_index": exercise_index,
+    }
+
+    existing = mistakes_collection.find_one(key)
+    error_type = detect_error_type(exercise)
+    quality = srs.answer_quality(is_correct, similarity)
+
+    if is_correct:
+        if not existing:
+            return
+
+        ease, interval_days, repetition_count = srs.schedule_review(
+            existing.get("ease", srs.DEFAULT_EASE),
+            existing.get("interval_days", 1),
+            existing.get("repetition_count", 0),
+            quality,
+        )
+        next_review = now + timedelta(days=interval_days)
+        mistakes_collection.update_one(
+            {"_id": existing["_id"]},
+            {
+                "$set": {
+                    "last_answer": user_answer,
+                    "last_result": "correct",
+                    "last_seen_at": now,
+                    "ease": ease,
+                    "interval_days": interval_days,
+                    "repetition_count": repetition_count,
+                    "next_review_at": next_review,
+                    "status": "scheduled",
+                }
+            }
+        )
+        review_stats.record_reschedule(
+            user_id, existing.get("next_review_at"), next_review,
+            existing.get("error_type", error_type), existing.get("error_type", error_type),
+        )
+        return
+
+    if existing:
+        ease, interval_days, repetition_count = srs.schedule_review(
+            existing.get("ease", srs.DEFAULT_EASE),
+            existing.get("interval_days", 1),
+            existing.get("repetition_count", 0),
+            quality,
+        )
+        next_review = now + timedelta(days=interval_days)
+        mistakes_collection.update_one(
+            {"_id": existing["_id"]},
+            {
+                "$set": {
+                    "exercise_type": exercise.get("type"),
+                    "error_type": error_type,
+                    "question": exercise.get("question"),
+                    "correct_answer": exercise.get("correct_answer"),
+                    "last_answer": user_answer,
+                    "last_result": "wrong",
+                    "last_seen_at": now,
+                    "ease": ease,
+                    "interval_days": interval_days,
+                    "repetition_count": repetition_count,
+                    "next_review_at": next_review,
+                    "status": "due",
+                },
+                "$inc": {
+                    "mistake_count": 1
+                }
+            }
+        )
+        review_stats.record_reschedule(
+            user_id, existing.get("next_review_at"), next_review,
+            existing.get("error_type", error_type), error_type,
+        )
+    else:
+        ease, interval_days, repetition_count = srs.schedule_review(srs.DEFAULT_EASE, 1, 0, quality)
+        next_review = now + timedelta(days=interval_days)
+        mistakes_collection.insert_one({
+            **key,
+            "exercise_type": exercise.get("type"),
+            "error_type": error_type,
+            "question": exercise.get("question"),
+            "correct_answer": exercise.get("correct_answer"),
+            "last_answer": user_answer,
+            "last_result": "wrong",
+            "mistake_count": 1,
+            "ease": ease,
+            "interval_days": interval_days,
+            "repetition_count": repetition_count,
+            "next_review_at": next_review,
+            "status": "due",
+            "created_at": now,
+            "last_seen_at": now,
+        })
+        review_stats.record_new_item(user_id, error_type, next_review)
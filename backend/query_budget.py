@@ -0,0 +1,113 @@
+import logging
+import os
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from fastapi import Request
+from pymongo import monitoring
+
+# Per-request MongoDB query budget.
+# A command listener counts every command issued while a request is being
+# served (tracked through a contextvar, which follows the request into
+# asyncio.to_thread calls). Requests over QUERY_BUDGET are logged with the
+# shapes of the commands they ran, which makes N+1 loops easy to spot.
+# assert_max_queries() gives tests the same count around a block of code.
+# Background work (the leaderboard refresh task, other threads) runs in its
+# own context and is never counted against a request or a capture.
+
+QUERY_BUDGET = int(os.getenv("QUERY_BUDGET", "25"))
+QUERY_COUNT_HEADER = "X-Query-Count"
+
+logger = logging.getLogger("romingo.query_budget")
+
+def command_shape(event) -> str:
+    """Query shape without values: command, collection and filter / pipeline keys"""
+    command = event.command
+    name = event.command_name
+    target = command.get("collection") if name == "getMore" else command.get(name)
+    collection = target if isinstance(target, str) else ""
+
+    if name == "aggregate":
+        keys = [next(iter(stage), "") for stage in command.get("pipeline", [])]
+    else:
+        query = command.get("filter") or command.get("query") or {}
+        for statements in ("updates", "deletes"):
+            if command.get(statements):
+                query = command[statements][0].get("q", {})
+        keys = sorted(query)
+    return f"{name} {collection} {keys}"
+
+class QueryLog:
+    def __init__(self):
+        self.count = 0
+        self.shapes = Counter()
+
+    def record(self, event):
+        self.count += 1
+        self.shapes[command_shape(event)] += 1
+
+    def merge(self, other: "QueryLog"):
+        self.count += other.count
+        self.shapes.update(other.shapes)
+
+    def summary(self, limit: int = 10) -> str:
+        return "; ".join(f"{count}x {shape}" for shape, count in self.shapes.most_common(limit))
+
+_request_log: ContextVar = ContextVar("query_budget_log", default=None)
+# Open assert_max_queries() logs; each finished request's log is merged into them
+_captures = []
+
+class QueryCounter(monitoring.CommandListener):
+    def started(self, event):
+        log = _request_log.get()
+        if log is not None:
+            log.record(event)
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+listener = QueryCounter()
+
+async def enforce_budget(request: Request, call_next):
+    """HTTP middleware: count the request's Mongo commands and log it when over budget"""
+    log = QueryLog()
+    token = _request_log.set(log)
+    try:
+        response = await call_next(request)
+    finally:
+        _request_log.reset(token)
+        for capture in _captures:
+            capture.merge(log)
+
+    response.headers[QUERY_COUNT_HEADER] = str(log.count)
+    if log.count > QUERY_BUDGET:
+        logger.warning(
+            "%s %s issued %d Mongo commands (budget %d): %s",
+            request.method, request.url.path, log.count, QUERY_BUDGET, log.summary()
+        )
+    return response
+
+@contextmanager
+def assert_max_queries(max_queries: int):
+    """Fail if the enclosed block issues more than max_queries Mongo commands.
+
+    Counts commands issued from the caller's context plus those of every
+    request served while the block runs (e.g. through a TestClient), so use it
+    around one request at a time:
+
+        with assert_max_queries(3):
+            client.get("/api/lessons", headers=auth)
+    """
+    log = QueryLog()
+    token = _request_log.set(log)
+    _captures.append(log)
+    try:
+        yield log
+    finally:
+        _captures.remove(log)
+        _request_log.reset(token)
+    if log.count > max_queries:
+        raise AssertionError(f"{log.count} Mongo commands issued, expected at most {max_queries}: {log.summary()}")
@@ -0,0 +1,154 @@
+from datetime import datetime
+from pymongo import ReturnDocument
+from timeutils import as_datetime
+
+# Per-user SRS counters, maintained incrementally by the mistake-bank writes.
+# One document per user:
+#   {"user_id", "tracked", "by_error_type": {type: n}, "due_buckets": {"YYYY-MM-DD": n}}
+# so badge counts and dashboards read a single small document instead of
+# scanning user_mistakes. Buckets are removed once they drop to 0.
+
+review_stats_collection = None
+mistakes_collection = None
+
+def init_collections(db):
+    """Initialize collections from main server"""
+    global review_stats_collection, mistakes_collection
+
+    review_stats_collection = db.review_stats
+    mistakes_collection = db.user_mistakes
+
+def due_bucket(when) -> str:
+    return as_datetime(when, datetime.utcnow()).strftime("%Y-%m-%d")
+
+def record_new_item(user_id: str, error_type: str, next_review_at: datetime):
+    """Count a newly tracked mistake"""
+    review_stats_collection.update_one(
+        {"user_id": user_id},
+        {
+            "$inc": {
+                "tracked": 1,
+                f"by_error_type.{error_type}": 1,
+                f"due_buckets.{due_bucket(next_review_at)}": 1,
+            }
+        },
+        upsert=True
+    )
+
+def record_reschedule(user_id: str, old_review_at, new_review_at: datetime, old_error_type: str, new_error_type: str):
+    """Move an already tracked mistake between due buckets / error types"""
+    inc = {}
+    old_bucket = due_bucket(old_review_at)
+    new_bucket = due_bucket(new_review_at)
+    if old_bucket != new_bucket:
+        inc[f"due_buckets.{old_bucket}"] = -1
+        inc[f"due_buckets.{new_bucket}"] = 1
+    if old_error_type != new_error_type:
+        inc[f"by_error_type.{old_error_type}"] = -1
+        inc[f"by_error_type.{new_error_type}"] = 1
+
+    if not inc:
+        return
+    stats = review_stats_collection.find_one_and_update(
+        {"user_id": user_id},
+        {"$inc": inc},
+        projection={path: 1 for path, delta in inc.items() if delta < 0},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    # Drop emptied buckets/types so the document does not grow with every past day
+    for path, delta in inc.items():
+        if delta < 0 and _get_path(stats, path) <= 0:
+            review_stats_collection.update_one(
+                {"user_id": user_id, path: {"$lte": 0}},
+                {"$unset": {path: ""}}
+            )
+
+def _get_path(doc: dict, path: str) -> int:
+    parent, _, key = path.partition(".")
+    return (doc or {}).get(parent, {}).get(key, 0)
+
+def get_review_stats(user_id: str, now: datetime = None):
+    """Read a user's counters. Items are due once next_review_at <= now, as in the practice endpoints."""
+    now = now or datetime.utcnow()
+    doc = review_stats_collection.find_one({"user_id": user_id}) or {}
+
+    today = due_bucket(now)
+    buckets = {day: count for day, count in doc.get("due_buckets", {}).items() if count > 0}
+    # Earlier days are due in full; today's bucket is split with an exact
+    # count on the (user_id, next_review_at) index
+    due_today = 0
+    if buckets.get(today):
+        due_today = mistakes_collection.count_documents({
+            "user_id": user_id,
+            "next_review_at": {"$gte": datetime.strptime(today, "%Y-%m-%d"), "$lte": now}
+        })
+    due = sum(count for day, count in buckets.items() if day < today) + due_today
+
+    histogram = {day: count for day, count in sorted(buckets.items()) if day > today}
+    if buckets.get(today, 0) > due_today:
+        histogram = {today: buckets[today] - due_today, **histogram}
+
+    return {
+        "tracked": doc.get("tracked", 0),
+        "due": due,
+        "by_error_type": {error_type: count for error_type, count in doc.get("by_error_type", {}).items() if count > 0},
+        "due_histogram": histogram,
+    }
+
+def rebuild_review_stats(batch_size: int = 1000):
+    """Recompute every user's counters from user_mistakes (backfill / nightly repair).
+
+    Returns the number of users written.
+    """
+    from pymongo import ReplaceOne
+
+    pipeline = [
+        {
+            "$group": {
+                "_id": {
+                    "user_id": "$user_id",
+                    "error_type": "$error_type",
+                    # Rows not yet converted by migrate-dates may hold ISO strings; unparseable ones get no bucket
+                    "day": {"$dateToString": {
+                        "format": "%Y-%m-%d",
+                        "date": {"$convert": {"input": "$next_review_at", "to": "date", "onError": None, "onNull": None}},
+                    }},
+                },
+                "count": {"$sum": 1},
+            }
+        },
+        {"$sort": {"_id.user_id": 1}},
+    ]
+
+    written = 0
+    operations = []
+    current = None
+
+    def flush_user(stats):
+        operations.append(ReplaceOne({"user_id": stats["user_id"]}, stats, upsert=True))
+
+    for row in mistakes_collection.aggregate(pipeline, allowDiskUse=True):
+        key = row["_id"]
+        if current is None or current["user_id"] != key["user_id"]:
+            if current is not None:
+                flush_user(current)
+            current = {"user_id": key["user_id"], "tracked": 0, "by_error_type": {}, "due_buckets": {}}
+
+        error_type = key.get("error_type") or "general"
+        current["tracked"] += row["count"]
+        current["by_error_type"][error_type] = current["by_error_type"].get(error_type, 0) + row["count"]
+        if key.get("day"):
+            current["due_buckets"][key["day"]] = current["due_buckets"].get(key["day"], 0) + row["count"]
+
+        if len(operations) >= batch_size:
+            written += len(operations)
+            review_stats_collection.bulk_write(operations, ordered=False)
+            operations.clear()
+
+    if current is not None:
+        flush_user(current)
+    if operations:
+        written += len(operations)
+        review_stats_collection.bulk_write(operations, ordered=False)
+    return written
@@ -1,31 +1,44 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import APIRouter, FastAPI, HTTPException, Depends, status, Request
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel, EmailStr, Field
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict
 from datetime import datetime, timedelta
-from pymongo import MongoClient, ASCENDING, DESCENDING
+from pymongo import MongoClient, ASCENDING, DESCENDING, ReturnDocument
 from bson import ObjectId
+from contextlib import asynccontextmanager
 import os
 import jwt
 import bcrypt
-import difflib
 from dotenv import load_dotenv
 import asyncio
-from emergentintegrations.llm.chat import LlmChat, UserMessage
+import leaderboard
+import friend_graph
+import xp_ledger
+import streaks
+import inventory
+import achievements
+import metrics
+import query_budget
+from cache import TTLCache
+from content_store import store as content_store, content_response, serialize_doc
+import review_stats
+import mistake_bank
+from grading import detect_error_type, grade_answer
+from timeutils import as_datetime
+from duolingo_features import (
+    initialize_shop, dedupe_shop_items, refill_hearts_if_needed,
+    update_league_standings, get_league_standings,
+    get_league_neighbours, record_league_xp,
+    current_week_key,
+    update_daily_goal_progress, get_skill_tree_lessons,
+    init_collections as init_feature_collections
+)
 
 load_dotenv()
 
-app = FastAPI(title="Romingo API")
-
-# CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+router = APIRouter()
 
 # MongoDB setup
 MONGO_URL = os.getenv("MONGO_URL")
@@ -33,21 +46,103 @@ DB_NAME = os.getenv("DB_NAME")
 JWT_SECRET = os.getenv("JWT_SECRET")
 EMERGENT_LLM_KEY = os.getenv("EMERGENT_LLM_KEY")
 
-client = MongoClient(MONGO_URL)
-db = client[DB_NAME]
+# Connection pool, per worker process. Routes call pymongo synchronously on the
+# event loop, so a worker has about one command in flight plus background threads;
+# total connections are workers x MONGO_MAX_POOL_SIZE (see gunicorn.conf.py).
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "10"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "2"))
+# Wire compression, first one the server also supports wins (zstd needs the zstandard package)
+MONGO_COMPRESSORS = os.getenv("MONGO_COMPRESSORS", "zstd,zlib")
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "30000"))
+
+# Created in lifespan(), i.e. once per worker after the fork (see connect_mongo)
+client = None
+db = None
 
 # Collections
-users_collection = db.users
-lessons_collection = db.lessons
-user_progress_collection = db.user_progress
-achievements_collection = db.achievements
-shop_items_collection = db.shop_items
-user_inventory_collection = db.user_inventory
-friends_collection = db.friends
-leagues_collection = db.leagues
-league_members_collection = db.league_members
-stories_collection = db.stories
-mistakes_collection = db.user_mistakes
+users_collection = None
+lessons_collection = None
+user_progress_collection = None
+achievements_collection = None
+shop_items_collection = None
+user_inventory_collection = None
+friends_collection = None
+leagues_collection = None
+league_members_collection = None
+stories_collection = None
+mistakes_collection = None
+
+def connect_mongo():
+    """Create this process's MongoClient and bind every module's collections to it"""
+    global client, db, users_collection, lessons_collection, user_progress_collection
+    global achievements_collection, shop_items_collection, user_inventory_collection, friends_collection
+    global leagues_collection, league_members_collection, stories_collection, mistakes_collection
+
+    client = MongoClient(
+        MONGO_URL,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        compressors=MONGO_COMPRESSORS,
+        serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+        socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+        event_listeners=[metrics.mongo_listener, query_budget.listener],
+    )
+    db = client[DB_NAME]
+
+    users_collection = db.users
+    lessons_collection = db.lessons
+    user_progress_collection = db.user_progress
+    achievements_collection = db.achievements
+    shop_items_collection = db.shop_items
+    user_inventory_collection = db.user_inventory
+    friends_collection = db.friends
+    leagues_collection = db.leagues
+    league_members_collection = db.league_members
+    stories_collection = db.stories
+    mistakes_collection = db.user_mistakes
+
+    review_stats.init_collections(db)
+    mistake_bank.init_collections(db)
+    leaderboard.init_collections(db)
+    friend_graph.init_collections(db)
+    xp_ledger.init_collections(db)
+    streaks.init_collections(db)
+    inventory.init_collections(db)
+    achievements.init_collections(db)
+    init_feature_collections(db)
+
+def ensure_indexes():
+    """Create indexes used by hot queries (idempotent)"""
+    # SRS due queue: equality on user_id, range scan + sort on next_review_at
+    mistakes_collection.create_index([("user_id", ASCENDING), ("next_review_at", ASCENDING)])
+    mistakes_collection.create_index([("user_id", ASCENDING), ("lesson_id", ASCENDING), ("exercise_index", ASCENDING)])
+    db.review_stats.create_index("user_id", unique=True)
+    # Lesson / story / skill tree progress: all of one user's rows per request
+    user_progress_collection.create_index([("user_id", ASCENDING), ("lesson_id", ASCENDING)])
+    friend_graph.ensure_indexes()
+    xp_ledger.ensure_indexes()
+    streaks.ensure_indexes()
+    inventory.ensure_indexes()
+    achievements.ensure_indexes()
+    # Workers seed the shop concurrently at startup; upserts on this key stay single.
+    # Older find-then-insert seeding may have left duplicates that would fail the index.
+    dedupe_shop_items()
+    shop_items_collection.create_index("item_type", unique=True)
+    # Leaderboard snapshot refresh: top-K by XP
+    users_collection.create_index([("xp", DESCENDING), ("_id", ASCENDING)])
+    # League standings: top-N by weekly XP within one league, plus membership lookup
+    leagues_collection.create_index([("tier", ASCENDING), ("week", ASCENDING), ("member_count", ASCENDING)])
+    league_members_collection.create_index([("league_id", ASCENDING), ("xp_this_week", DESCENDING)])
+    league_members_collection.create_index([("league_id", ASCENDING), ("user_id", ASCENDING)])
+    # One cohort per user per week
+    league_members_collection.create_index(
+        [("user_id", ASCENDING), ("week", ASCENDING)],
+        unique=True,
+        partialFilterExpression={"week": {"$exists": True}}
+    )
 
 # Security
 security = HTTPBearer()
@@ -103,6 +198,9 @@ def decode_token(token: str):
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
+# Fields never needed by authenticated handlers (legacy friends arrays can be large)
+CURRENT_USER_PROJECTION = {"password": 0, "friends": 0}
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     token = credentials.credentials
     payload = decode_token(token)
@@ -110,112 +208,52 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     if not user_id:
         raise HTTPException(status_code=401, detail="Invalid authentication")
     
-    user = users_collection.find_one({"_id": ObjectId(user_id)})
+    user = users_collection.find_one({"_id": ObjectId(user_id)}, CURRENT_USER_PROJECTION)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
     return user
 
-def serialize_doc(doc):
-    """Convert MongoDB document to JSON-serializable dict"""
-    if doc is None:
-        return None
-    doc["id"] = str(doc["_id"])
-    del doc["_id"]
-    return doc
-
-def normalize_text(text: str) -> str:
-    return " ".join((text or "").lower().strip().split())
-
-def get_text_similarity(user_answer: str, correct_answer: str) -> float:
-    return difflib.SequenceMatcher(None, normalize_text(user_answer), normalize_text(correct_answer)).ratio()
-
-def detect_error_type(exercise: dict) -> str:
-    exercise_type = exercise.get("type")
-    if exercise_type in ["speaking", "listening"]:
-        return f"{exercise_type}_accuracy"
-    if exercise_type in ["translation", "sentence_complete"]:
-        return "grammar"
-    if exercise_type in ["word_match", "multiple_choice"]:
-        return "vocabulary"
-    return "general"
-
-def spaced_repetition_days(repetition_count: int) -> int:
-    schedule = [1, 3, 7, 14, 30]
-    return schedule[min(repetition_count, len(schedule) - 1)]
-
-def update_mistake_bank(user_id: str, lesson_id: str, exercise_index: int, exercise: dict, user_answer: str, is_correct: bool):
-    now = datetime.utcnow()
-    key = {
-        "user_id": user_id,
-        "lesson_id": lesson_id,
-        "exercise_index": exercise_index,
-    }
-
-    existing = mistakes_collection.find_one(key)
-    error_type = detect_error_type(exercise)
-
-    if is_correct:
-        if not existing:
-            return
-
-        next_repetition = existing.get("repetition_count", 0) + 1
-        next_days = spaced_repetition_days(next_repetition)
-        mistakes_collection.update_one(
-            {"_id": existing["_id"]},
-            {
-                "$set": {
-                    "last_answer": user_answer,
-                    "last_result": "correct",
-                    "last_seen_at": now.isoformat(),
-                    "repetition_count": next_repetition,
-                    "next_review_at": (now + timedelta(days=next_days)).isoformat(),
-                    "status": "scheduled",
-                }
-            }
-        )
-        return
-
-    if existing:
-        mistakes_collection.update_one(
-            {"_id": existing["_id"]},
-            {
-                "$set": {
-                    "exercise_type": exercise.get("type"),
-                    "error_type": error_type,
-                    "question": exercise.get("question"),
-                    "correct_answer": exercise.get("correct_answer"),
-                    "last_answer": user_answer,
-                    "last_result": "wrong",
-                    "last_seen_at": now.isoformat(),
-                    "next_review_at": (now + timedelta(days=1)).isoformat(),
-                    "status": "due",
-                },
-                "$inc": {
-                    "mistake_count": 1
-                }
-            }
-        )
+# Lessons and stories are never modified after insert: clients may keep them for a day
+IMMUTABLE_CONTENT_CACHE = "private, max-age=86400, immutable"
+# The shop catalogue can change on deploy: always revalidate (a 304 costs only headers)
+SHOP_CONTENT_CACHE = "private, no-cache"
+metrics.register_cache("content_store", content_store)
+
+async def award_xp(current_user: dict, xp: int, source: str) -> int:
+    """Credit XP (after active boosts) to the user's total, the XP ledger, the daily streak,
+    badges and this week's league standings. Returns the XP actually credited."""
+    xp *= inventory.effective_xp_multiplier(current_user)
+    updated = users_collection.find_one_and_update(
+        {"_id": current_user["_id"]},
+        {"$inc": {"xp": xp}},
+        projection={"xp": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    achievements.record_metric(current_user, "xp", updated["xp"])
+    streak = streaks.record_activity(current_user)
+    achievements.record_metric(current_user, "streak", streak)
+    leaderboard.record_xp_change(current_user, updated["xp"] - xp, updated["xp"])
+    await record_league_xp(current_user, xp)
+    await update_daily_goal_progress(current_user, xp, source)
+    return xp
+
+# AI Helper - LLM client
+def llm_classes():
+    """(LlmChat, UserMessage) for the configured provider, imported on first generation"""
+    # emergentintegrations pulls in the google/boto client stack; only the generate
+    # endpoints need it, so keep it out of worker cold start (benchmarks/bench_import_time.py)
+    if os.getenv("LLM_PROVIDER") == "fake":
+        # Deterministic fixtures for load tests and local runs (see fake_llm.py)
+        from fake_llm import LlmChat, UserMessage
     else:
-        mistakes_collection.insert_one({
-            **key,
-            "exercise_type": exercise.get("type"),
-            "error_type": error_type,
-            "question": exercise.get("question"),
-            "correct_answer": exercise.get("correct_answer"),
-            "last_answer": user_answer,
-            "last_result": "wrong",
-            "mistake_count": 1,
-            "repetition_count": 0,
-            "next_review_at": (now + timedelta(days=1)).isoformat(),
-            "status": "due",
-            "created_at": now.isoformat(),
-            "last_seen_at": now.isoformat(),
-        })
+        from emergentintegrations.llm.chat import LlmChat, UserMessage
+    return LlmChat, UserMessage
 
 # AI Helper - Generate lessons using LLM
 async def generate_lesson_content(level: int, topic: str):
     """Generate Romanian language lesson using AI"""
+    LlmChat, UserMessage = llm_classes()
     chat = LlmChat(
         api_key=EMERGENT_LLM_KEY,
         session_id=f"lesson_gen_{level}_{topic}",
@@ -280,7 +318,8 @@ async def generate_lesson_content(level: int, topic: str):
     Lütfen sadece JSON yanıtı ver, başka açıklama ekleme."""
     
     user_message = UserMessage(text=prompt)
-    response = await chat.send_message(user_message)
+    async with metrics.track_llm("lesson"):
+        response = await chat.send_message(user_message)
     
     # Parse JSON response
     import json
@@ -302,14 +341,29 @@ async def generate_lesson_content(level: int, topic: str):
         print(f"Response: {response}")
         raise HTTPException(status_code=500, detail="Failed to generate lesson content")
 
+# App lifecycle
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Per-worker startup and shutdown; runs after the fork, so no MongoClient is shared"""
+    connect_mongo()
+    # Warm up: server selection and the first pooled connection happen here,
+    # not on the first request (minPoolSize keeps the rest of the pool open)
+    client.admin.command("ping")
+    ensure_indexes()
+    await initialize_shop()
+    refresh = asyncio.create_task(leaderboard.refresh_periodically())
+    yield
+    refresh.cancel()
+    client.close()
+
 # Routes
 
-@app.get("/api/health")
+@router.get("/api/health")
 async def health_check():
     return {"status": "healthy", "message": "Romingo API is running"}
 
 # Auth endpoints
-@app.post("/api/auth/register")
+@router.post("/api/auth/register")
 async def register(user_data: UserRegister):
     # Check if user exists
     existing_user = users_collection.find_one({"$or": [
@@ -329,28 +383,24 @@ async def register(user_data: UserRegister):
         "xp": 0,
         "level": 1,
         "streak": 0,
+        "last_activity_day": None,
         "gems": 500,  # Starting gems
         "hearts": 5,  # Starting hearts (max 5)
         "max_hearts": 5,
-        "last_heart_refill": datetime.utcnow().isoformat(),
-        "daily_goal": 50,  # Daily XP goal
-        "daily_goal_progress": 0,
+        "last_heart_refill": datetime.utcnow(),
+        "daily_goal": 50,  # Daily XP goal (progress is read from the XP ledger)
         "league": "bronze",  # Starting league
         "league_rank": 0,
         "total_lessons_completed": 0,
         "current_skill_tree_level": 1,
-        "friends": [],
         "onboarding_completed": False,  # New users need onboarding
-        "last_login": datetime.utcnow().isoformat(),
-        "created_at": datetime.utcnow().isoformat()
+        "last_login": datetime.utcnow(),
+        "created_at": datetime.utcnow()
     }
     
     result = users_collection.insert_one(new_user)
     user_id = str(result.inserted_id)
     
-    # Initialize shop (first time setup)
-    await initialize_shop()
-    
     # Create token
     token = create_access_token({"user_id": user_id})
     
@@ -367,12 +417,12 @@ async def register(user_data: UserRegister):
             "gems": new_user["gems"],
             "hearts": new_user["hearts"],
             "daily_goal": new_user["daily_goal"],
-            "daily_goal_progress": new_user["daily_goal_progress"],
+            "daily_goal_progress": 0,
             "league": new_user["league"]
         }
     }
 
-@app.post("/api/auth/login")
+@router.post("/api/auth/login")
 async def login(user_data: UserLogin):
     user = users_collection.find_one({"email": user_data.email})
     
@@ -382,7 +432,7 @@ async def login(user_data: UserLogin):
     # Update last login
     users_collection.update_one(
         {"_id": user["_id"]},
-        {"$set": {"last_login": datetime.utcnow().isoformat()}}
+        {"$set": {"last_login": datetime.utcnow()}}
     )
     
     # Create token
@@ -397,12 +447,12 @@ async def login(user_data: UserLogin):
             "email": user["email"],
             "xp": user.get("xp", 0),
             "level": user.get("level", 1),
-            "streak": user.get("streak", 0),
+            "streak": streaks.current_streak(user),
             "last_login": user.get("last_login")
         }
     }
 
-@app.get("/api/user/profile")
+@router.get("/api/user/profile")
 async def get_profile(current_user: dict = Depends(get_current_user)):
     return {
         "id": str(current_user["_id"]),
@@ -410,24 +460,31 @@ async def get_profile(current_user: dict = Depends(get_current_user)):
         "email": current_user["email"],
         "xp": current_user.get("xp", 0),
         "level": current_user.get("level", 1),
-        "streak": current_user.get("streak", 0),
+        "streak": streaks.current_streak(current_user),
         "last_login": current_user.get("last_login"),
         "created_at": current_user.get("created_at")
     }
 
 # Lesson endpoints
-@app.get("/api/lessons")
+def get_progress_by_item(user_id: str, key: str) -> Dict[str, dict]:
+    """The user's progress docs keyed by lesson_id or story_id (one query instead of one per item)"""
+    return {
+        progress[key]: progress
+        for progress in user_progress_collection.find(
+            {"user_id": user_id, key: {"$exists": True}},
+            {key: 1, "completed": 1, "score": 1}
+        )
+    }
+
+@router.get("/api/lessons")
 async def get_lessons(current_user: dict = Depends(get_current_user)):
     """Get all lessons with user progress"""
     lessons = list(lessons_collection.find().sort("level", ASCENDING))
-    user_id = str(current_user["_id"])
+    progress_by_lesson = get_progress_by_item(str(current_user["_id"]), "lesson_id")
     
     lessons_with_progress = []
     for lesson in lessons:
-        progress = user_progress_collection.find_one({
-            "user_id": user_id,
-            "lesson_id": str(lesson["_id"])
-        })
+        progress = progress_by_lesson.get(str(lesson["_id"]))
         
         lesson_data = serialize_doc(lesson)
         lesson_data["completed"] = progress.get("completed", False) if progress else False
@@ -436,7 +493,7 @@ async def get_lessons(current_user: dict = Depends(get_current_user)):
     
     return {"lessons": lessons_with_progress}
 
-@app.post("/api/lessons/generate")
+@router.post("/api/lessons/generate")
 async def create_lesson(lesson_data: LessonCreate, current_user: dict = Depends(get_current_user)):
     """Generate a new lesson using AI"""
     # Check if lesson already exists
@@ -463,7 +520,7 @@ async def create_lesson(lesson_data: LessonCreate, current_user: dict = Depends(
         "vocabulary": content.get("vocabulary", []),
         "grammar_tip": content.get("grammar_tip", ""),
         "exercises": content.get("exercises", []),
-        "created_at": datetime.utcnow().isoformat()
+        "created_at": datetime.utcnow()
     }
     
     result = lessons_collection.insert_one(new_lesson)
@@ -472,21 +529,25 @@ async def create_lesson(lesson_data: LessonCreate, current_user: dict = Depends(
     
     return {"message": "Lesson created successfully", "lesson": new_lesson}
 
-@app.get("/api/lessons/{lesson_id}")
-async def get_lesson(lesson_id: str, current_user: dict = Depends(get_current_user)):
+@router.get("/api/lessons/{lesson_id}")
+async def get_lesson(lesson_id: str, request: Request, current_user: dict = Depends(get_current_user)):
     """Get a specific lesson"""
-    try:
-        lesson = lessons_collection.find_one({"_id": ObjectId(lesson_id)})
-    except:
-        raise HTTPException(status_code=400, detail="Invalid lesson ID")
-    
-    if not lesson:
-        raise HTTPException(status_code=404, detail="Lesson not found")
+    entry = content_store.get(f"lesson:{lesson_id}")
+    if entry is None:
+        try:
+            lesson = lessons_collection.find_one({"_id": ObjectId(lesson_id)})
+        except:
+            raise HTTPException(status_code=400, detail="Invalid lesson ID")
+        
+        if not lesson:
+            raise HTTPException(status_code=404, detail="Lesson not found")
+        
+        entry = content_store.put(f"lesson:{lesson_id}", serialize_doc(lesson), IMMUTABLE_CONTENT_CACHE)
     
-    return serialize_doc(lesson)
+    return content_response(request, entry)
 
 # Exercise endpoints
-@app.post("/api/exercises/submit")
+@router.post("/api/exercises/submit")
 async def submit_exercise(submission: ExerciseSubmit, current_user: dict = Depends(get_current_user)):
     """Submit an exercise answer and check if correct"""
     user_id = str(current_user["_id"])
@@ -506,42 +567,22 @@ async def submit_exercise(submission: ExerciseSubmit, current_user: dict = Depen
         raise HTTPException(status_code=400, detail="Invalid exercise index")
     
     exercise = exercises[submission.exercise_index]
-    correct_answer = normalize_text(exercise.get("correct_answer", ""))
-    user_answer = normalize_text(submission.user_answer)
-    
-    # Check if answer is correct
-    is_correct = False
-    similarity_score = get_text_similarity(user_answer, correct_answer)
-    feedback_details = {}
-    if exercise.get("type") == "translation":
-        # Check acceptable answers for translation
-        acceptable = [correct_answer] + [normalize_text(ans) for ans in exercise.get("acceptable_answers", [])]
-        is_correct = user_answer in acceptable
-        feedback_details["similarity"] = round(similarity_score * 100)
-    elif exercise.get("type") in ["speaking", "listening"]:
-        pronunciation_score = int(similarity_score * 100)
-        is_correct = similarity_score >= 0.78
-        feedback_details["pronunciation_score"] = pronunciation_score
-        feedback_details["evaluation"] = "good" if pronunciation_score >= 90 else "okay" if pronunciation_score >= 78 else "needs_practice"
-    else:
-        is_correct = user_answer == correct_answer
+    grade = grade_answer(exercise, submission.user_answer)
+    is_correct = grade["is_correct"]
     
     # Award XP if correct
     xp_earned = 0
     if is_correct:
-        xp_earned = 10
-        users_collection.update_one(
-            {"_id": current_user["_id"]},
-            {"$inc": {"xp": xp_earned}}
-        )
+        xp_earned = await award_xp(current_user, 10, "exercise")
 
-    update_mistake_bank(
+    mistake_bank.update_mistake_bank(
         user_id=user_id,
         lesson_id=submission.lesson_id,
         exercise_index=submission.exercise_index,
         exercise=exercise,
-        user_answer=user_answer,
+        user_answer=grade["user_answer"],
         is_correct=is_correct,
+        similarity=grade["similarity"],
     )
     
     return {
@@ -549,10 +590,10 @@ async def submit_exercise(submission: ExerciseSubmit, current_user: dict = Depen
         "correct_answer": exercise.get("correct_answer"),
         "explanation": exercise.get("explanation", ""),
         "xp_earned": xp_earned,
-        "feedback_details": feedback_details,
+        "feedback_details": grade["feedback_details"],
     }
 
-@app.post("/api/lessons/{lesson_id}/complete")
+@router.post("/api/lessons/{lesson_id}/complete")
 async def complete_lesson(lesson_id: str, score: int, current_user: dict = Depends(get_current_user)):
     """Mark a lesson as complete"""
     user_id = str(current_user["_id"])
@@ -572,6 +613,16 @@ async def complete_lesson(lesson_id: str, score: int, current_user: dict = Depen
         "lesson_id": lesson_id
     })
     
+    if not progress or not progress.get("completed"):
+        # First completion of this lesson
+        updated = users_collection.find_one_and_update(
+            {"_id": current_user["_id"]},
+            {"$inc": {"total_lessons_completed": 1}},
+            projection={"total_lessons_completed": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        achievements.record_metric(current_user, "lessons", updated["total_lessons_completed"])
+    
     if progress:
         user_progress_collection.update_one(
             {"_id": progress["_id"]},
@@ -579,7 +630,7 @@ async def complete_lesson(lesson_id: str, score: int, current_user: dict = Depen
                 "$set": {
                     "completed": True,
                     "score": max(score, progress.get("score", 0)),
-                    "completed_at": datetime.utcnow().isoformat()
+                    "completed_at": datetime.utcnow()
                 },
                 "$inc": {"attempts": 1}
             }
@@ -591,15 +642,11 @@ async def complete_lesson(lesson_id: str, score: int, current_user: dict = Depen
             "completed": True,
             "score": score,
             "attempts": 1,
-            "completed_at": datetime.utcnow().isoformat()
+            "completed_at": datetime.utcnow()
         })
     
     # Award completion XP
-    completion_xp = 50
-    users_collection.update_one(
-        {"_id": current_user["_id"]},
-        {"$inc": {"xp": completion_xp}}
-    )
+    completion_xp = await award_xp(current_user, 50, "lesson")
     
     return {
         "message": "Lesson completed",
@@ -608,158 +655,87 @@ async def complete_lesson(lesson_id: str, score: int, current_user: dict = Depen
     }
 
 # Streak endpoint
-@app.post("/api/streak/update")
+@router.post("/api/streak/update")
 async def update_streak(current_user: dict = Depends(get_current_user)):
-    """Update user's daily streak"""
-    user_id = current_user["_id"]
-    last_login = current_user.get("last_login")
+    """Current daily streak. Streaks are extended by earning XP and closed out by the nightly streaks job."""
+    return {
+        "streak": streaks.current_streak(current_user),
+        "streak_freezes": current_user.get("streak_freezes", 0)
+    }
+
+# Leaderboard endpoints (served from the in-memory snapshot)
+@router.get("/api/leaderboard")
+async def get_leaderboard(limit: int = 50, after_xp: Optional[int] = None, after_id: Optional[str] = None):
+    """Get top users by XP (keyset-paginated with after_xp/after_id)"""
+    limit = min(max(limit, 1), leaderboard.LEADERBOARD_PAGE_LIMIT)
+    snapshot = leaderboard.get_snapshot()
+    page = snapshot.page(limit, after_xp, after_id)
     
-    if last_login:
-        last_login_date = datetime.fromisoformat(last_login).date()
-        today = datetime.utcnow().date()
-        
-        # Check if last login was yesterday
-        if (today - last_login_date).days == 1:
-            # Increment streak
-            users_collection.update_one(
-                {"_id": user_id},
-                {"$inc": {"streak": 1}}
-            )
-            new_streak = current_user.get("streak", 0) + 1
-        elif (today - last_login_date).days > 1:
-            # Reset streak
-            users_collection.update_one(
-                {"_id": user_id},
-                {"$set": {"streak": 1}}
-            )
-            new_streak = 1
-        else:
-            new_streak = current_user.get("streak", 1)
-    else:
-        users_collection.update_one(
-            {"_id": user_id},
-            {"$set": {"streak": 1}}
-        )
-        new_streak = 1
-    
-    return {"streak": new_streak}
-
-# Leaderboard endpoint
-@app.get("/api/leaderboard")
-async def get_leaderboard(limit: int = 50):
-    """Get top users by XP"""
-    users = list(users_collection.find(
-        {},
-        {"username": 1, "xp": 1, "level": 1, "streak": 1}
-    ).sort("xp", DESCENDING).limit(limit))
-    
-    leaderboard = []
-    for rank, user in enumerate(users, 1):
-        leaderboard.append({
-            "rank": rank,
-            "username": user["username"],
-            "xp": user.get("xp", 0),
-            "level": user.get("level", 1),
-            "streak": user.get("streak", 0)
-        })
+    next_cursor = None
+    if len(page) == limit:
+        next_cursor = {"after_xp": page[-1]["xp"], "after_id": page[-1]["id"]}
     
-    return {"leaderboard": leaderboard}
+    return {
+        "leaderboard": [
+            {
+                "rank": entry["rank"],
+                "username": entry["username"],
+                "xp": entry["xp"],
+                "level": entry["level"],
+                "streak": entry["streak"]
+            }
+            for entry in page
+        ],
+        "next_cursor": next_cursor,
+        "refreshed_at": snapshot.refreshed_at
+    }
+
+@router.get("/api/leaderboard/me")
+async def get_my_leaderboard_rank(current_user: dict = Depends(get_current_user)):
+    """Get the caller's global rank"""
+    snapshot = leaderboard.get_snapshot()
+    xp = current_user.get("xp", 0)
+    rank, exact = snapshot.rank_for_xp(xp)
+    return {
+        "rank": rank,
+        "exact": exact,
+        "xp": xp,
+        "total_users": snapshot.total_users,
+        "refreshed_at": snapshot.refreshed_at
+    }
 
 # Achievements endpoint
-@app.get("/api/achievements")
+@router.get("/api/achievements")
 async def get_achievements(current_user: dict = Depends(get_current_user)):
     """Get user's achievements"""
     user_id = str(current_user["_id"])
-    achievements = list(achievements_collection.find({"user_id": user_id}))
+    earned = list(achievements_collection.find({"user_id": user_id}))
     
     return {
-        "achievements": [serialize_doc(ach) for ach in achievements]
+        "achievements": [serialize_doc(ach) for ach in earned]
     }
 
-@app.post("/api/achievements/check")
+@router.post("/api/achievements/check")
 async def check_achievements(current_user: dict = Depends(get_current_user)):
-    """Check and award new achievements"""
-    user_id = str(current_user["_id"])
-    user_xp = current_user.get("xp", 0)
-    user_streak = current_user.get("streak", 0)
-    
-    # Get completed lessons count
-    completed_count = user_progress_collection.count_documents({
-        "user_id": user_id,
-        "completed": True
-    })
-    
-    new_achievements = []
-    
-    # Define achievement criteria
-    achievement_types = [
-        {"type": "first_lesson", "condition": completed_count >= 1, "name": "İlk Ders!", "icon": "🎯"},
-        {"type": "five_lessons", "condition": completed_count >= 5, "name": "Hızlı Başlangıç", "icon": "🚀"},
-        {"type": "ten_lessons", "condition": completed_count >= 10, "name": "Kararlı Öğrenci", "icon": "💪"},
-        {"type": "streak_3", "condition": user_streak >= 3, "name": "3 Günlük Seri", "icon": "🔥"},
-        {"type": "streak_7", "condition": user_streak >= 7, "name": "Haftalık Kahraman", "icon": "⭐"},
-        {"type": "xp_100", "condition": user_xp >= 100, "name": "100 XP", "icon": "💯"},
-        {"type": "xp_500", "condition": user_xp >= 500, "name": "500 XP Master", "icon": "👑"},
-    ]
-    
-    for ach_type in achievement_types:
-        if ach_type["condition"]:
-            # Check if already earned
-            existing = achievements_collection.find_one({
-                "user_id": user_id,
-                "badge_type": ach_type["type"]
-            })
-            
-            if not existing:
-                # Award new achievement
-                new_ach = {
-                    "user_id": user_id,
-                    "badge_type": ach_type["type"],
-                    "name": ach_type["name"],
-                    "icon": ach_type["icon"],
-                    "earned_at": datetime.utcnow().isoformat()
-                }
-                result = achievements_collection.insert_one(new_ach)
-                # Serialize for response
-                new_ach_response = {
-                    "id": str(result.inserted_id),
-                    "user_id": user_id,
-                    "badge_type": ach_type["type"],
-                    "name": ach_type["name"],
-                    "icon": ach_type["icon"],
-                    "earned_at": new_ach["earned_at"]
-                }
-                new_achievements.append(new_ach_response)
+    """Badges earned since the last check (awarded as XP, lesson and streak events happen)"""
+    new_achievements = achievements.pop_unseen(current_user)
     
     return {
         "new_achievements": new_achievements,
         "message": f"{len(new_achievements)} yeni rozet kazandınız!" if new_achievements else "Yeni rozet yok"
     }
 
-if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8001)
-
-# Import Duolingo features
-from duolingo_features import (
-    initialize_shop, refill_hearts_if_needed, deduct_heart,
-    update_league_standings, get_league_standings,
-    update_daily_goal_progress, get_skill_tree_lessons,
-    init_collections
-)
-
-# Initialize collections for duolingo features
-init_collections(db)
-
 # Shop endpoints
-@app.get("/api/shop")
-async def get_shop(current_user: dict = Depends(get_current_user)):
-    """Get all shop items"""
-    await initialize_shop()
-    items = list(shop_items_collection.find())
-    return {"items": [serialize_doc(item) for item in items]}
-
-@app.post("/api/shop/purchase/{item_id}")
+@router.get("/api/shop")
+async def get_shop(request: Request, current_user: dict = Depends(get_current_user)):
+    """Get all shop items (seeded once at startup)"""
+    entry = content_store.get("shop")
+    if entry is None:
+        items = list(shop_items_collection.find())
+        entry = content_store.put("shop", {"items": [serialize_doc(item) for item in items]}, SHOP_CONTENT_CACHE)
+    return content_response(request, entry)
+
+@router.post("/api/shop/purchase/{item_id}")
 async def purchase_item(item_id: str, current_user: dict = Depends(get_current_user)):
     """Purchase an item from shop"""
     try:
@@ -770,109 +746,96 @@ async def purchase_item(item_id: str, current_user: dict = Depends(get_current_u
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
     
-    user_gems = current_user.get("gems", 0)
-    if user_gems < item["price"]:
+    gems_remaining = inventory.purchase_item(current_user, item)
+    if gems_remaining is None:
         raise HTTPException(status_code=400, detail="Not enough gems")
     
-    # Deduct gems
-    users_collection.update_one(
-        {"_id": current_user["_id"]},
-        {"$inc": {"gems": -item["price"]}}
-    )
-    
-    # Apply item effect
-    if item["item_type"] == "heart_refill":
-        users_collection.update_one(
-            {"_id": current_user["_id"]},
-            {"$set": {"hearts": current_user.get("max_hearts", 5)}}
-        )
-    elif item["item_type"] == "streak_freeze":
-        user_inventory_collection.insert_one({
-            "user_id": str(current_user["_id"]),
-            "item_type": "streak_freeze",
-            "quantity": 1,
-            "purchased_at": datetime.utcnow().isoformat()
-        })
-    elif item["item_type"] == "xp_boost":
-        user_inventory_collection.insert_one({
-            "user_id": str(current_user["_id"]),
-            "item_type": "xp_boost",
-            "active_until": (datetime.utcnow() + timedelta(minutes=15)).isoformat(),
-            "purchased_at": datetime.utcnow().isoformat()
-        })
-    elif item["item_type"] == "heart_increase":
-        users_collection.update_one(
-            {"_id": current_user["_id"]},
-            {"$inc": {"max_hearts": 1}}
-        )
-    elif item["item_type"] == "timer_boost":
-        user_inventory_collection.insert_one({
-            "user_id": str(current_user["_id"]),
-            "item_type": "timer_boost",
-            "active_until": (datetime.utcnow() + timedelta(minutes=15)).isoformat(),
-            "purchased_at": datetime.utcnow().isoformat()
-        })
-    elif item["item_type"] in ("hint_token", "mistake_shield", "level_skip", "bonus_lesson"):
-        user_inventory_collection.insert_one({
-            "user_id": str(current_user["_id"]),
-            "item_type": item["item_type"],
-            "quantity": 1,
-            "purchased_at": datetime.utcnow().isoformat()
-        })
-    
-    return {"message": "Purchase successful", "gems_remaining": user_gems - item["price"]}
+    return {"message": "Purchase successful", "gems_remaining": gems_remaining}
+
+@router.get("/api/inventory")
+async def get_inventory(current_user: dict = Depends(get_current_user)):
+    """Owned items and active power-ups"""
+    return inventory.get_inventory(current_user)
 
 # Hearts endpoint
-@app.post("/api/hearts/refill")
+@router.post("/api/hearts/refill")
 async def refill_hearts(current_user: dict = Depends(get_current_user)):
     """Refill hearts (passive refill check)"""
     new_hearts = await refill_hearts_if_needed(current_user)
     return {"hearts": new_hearts, "max_hearts": current_user.get("max_hearts", 5)}
 
 # League endpoints
-@app.get("/api/league/standings")
+@router.get("/api/league/standings")
 async def league_standings(current_user: dict = Depends(get_current_user)):
     """Get current league standings"""
-    standings = await get_league_standings(str(current_user["_id"]))
+    standings = await get_league_standings(current_user)
     return {
         "league": current_user.get("league", "bronze"),
-        "standings": standings
+        "standings": standings,
+        "around_me": await get_league_neighbours(current_user)
     }
 
-@app.post("/api/league/join")
+@router.post("/api/league/join")
 async def join_league(current_user: dict = Depends(get_current_user)):
     """Join this week's league"""
     await update_league_standings(str(current_user["_id"]))
     return {"message": "Joined league"}
 
 # Daily goal endpoint
-@app.get("/api/daily-goal")
+@router.get("/api/daily-goal")
 async def get_daily_goal(current_user: dict = Depends(get_current_user)):
     """Get daily goal progress"""
+    goal = current_user.get("daily_goal", 50)
+    progress = xp_ledger.get_day_xp(str(current_user["_id"]))
     return {
-        "goal": current_user.get("daily_goal", 50),
-        "progress": current_user.get("daily_goal_progress", 0),
-        "completed": current_user.get("daily_goal_progress", 0) >= current_user.get("daily_goal", 50)
+        "goal": goal,
+        "progress": progress,
+        "completed": progress >= goal
     }
 
+# XP history endpoints (XP ledger range reads)
+@router.get("/api/xp/weekly")
+async def get_weekly_xp(current_user: dict = Depends(get_current_user)):
+    """XP earned this week (Monday-based, UTC)"""
+    return {"xp": xp_ledger.get_week_xp(str(current_user["_id"]))}
+
+@router.get("/api/xp/heatmap")
+async def get_xp_heatmap(days: int = 365, current_user: dict = Depends(get_current_user)):
+    """Per-day XP for the activity heatmap"""
+    days = min(max(days, 1), 366)
+    return {"days": xp_ledger.get_activity_heatmap(str(current_user["_id"]), days)}
+
 # Skill tree endpoint
-@app.get("/api/skill-tree")
+@router.get("/api/skill-tree")
 async def get_skill_tree(current_user: dict = Depends(get_current_user)):
     """Get skill tree (lesson path)"""
     tree = await get_skill_tree_lessons(current_user)
     return {"tree": tree}
 
 # Friends endpoints
-@app.get("/api/friends")
+FRIEND_PROJECTION = {"username": 1, "xp": 1, "streak": 1, "level": 1}
+friends_leaderboard_cache = TTLCache(ttl_seconds=60)
+metrics.register_cache("friends_leaderboard", friends_leaderboard_cache)
+
+@router.get("/api/friends")
 async def get_friends(current_user: dict = Depends(get_current_user)):
     """Get user's friends list"""
-    friend_ids = current_user.get("friends", [])
+    friend_ids = friend_graph.get_friend_ids(str(current_user["_id"]))
+    if not friend_ids:
+        return {"friends": []}
+    
+    found = users_collection.find(
+        {"_id": {"$in": [ObjectId(friend_id) for friend_id in friend_ids]}},
+        FRIEND_PROJECTION
+    )
+    by_id = {str(friend["_id"]): friend for friend in found}
+    
     friends = []
     for friend_id in friend_ids:
-        friend = users_collection.find_one({"_id": ObjectId(friend_id)})
+        friend = by_id.get(friend_id)
         if friend:
             friends.append({
-                "id": str(friend["_id"]),
+                "id": friend_id,
                 "username": friend["username"],
                 "xp": friend.get("xp", 0),
                 "streak": friend.get("streak", 0),
@@ -880,59 +843,103 @@ async def get_friends(current_user: dict = Depends(get_current_user)):
             })
     return {"friends": friends}
 
-@app.post("/api/friends/add/{username}")
+def build_friends_leaderboard(user_id: str, friend_ids: List[str]):
+    """Weekly and all-time XP among friends (and the caller) in one aggregation"""
+    member_ids = [ObjectId(user_id)] + [ObjectId(friend_id) for friend_id in friend_ids]
+    rows = list(users_collection.aggregate([
+        {"$match": {"_id": {"$in": member_ids}}},
+        {"$project": {**FRIEND_PROJECTION, "uid": {"$toString": "$_id"}}},
+        # let/$expr form: localField together with pipeline needs MongoDB 5.0
+        {"$lookup": {
+            "from": "league_members",
+            "let": {"uid": "$uid"},
+            "pipeline": [
+                {"$match": {"week": current_week_key(), "$expr": {"$eq": ["$user_id", "$$uid"]}}},
+                {"$project": {"xp_this_week": 1}}
+            ],
+            "as": "membership"
+        }},
+        {"$project": {
+            **FRIEND_PROJECTION,
+            "uid": 1,
+            "xp_this_week": {"$ifNull": [{"$arrayElemAt": ["$membership.xp_this_week", 0]}, 0]}
+        }}
+    ]))
+    
+    def ranked(key):
+        ordered = sorted(rows, key=lambda row: (-row.get(key, 0), row["username"]))
+        return [
+            {
+                "rank": idx + 1,
+                "id": row["uid"],
+                "username": row["username"],
+                "xp": row.get(key, 0),
+                "level": row.get("level", 1),
+                "streak": row.get("streak", 0),
+                "is_current_user": row["uid"] == user_id
+            }
+            for idx, row in enumerate(ordered)
+        ]
+    
+    return {"weekly": ranked("xp_this_week"), "all_time": ranked("xp")}
+
+@router.get("/api/friends/leaderboard")
+async def get_friends_leaderboard(current_user: dict = Depends(get_current_user)):
+    """Weekly and all-time XP ranking among friends (cached briefly per user)"""
+    user_id = str(current_user["_id"])
+    cached = friends_leaderboard_cache.get(user_id)
+    if cached is None:
+        cached = build_friends_leaderboard(user_id, friend_graph.get_friend_ids(user_id))
+        friends_leaderboard_cache.set(user_id, cached)
+    return cached
+
+@router.get("/api/friends/suggestions")
+async def get_friend_suggestions(current_user: dict = Depends(get_current_user)):
+    """Suggested friends (mutual friends, same league cohort, similar level), precomputed nightly"""
+    return friend_graph.get_friend_suggestions(str(current_user["_id"]))
+
+@router.post("/api/friends/add/{username}")
 async def add_friend(username: str, current_user: dict = Depends(get_current_user)):
     """Add a friend by username"""
-    friend = users_collection.find_one({"username": username})
+    friend = users_collection.find_one({"username": username}, {"_id": 1})
     if not friend:
         raise HTTPException(status_code=404, detail="User not found")
     
+    user_id = str(current_user["_id"])
     friend_id = str(friend["_id"])
-    if friend_id == str(current_user["_id"]):
+    if friend_id == user_id:
         raise HTTPException(status_code=400, detail="Cannot add yourself")
     
-    if friend_id in current_user.get("friends", []):
+    if friend_graph.are_friends(user_id, friend_id):
         raise HTTPException(status_code=400, detail="Already friends")
     
-    # Add to both users' friend lists
-    users_collection.update_one(
-        {"_id": current_user["_id"]},
-        {"$push": {"friends": friend_id}}
-    )
-    users_collection.update_one(
-        {"_id": friend["_id"]},
-        {"$push": {"friends": str(current_user["_id"])}}
-    )
+    # One edge per direction
+    friend_graph.add_friendship(user_id, friend_id)
+    friends_leaderboard_cache.invalidate(user_id)
+    friends_leaderboard_cache.invalidate(friend_id)
     
     return {"message": f"Added {username} as friend"}
 
-@app.delete("/api/friends/remove/{friend_id}")
+@router.delete("/api/friends/remove/{friend_id}")
 async def remove_friend(friend_id: str, current_user: dict = Depends(get_current_user)):
     """Remove a friend"""
-    users_collection.update_one(
-        {"_id": current_user["_id"]},
-        {"$pull": {"friends": friend_id}}
-    )
-    users_collection.update_one(
-        {"_id": ObjectId(friend_id)},
-        {"$pull": {"friends": str(current_user["_id"])}}
-    )
+    user_id = str(current_user["_id"])
+    friend_graph.remove_friendship(user_id, friend_id)
+    friends_leaderboard_cache.invalidate(user_id)
+    friends_leaderboard_cache.invalidate(friend_id)
     return {"message": "Friend removed"}
 
 
 # Stories endpoints
-@app.get("/api/stories")
+@router.get("/api/stories")
 async def get_stories(current_user: dict = Depends(get_current_user)):
     """Get available stories"""
     stories = list(stories_collection.find().sort("level", ASCENDING))
-    user_id = str(current_user["_id"])
+    progress_by_story = get_progress_by_item(str(current_user["_id"]), "story_id")
     
     stories_with_progress = []
     for story in stories:
-        progress = user_progress_collection.find_one({
-            "user_id": user_id,
-            "story_id": str(story["_id"])
-        })
+        progress = progress_by_story.get(str(story["_id"]))
         
         story_data = serialize_doc(story)
         story_data["completed"] = progress.get("completed", False) if progress else False
@@ -940,9 +947,10 @@ async def get_stories(current_user: dict = Depends(get_current_user)):
     
     return {"stories": stories_with_progress}
 
-@app.post("/api/stories/generate")
+@router.post("/api/stories/generate")
 async def generate_story(level: int, current_user: dict = Depends(get_current_user)):
     """Generate a new story using AI"""
+    LlmChat, UserMessage = llm_classes()
     chat = LlmChat(
         api_key=EMERGENT_LLM_KEY,
         session_id=f"story_gen_{level}",
@@ -982,7 +990,8 @@ async def generate_story(level: int, current_user: dict = Depends(get_current_us
     Lütfen sadece JSON yanıtı ver."""
     
     user_message = UserMessage(text=prompt)
-    response = await chat.send_message(user_message)
+    async with metrics.track_llm("story"):
+        response = await chat.send_message(user_message)
     
     import json
     try:
@@ -996,7 +1005,7 @@ async def generate_story(level: int, current_user: dict = Depends(get_current_us
         clean_response = clean_response.strip()
         
         story_data = json.loads(clean_response)
-        story_data["created_at"] = datetime.utcnow().isoformat()
+        story_data["created_at"] = datetime.utcnow()
         
         result = stories_collection.insert_one(story_data)
         story_data["id"] = str(result.inserted_id)
@@ -1006,20 +1015,24 @@ async def generate_story(level: int, current_user: dict = Depends(get_current_us
     except json.JSONDecodeError as e:
         raise HTTPException(status_code=500, detail="Failed to generate story")
 
-@app.get("/api/stories/{story_id}")
-async def get_story(story_id: str, current_user: dict = Depends(get_current_user)):
+@router.get("/api/stories/{story_id}")
+async def get_story(story_id: str, request: Request, current_user: dict = Depends(get_current_user)):
     """Get specific story"""
-    try:
-        story = stories_collection.find_one({"_id": ObjectId(story_id)})
-    except:
-        raise HTTPException(status_code=400, detail="Invalid story ID")
-    
-    if not story:
-        raise HTTPException(status_code=404, detail="Story not found")
+    entry = content_store.get(f"story:{story_id}")
+    if entry is None:
+        try:
+            story = stories_collection.find_one({"_id": ObjectId(story_id)})
+        except:
+            raise HTTPException(status_code=400, detail="Invalid story ID")
+        
+        if not story:
+            raise HTTPException(status_code=404, detail="Story not found")
+        
+        entry = content_store.put(f"story:{story_id}", serialize_doc(story), IMMUTABLE_CONTENT_CACHE)
     
-    return serialize_doc(story)
+    return content_response(request, entry)
 
-@app.post("/api/stories/{story_id}/complete")
+@router.post("/api/stories/{story_id}/complete")
 async def complete_story(story_id: str, score: int, current_user: dict = Depends(get_current_user)):
     """Mark story as complete"""
     user_id = str(current_user["_id"])
@@ -1030,23 +1043,19 @@ async def complete_story(story_id: str, score: int, current_user: dict = Depends
             "$set": {
                 "completed": True,
                 "score": score,
-                "completed_at": datetime.utcnow().isoformat()
+                "completed_at": datetime.utcnow()
             }
         },
         upsert=True
     )
     
     # Award XP
-    xp_earned = 30
-    users_collection.update_one(
-        {"_id": current_user["_id"]},
-        {"$inc": {"xp": xp_earned}}
-    )
+    xp_earned = await award_xp(current_user, 30, "story")
     
     return {"message": "Story completed", "xp_earned": xp_earned}
 
 # Practice endpoints
-@app.get("/api/practice/mistakes")
+@router.get("/api/practice/mistakes")
 async def get_practice_mistakes(current_user: dict = Depends(get_current_user)):
     """Get questions user got wrong for practice"""
     user_id = str(current_user["_id"])
@@ -1075,10 +1084,10 @@ async def get_practice_mistakes(current_user: dict = Depends(get_current_user)):
         except:
             continue
     
-    now_iso = datetime.utcnow().isoformat()
+    now = datetime.utcnow()
     due_reviews = list(mistakes_collection.find({
         "user_id": user_id,
-        "next_review_at": {"$lte": now_iso}
+        "next_review_at": {"$lte": now}
     }).sort("next_review_at", ASCENDING).limit(30))
 
     return {
@@ -1097,16 +1106,16 @@ async def get_practice_mistakes(current_user: dict = Depends(get_current_user)):
         ],
     }
 
-@app.post("/api/practice/session")
+@router.post("/api/practice/session")
 async def create_practice_session(current_user: dict = Depends(get_current_user)):
     """Create a practice session with mixed questions"""
     user_id = str(current_user["_id"])
     
     # 1) Prioritize SRS queue items due now
-    now_iso = datetime.utcnow().isoformat()
+    now = datetime.utcnow()
     due_reviews = list(mistakes_collection.find({
         "user_id": user_id,
-        "next_review_at": {"$lte": now_iso}
+        "next_review_at": {"$lte": now}
     }).sort("next_review_at", ASCENDING).limit(10))
 
     adaptive_type_boost = {}
@@ -1120,29 +1129,34 @@ async def create_practice_session(current_user: dict = Depends(get_current_user)
         "score": {"$lt": 80}
     }).limit(5))
     
+    # 3) One lookup for every lesson referenced by the weak areas and the due reviews
+    lesson_ids = {item.get("lesson_id") for item in poor_progress + due_reviews}
+    lessons_by_id = {
+        str(lesson["_id"]): lesson
+        for lesson in lessons_collection.find(
+            {"_id": {"$in": [ObjectId(lesson_id) for lesson_id in lesson_ids if ObjectId.is_valid(lesson_id)]}},
+            {"title": 1, "exercises": 1}
+        )
+    }
+    
     all_exercises = []
+    preferred_types = sorted(adaptive_type_boost.items(), key=lambda x: x[1], reverse=True)
     for progress in poor_progress:
         lesson_id = progress.get("lesson_id")
-        try:
-            lesson = lessons_collection.find_one({"_id": ObjectId(lesson_id)})
-            if lesson:
-                exercises = lesson.get("exercises", [])
-                preferred_types = sorted(adaptive_type_boost.items(), key=lambda x: x[1], reverse=True)
-
-                if preferred_types:
-                    ranked_exercises = sorted(
-                        exercises,
-                        key=lambda ex: 0 if detect_error_type(ex) == preferred_types[0][0] else 1
-                    )
-                else:
-                    ranked_exercises = exercises
-
-                for ex in ranked_exercises[:2]:  # Take 2 exercises per weak lesson
-                    ex["lesson_id"] = lesson_id
-                    ex["lesson_title"] = lesson.get("title")
-                    all_exercises.append(ex)
-        except:
+        lesson = lessons_by_id.get(lesson_id)
+        if not lesson:
             continue
+        exercises = lesson.get("exercises", [])
+        if preferred_types:
+            ranked_exercises = sorted(
+                exercises,
+                key=lambda ex: 0 if detect_error_type(ex) == preferred_types[0][0] else 1
+            )
+        else:
+            ranked_exercises = exercises
+
+        for ex in ranked_exercises[:2]:  # Take 2 exercises per weak lesson
+            all_exercises.append({**ex, "lesson_id": lesson_id, "lesson_title": lesson.get("title")})
     
     # Shuffle exercises
     import random
@@ -1150,21 +1164,19 @@ async def create_practice_session(current_user: dict = Depends(get_current_user)
     
     due_review_exercises = []
     for review in due_reviews:
-        try:
-            lesson = lessons_collection.find_one({"_id": ObjectId(review.get("lesson_id"))})
-            if not lesson:
-                continue
-            exercises = lesson.get("exercises", [])
-            ex_index = review.get("exercise_index", 0)
-            if ex_index >= len(exercises):
-                continue
-            ex = exercises[ex_index]
-            ex["lesson_id"] = review.get("lesson_id")
-            ex["lesson_title"] = lesson.get("title")
-            ex["review_reason"] = review.get("error_type")
-            due_review_exercises.append(ex)
-        except:
+        lesson = lessons_by_id.get(review.get("lesson_id"))
+        if not lesson:
+            continue
+        exercises = lesson.get("exercises", [])
+        ex_index = review.get("exercise_index", 0)
+        if ex_index >= len(exercises):
             continue
+        due_review_exercises.append({
+            **exercises[ex_index],
+            "lesson_id": review.get("lesson_id"),
+            "lesson_title": lesson.get("title"),
+            "review_reason": review.get("error_type")
+        })
 
     mixed = (due_review_exercises + all_exercises)[:10]
 
@@ -1175,20 +1187,21 @@ async def create_practice_session(current_user: dict = Depends(get_current_user)
         "srs_due_count": len(due_review_exercises),
     }
 
-@app.get("/api/practice/review-queue")
+@router.get("/api/practice/review-queue")
 async def get_review_queue(current_user: dict = Depends(get_current_user)):
-    """SRS tekrar kuyruğunu getirir (1g/3g/7g/14g/30g)."""
+    """SRS tekrar kuyruğunu getirir (SM-2 aralıkları)."""
     user_id = str(current_user["_id"])
-    now_iso = datetime.utcnow().isoformat()
+    now = datetime.utcnow()
+    stats = review_stats.get_review_stats(user_id, now)
     queue = list(mistakes_collection.find({
         "user_id": user_id
     }).sort("next_review_at", ASCENDING).limit(50))
 
-    due = [item for item in queue if item.get("next_review_at", now_iso) <= now_iso]
-
     return {
-        "due_now": len(due),
-        "total_tracked": len(queue),
+        "due_now": stats["due"],
+        "total_tracked": stats["tracked"],
+        "by_error_type": stats["by_error_type"],
+        "due_histogram": stats["due_histogram"],
         "queue": [
             {
                 "lesson_id": item.get("lesson_id"),
@@ -1199,15 +1212,20 @@ async def get_review_queue(current_user: dict = Depends(get_current_user)):
                 "mistake_count": item.get("mistake_count", 0),
                 "repetition_count": item.get("repetition_count", 0),
                 "next_review_at": item.get("next_review_at"),
-                "status": "due" if item.get("next_review_at", now_iso) <= now_iso else "scheduled",
+                "status": "due" if as_datetime(item.get("next_review_at"), now) <= now else "scheduled",
             }
             for item in queue
         ]
     }
 
+@router.get("/api/practice/review-stats")
+async def get_review_stats(current_user: dict = Depends(get_current_user)):
+    """SRS sayaçları (rozet ve panolar için tek doküman okuması)."""
+    return review_stats.get_review_stats(str(current_user["_id"]))
+
 
 # User preferences endpoint
-@app.post("/api/user/update-preferences")
+@router.post("/api/user/update-preferences")
 async def update_preferences(
     reason: str = None,
     daily_goal: int = None,
@@ -1233,3 +1251,33 @@ async def update_preferences(
         )
     
     return {"message": "Preferences updated", "updated": update_data}
+
+def create_app() -> FastAPI:
+    """Build the API; MongoDB is connected in lifespan(), once per worker process"""
+    app = FastAPI(title="Romingo API", default_response_class=ORJSONResponse, lifespan=lifespan)
+
+    # CORS middleware
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    # Prometheus metrics: per-route latency / in-flight, Mongo commands, LLM calls, caches
+    app.middleware("http")(metrics.track_requests)
+    app.add_api_route("/metrics", metrics.metrics_endpoint, methods=["GET"], include_in_schema=False)
+
+    # Log requests that issue more Mongo commands than QUERY_BUDGET (N+1 guard)
+    app.middleware("http")(query_budget.enforce_budget)
+
+    app.include_router(router)
+    return app
+
+app = create_app()
+
+if __name__ == "__main__":
+    import uvicorn
+    # Single process by default; use gunicorn.conf.py for the multi-worker profile
+    uvicorn.run("server:app", host="0.0.0.0", port=8001, workers=int(os.getenv("WEB_CONCURRENCY", "1")))
@@ -0,0 +1,124 @@
+from datetime import datetime
+from timeutils import as_datetime
+
+# SM-2 spaced repetition scheduler for the mistake bank.
+# Every tracked item keeps its own ease factor and interval, so items that are
+# missed often come back sooner than items that are answered correctly.
+
+DEFAULT_EASE = 2.5
+MIN_EASE = 1.3
+MAX_INTERVAL_DAYS = 365
+PASSING_QUALITY = 3
+
+# Answer quality on the SM-2 0-5 scale
+CORRECT_QUALITY = 4
+NEAR_MISS_QUALITY = 2
+WRONG_QUALITY = 1
+NEAR_MISS_SIMILARITY = 0.6
+
+def answer_quality(is_correct: bool, similarity: float = 0.0) -> int:
+    """Map a graded answer to an SM-2 quality score"""
+    if is_correct:
+        return CORRECT_QUALITY
+    if similarity >= NEAR_MISS_SIMILARITY:
+        return NEAR_MISS_QUALITY
+    return WRONG_QUALITY
+
+def ease_delta(quality: int) -> float:
+    return 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02)
+
+def schedule_review(ease: float, interval_days: int, repetition_count: int, quality: int):
+    """Apply one answer to an item's state. Returns (ease, interval_days, repetition_count)."""
+    if quality < PASSING_QUALITY:
+        repetition_count = 0
+        interval_days = 1
+    else:
+        if repetition_count == 0:
+            interval_days = 1
+        elif repetition_count == 1:
+            interval_days = 6
+        else:
+            interval_days = round(interval_days * ease)
+        repetition_count += 1
+
+    interval_days = min(max(int(interval_days), 1), MAX_INTERVAL_DAYS)
+    ease = max(MIN_EASE, ease + ease_delta(quality))
+    return ease, interval_days, repetition_count
+
+def derive_state_batch(repetition_count, mistake_count):
+    """Reconstruct SM-2 state for items tracked by the old fixed 1/3/7/14/30 schedule.
+
+    Correct answers do not move the ease factor (CORRECT_QUALITY is neutral), so the
+    ease only depends on how often the item was missed and the interval on how many
+    correct answers followed the last miss.
+    """
+    import numpy as np
+
+    repetition_count = np.asarray(repetition_count, dtype=np.int64)
+    mistake_count = np.asarray(mistake_count, dtype=np.int64)
+
+    ease = np.maximum(MIN_EASE, DEFAULT_EASE + mistake_count * ease_delta(WRONG_QUALITY))
+    grown = 6 * np.power(ease, np.maximum(repetition_count - 2, 0))
+    interval_days = np.where(repetition_count <= 1, 1, np.rint(grown))
+    interval_days = np.clip(interval_days, 1, MAX_INTERVAL_DAYS).astype(np.int64)
+    return ease, interval_days
+
+def due_dates_batch(last_seen_at, interval_days):
+    """Vectorized last_seen_at + interval_days, returned as datetimes (BSON date precision)"""
+    import numpy as np
+
+    seen = np.asarray(last_seen_at, dtype="datetime64[ms]")
+    days = np.asarray(interval_days, dtype=np.int64).astype("timedelta64[D]")
+    return (seen + days).tolist()
+
+def migrate_legacy_mistakes(mistakes_collection, batch_size: int = 10000):
+    """One-off migration: give items tracked by the old fixed schedule their SM-2 state.
+
+    Only items without an ease factor are read; their ease/interval are derived
+    from the counters and next_review_at from last_seen_at. Items that already
+    carry state are rescheduled per answer (mistake_bank) and never touched here,
+    so re-running the job is cheap. Returns the number of documents migrated.
+    """
+    projection = {
+        "repetition_count": 1,
+        "mistake_count": 1,
+        "last_seen_at": 1,
+        "created_at": 1,
+    }
+    cursor = mistakes_collection.find({"ease": {"$exists": False}}, projection, batch_size=batch_size)
+
+    total = 0
+    batch = []
+    for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            total += _write_updates(mistakes_collection, legacy_state_updates(batch))
+            batch = []
+    if batch:
+        total += _write_updates(mistakes_collection, legacy_state_updates(batch))
+    return total
+
+def legacy_state_updates(docs, now: datetime = None):
+    """UpdateOne per legacy item setting the derived SM-2 state (no database access)"""
+    import numpy as np
+    from pymongo import UpdateOne
+
+    now = now or datetime.utcnow()
+    repetitions = np.array([doc.get("repetition_count", 0) for doc in docs], dtype=np.int64)
+    mistakes = np.array([doc.get("mistake_count", 1) for doc in docs], dtype=np.int64)
+    last_seen = [as_datetime(doc.get("last_seen_at") or doc.get("created_at"), now) for doc in docs]
+
+    ease, interval = derive_state_batch(repetitions, mistakes)
+    due = due_dates_batch(last_seen, interval)
+
+    # Guarded on the missing ease so an answer graded meanwhile is not overwritten
+    return [
+        UpdateOne(
+            {"_id": doc["_id"], "ease": {"$exists": False}},
+            {"$set": {"ease": doc_ease, "interval_days": doc_interval, "next_review_at": doc_due}},
+        )
+        for doc, doc_ease, doc_interval, doc_due in zip(docs, ease.tolist(), interval.tolist(), due)
+    ]
+
+def _write_updates(mistakes_collection, operations) -> int:
+    return mistakes_collection.bulk_write(operations, ordered=False).modified_count
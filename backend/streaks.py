@@ -0,0 +1,232 @@
+from datetime import datetime, timedelta
+from timeutils import as_datetime
+from xp_ledger import day_start
+
+# Daily streaks derived from learning activity.
+# Users carry {"streak", "last_activity_day", "streak_freezes"}: the first XP
+# award of a UTC day extends the streak, and a nightly batch job resets broken
+# streaks, spends a streak freeze on a single missed day and precomputes the
+# "streak at risk" list for reminders. Every step is a conditional
+# update_many / bulk insert, so the job never loads users one by one.
+# Users from before last_activity_day existed keep their stored streak until
+# migrate_activity_days has derived the field (the nightly job runs it first).
+
+users_collection = None
+streak_at_risk_collection = None
+user_inventory_collection = None
+xp_ledger_collection = None
+
+def init_collections(db):
+    """Initialize collections from main server"""
+    global users_collection, streak_at_risk_collection, user_inventory_collection, xp_ledger_collection
+
+    users_collection = db.users
+    streak_at_risk_collection = db.streak_at_risk
+    user_inventory_collection = db.user_inventory
+    xp_ledger_collection = db.xp_ledger
+
+def ensure_indexes():
+    # The nightly job only ever scans users with a live streak
+    users_collection.create_index(
+        [("last_activity_day", 1)],
+        partialFilterExpression={"streak": {"$gt": 0}}
+    )
+    streak_at_risk_collection.create_index([("day", 1), ("user_id", 1)], unique=True)
+
+def legacy_activity_day(user: dict):
+    """Best guess at a pre-migration user's last active day: the day of their last login"""
+    last_login = as_datetime(user.get("last_login"))
+    return day_start(last_login) if last_login else None
+
+def record_activity(user: dict, now: datetime = None) -> int:
+    """Extend the user's streak on their first activity of the day. Returns the streak."""
+    now = now or datetime.utcnow()
+    today = day_start(now)
+    if "last_activity_day" not in user:
+        return adopt_legacy_streak(user, today)
+    if user.get("last_activity_day") == today:
+        return user.get("streak", 0)
+
+    # Active yesterday (or yesterday was covered by a freeze): extend the streak
+    extended = users_collection.update_one(
+        {"_id": user["_id"], "last_activity_day": today - timedelta(days=1)},
+        {"$inc": {"streak": 1}, "$set": {"last_activity_day": today}}
+    )
+    if extended.modified_count:
+        return user.get("streak", 0) + 1
+
+    # Otherwise start a new streak, unless another request already counted today
+    users_collection.update_one(
+        {"_id": user["_id"], "last_activity_day": {"$ne": today}},
+        {"$set": {"streak": 1, "last_activity_day": today}}
+    )
+    return 1
+
+def adopt_legacy_streak(user: dict, today: datetime) -> int:
+    """First activity of a user without last_activity_day: continue the stored streak"""
+    last_day = legacy_activity_day(user)
+    streak = user.get("streak", 0)
+    if last_day == today - timedelta(days=1):
+        streak += 1
+    elif last_day != today:
+        streak = 1
+    users_collection.update_one(
+        {"_id": user["_id"], "last_activity_day": {"$exists": False}},
+        {"$set": {"streak": max(streak, 1), "last_activity_day": today}}
+    )
+    return max(streak, 1)
+
+def current_streak(user: dict, now: datetime = None) -> int:
+    """Streak as shown to the user: 0 once a day was missed, even before the nightly job runs"""
+    now = now or datetime.utcnow()
+    if "last_activity_day" not in user:
+        # Not migrated yet: trust the stored streak
+        return user.get("streak", 0)
+    last_day = user["last_activity_day"]
+    if not last_day or last_day < day_start(now) - timedelta(days=1):
+        return 0
+    return user.get("streak", 0)
+
+def run_nightly_maintenance(now: datetime = None, batch_size: int = 10000):
+    """Close out yesterday for every user with a live streak.
+
+    Run shortly after midnight UTC. Users who missed yesterday spend one streak
+    freeze if they have one, otherwise their streak is reset; users who were
+    active yesterday but not yet today are written to streak_at_risk.
+    Returns counts per step.
+    """
+    today = day_start(now or datetime.utcnow())
+    yesterday = today - timedelta(days=1)
+
+    frozen = users_collection.update_many(
+        {
+            "streak": {"$gt": 0},
+            "last_activity_day": yesterday - timedelta(days=1),
+            "streak_freezes": {"$gte": 1},
+        },
+        {
+            "$inc": {"streak_freezes": -1},
+            "$set": {"last_activity_day": yesterday, "last_streak_freeze_used": yesterday},
+        }
+    )
+
+    # Users without last_activity_day are left alone until migrate_activity_days has run
+    reset = users_collection.update_many(
+        {"streak": {"$gt": 0}, "last_activity_day": {"$lt": yesterday}},
+        {"$set": {"streak": 0}}
+    )
+
+    at_risk = rebuild_streak_at_risk(today, batch_size=batch_size)
+    return {"frozen": frozen.modified_count, "reset": reset.modified_count, "at_risk": at_risk}
+
+def rebuild_streak_at_risk(today: datetime, batch_size: int = 10000) -> int:
+    """Precompute today's reminder list: streaks that end unless the user practices today"""
+    streak_at_risk_collection.delete_many({"day": {"$lte": today}})
+
+    cursor = users_collection.find(
+        {"streak": {"$gt": 0}, "last_activity_day": today - timedelta(days=1)},
+        {"streak": 1, "streak_freezes": 1},
+        batch_size=batch_size
+    )
+
+    written = 0
+    batch = []
+    for user in cursor:
+        batch.append({
+            "day": today,
+            "user_id": str(user["_id"]),
+            "streak": user["streak"],
+            "has_freeze": user.get("streak_freezes", 0) > 0,
+        })
+        if len(batch) >= batch_size:
+            streak_at_risk_collection.insert_many(batch, ordered=False)
+            written += len(batch)
+            batch = []
+    if batch:
+        streak_at_risk_collection.insert_many(batch, ordered=False)
+        written += len(batch)
+    return written
+
+def migrate_streak_freezes(batch_size: int = 1000) -> int:
+    """Fold legacy streak_freeze inventory rows into the users.streak_freezes counter.
+
+    Safe to re-run after a crash: a user is credited only if the newest row of
+    the group is not yet recorded in streak_freezes_migrated_through, and each
+    batch's rows are deleted right after it has been credited.
+    """
+    from bson import ObjectId
+    from pymongo import UpdateOne
+
+    rows = user_inventory_collection.aggregate([
+        {"$match": {"item_type": "streak_freeze"}},
+        {"$group": {
+            "_id": "$user_id",
+            "quantity": {"$sum": {"$ifNull": ["$quantity", 1]}},
+            "row_ids": {"$push": "$_id"},
+            "last_row_id": {"$max": "$_id"},
+        }},
+    ], allowDiskUse=True)
+
+    migrated = 0
+    operations = []
+    row_ids = []
+
+    def flush():
+        users_collection.bulk_write(operations, ordered=False)
+        user_inventory_collection.delete_many({"_id": {"$in": row_ids}})
+        operations.clear()
+        row_ids.clear()
+
+    for row in rows:
+        operations.append(UpdateOne(
+            {"_id": ObjectId(row["_id"]), "streak_freezes_migrated_through": {"$ne": row["last_row_id"]}},
+            {"$inc": {"streak_freezes": row["quantity"]}, "$set": {"streak_freezes_migrated_through": row["last_row_id"]}}
+        ))
+        row_ids.extend(row["row_ids"])
+        migrated += 1
+        if len(operations) >= batch_size:
+            flush()
+    if operations:
+        flush()
+    return migrated
+
+def migrate_activity_days(batch_size: int = 1000) -> int:
+    """Derive last_activity_day for users created before it existed.
+
+    Uses the later of the user's newest XP ledger day and last login day; users
+    with neither get None and a streak of 0. Safe to re-run: only users still
+    missing the field are read and written.
+    """
+    migrated = 0
+    cursor = users_collection.find(
+        {"last_activity_day": {"$exists": False}}, {"last_login": 1}, batch_size=batch_size
+    )
+    batch = []
+    for user in cursor:
+        batch.append(user)
+        if len(batch) >= batch_size:
+            migrated += _migrate_activity_batch(batch)
+            batch = []
+    if batch:
+        migrated += _migrate_activity_batch(batch)
+    return migrated
+
+def _migrate_activity_batch(users) -> int:
+    from pymongo import UpdateOne
+
+    ledger_days = {
+        row["_id"]: row["day"]
+        for row in xp_ledger_collection.aggregate([
+            {"$match": {"user_id": {"$in": [str(user["_id"]) for user in users]}, "xp": {"$gt": 0}}},
+            {"$group": {"_id": "$user_id", "day": {"$max": "$day"}}},
+        ])
+    }
+    operations = []
+    for user in users:
+        days = [day for day in (ledger_days.get(str(user["_id"])), legacy_activity_day(user)) if day]
+        update = {"last_activity_day": max(days)} if days else {"last_activity_day": None, "streak": 0}
+        operations.append(UpdateOne(
+            {"_id": user["_id"], "last_activity_day": {"$exists": False}},
+            {"$set": update}
+        ))
+    return users_collection.bulk_write(operations, ordered=False).modified_count
@@ -0,0 +1,59 @@
+from datetime import datetime
+
+# Timestamps are stored as native BSON dates (naive UTC datetimes).
+# Documents written before that still hold ISO strings until
+# `python jobs.py migrate-dates` has converted them, so readers go through
+# as_datetime() instead of assuming either representation.
+
+def as_datetime(value, default=None):
+    """Return a datetime for a stored timestamp (BSON date or legacy ISO string)"""
+    if value is None:
+        return default
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return default
+
+# Timestamp fields per collection that used to be written as ISO strings
+DATE_FIELDS = {
+    "users": ["last_login", "last_heart_refill", "created_at"],
+    "lessons": ["created_at"],
+    "stories": ["created_at"],
+    "user_progress": ["completed_at"],
+    "user_mistakes": ["next_review_at", "last_seen_at", "created_at"],
+    "achievements": ["earned_at"],
+    "user_inventory": ["purchased_at", "active_until"],
+    "leagues": ["created_at"],
+    "league_members": ["joined_at"],
+}
+
+def migrate_date_fields(db, batch_size: int = 1000):
+    """Convert legacy ISO string timestamps to BSON dates, safe to run while the API is live.
+
+    Each update is guarded on the string value that was read, so a document the
+    API rewrote in the meantime is left alone. Returns the number of documents converted.
+    """
+    from pymongo import UpdateOne
+
+    converted = 0
+    for collection_name, fields in DATE_FIELDS.items():
+        collection = db[collection_name]
+        query = {"$or": [{field: {"$type": "string"}} for field in fields]}
+        projection = {field: 1 for field in fields}
+
+        operations = []
+        for doc in collection.find(query, projection, batch_size=batch_size):
+            legacy = {field: doc[field] for field in fields if isinstance(doc.get(field), str)}
+            update = {field: as_datetime(value) for field, value in legacy.items() if as_datetime(value)}
+            if not update:
+                continue
+            guard = {field: legacy[field] for field in update}
+            operations.append(UpdateOne({"_id": doc["_id"], **guard}, {"$set": update}))
+            if len(operations) >= batch_size:
+                converted += collection.bulk_write(operations, ordered=False).modified_count
+                operations = []
+        if operations:
+            converted += collection.bulk_write(operations, ordered=False).modified_count
+    return converted
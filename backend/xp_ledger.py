@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+
+# Append-only XP ledger, bucketed per (user, UTC day):
+#   {"user_id", "day", "xp", "event_count", "events": [{"at", "xp", "source"}]}
+# Daily goal, weekly XP and the activity heatmap are range reads over at most
+# a few hundred small bucket documents, and nothing is ever reset.
+
+MAX_EVENTS_PER_BUCKET = 500
+
+xp_ledger_collection = None
+
+def init_collections(db):
+    """Initialize collections from main server"""
+    global xp_ledger_collection
+    xp_ledger_collection = db.xp_ledger
+
+def ensure_indexes():
+    xp_ledger_collection.create_index([("user_id", 1), ("day", 1)], unique=True)
+
+def day_start(when: datetime) -> datetime:
+    return datetime(when.year, when.month, when.day)
+
+def week_start(when: datetime) -> datetime:
+    return day_start(when) - timedelta(days=when.weekday())
+
+def record_xp(user_id: str, xp: int, source: str, now: datetime = None) -> int:
+    """Append an XP event to today's bucket. Returns the day's XP total."""
+    now = now or datetime.utcnow()
+    bucket = xp_ledger_collection.find_one_and_update(
+        {"user_id": user_id, "day": day_start(now)},
+        {
+            "$inc": {"xp": xp, "event_count": 1},
+            "$push": {"events": {
+                "$each": [{"at": now, "xp": xp, "source": source}],
+                "$slice": -MAX_EVENTS_PER_BUCKET
+            }}
+        },
+        projection={"xp": 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return bucket["xp"]
+
+def get_day_xp(user_id: str, now: datetime = None) -> int:
+    now = now or datetime.utcnow()
+    bucket = xp_ledger_collection.find_one({"user_id": user_id, "day": day_start(now)}, {"xp": 1})
+    return bucket["xp"] if bucket else 0
+
+def get_xp_between(user_id: str, start: datetime, end: datetime) -> int:
+    buckets = xp_ledger_collection.find(
+        {"user_id": user_id, "day": {"$gte": start, "$lt": end}},
+        {"xp": 1}
+    )
+    return sum(bucket["xp"] for bucket in buckets)
+
+def get_week_xp(user_id: str, now: datetime = None) -> int:
+    now = now or datetime.utcnow()
+    start = week_start(now)
+    return get_xp_between(user_id, start, start + timedelta(days=7))
+
+def get_activity_heatmap(user_id: str, days: int = 365, now: datetime = None):
+    """Daily XP for the last `days` days (only active days are returned)"""
+    now = now or datetime.utcnow()
+    start = day_start(now) - timedelta(days=days - 1)
+    buckets = xp_ledger_collection.find(
+        {"user_id": user_id, "day": {"$gte": start}},
+        {"day": 1, "xp": 1, "event_count": 1}
+    ).sort("day", 1)
+    return [
+        {"day": bucket["day"].strftime("%Y-%m-%d"), "xp": bucket["xp"], "events": bucket.get("event_count", 0)}
+        for bucket in buckets
+    ]
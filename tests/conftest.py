@@ -0,0 +1,60 @@
+import os
+import sys
+import uuid
+
+import pytest
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+sys.path.insert(0, BACKEND_DIR)
+
+
+@pytest.fixture(scope="session")
+def mongo_url():
+    """URL of a MongoDB to run API tests against (TEST_MONGO_URL); skips when none answers"""
+    from pymongo import MongoClient
+    from pymongo.errors import PyMongoError
+
+    url = os.getenv("TEST_MONGO_URL", "mongodb://localhost:27017")
+    probe = MongoClient(url, serverSelectionTimeoutMS=500)
+    try:
+        probe.admin.command("ping")
+    except PyMongoError:
+        pytest.skip(f"no MongoDB reachable at {url}")
+    finally:
+        probe.close()
+    return url
+
+
+@pytest.fixture
+def db(mongo_url):
+    """A throwaway database, dropped after the test"""
+    from pymongo import MongoClient
+
+    client = MongoClient(mongo_url)
+    name = f"romingo_test_{uuid.uuid4().hex[:8]}"
+    try:
+        yield client[name]
+    finally:
+        client.drop_database(name)
+        client.close()
+
+
+@pytest.fixture(scope="module")
+def api(mongo_url):
+    """TestClient for server.app against a throwaway database (dropped afterwards)"""
+    os.environ["MONGO_URL"] = mongo_url
+    os.environ["DB_NAME"] = f"romingo_test_{uuid.uuid4().hex[:8]}"
+    os.environ.setdefault("JWT_SECRET", "query-budget-tests-signing-key-0123456789")
+
+    import server
+    from fastapi.testclient import TestClient
+
+    # server reads its settings at import; keep them in step with this module's database
+    server.MONGO_URL = os.environ["MONGO_URL"]
+    server.DB_NAME = os.environ["DB_NAME"]
+    server.JWT_SECRET = os.environ["JWT_SECRET"]
+    with TestClient(server.app) as client:
+        try:
+            yield client
+        finally:
+            server.client.drop_database(server.DB_NAME)
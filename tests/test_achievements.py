@@ -0,0 +1,28 @@
+from bson import ObjectId
+
+import achievements
+
+
+def test_rules_for_mask():
+    mask = (1 << achievements.RULES_BY_TYPE["first_lesson"]["bit"]) | (1 << achievements.RULES_BY_TYPE["xp_100"]["bit"])
+    assert [rule["type"] for rule in achievements.rules_for_mask(mask)] == ["first_lesson", "xp_100"]
+    assert achievements.rules_for_mask(0) == []
+
+
+def test_backfill_counts_lessons_only(db):
+    achievements.init_collections(db)
+    user_id = ObjectId()
+    db.users.insert_one({"_id": user_id, "username": "ana"})
+    db.achievements.insert_one({"user_id": str(user_id), "badge_type": "first_lesson"})
+    db.user_progress.insert_many([
+        {"user_id": str(user_id), "lesson_id": "l1", "completed": True, "score": 90},
+        {"user_id": str(user_id), "lesson_id": "l2", "completed": True, "score": 80},
+        {"user_id": str(user_id), "lesson_id": "l3", "completed": False, "score": 40},
+        {"user_id": str(user_id), "story_id": "s1", "completed": True},
+    ])
+
+    assert achievements.backfill_badges() == 1
+
+    user = db.users.find_one({"_id": user_id})
+    assert user["total_lessons_completed"] == 2
+    assert user["badges_mask"] == 1 << achievements.RULES_BY_TYPE["first_lesson"]["bit"]
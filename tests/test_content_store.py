@@ -0,0 +1,69 @@
+import gzip
+
+import pytest
+
+from content_store import MIN_COMPRESS_BYTES, ContentEntry, serialize_doc
+
+LARGE = b"x" * MIN_COMPRESS_BYTES
+
+
+@pytest.fixture
+def entry():
+    """An entry with all three representations (brotli is optional, so br is faked when missing)"""
+    content = ContentEntry(LARGE, "private, no-cache")
+    if "br" not in content.variants:
+        content.variants["br"] = (b"brotli", content.variants["identity"][1][:-1] + '-br"')
+        content.etags = {etag for _, etag in content.variants.values()}
+    return content
+
+
+@pytest.mark.parametrize("accept_encoding,expected", [
+    ("", "identity"),
+    ("gzip", "gzip"),
+    ("gzip, deflate, br", "br"),
+    ("BR;q=0.5, GZIP", "br"),
+    ("br;q=0, gzip", "gzip"),
+    ("br;q=0.0, gzip;q=0", "identity"),
+    ("br;q=abc", "br"),
+    ("deflate, *", "identity"),
+])
+def test_pick_encoding(entry, accept_encoding, expected):
+    assert entry.pick_encoding(accept_encoding) == expected
+
+
+def test_small_bodies_are_not_compressed():
+    small = ContentEntry(b"{}", "private")
+    assert set(small.variants) == {"identity"}
+    assert small.pick_encoding("br, gzip") == "identity"
+
+
+def test_variants_decode_to_the_same_body(entry):
+    body, _ = entry.variants["gzip"]
+    assert gzip.decompress(body) == LARGE
+
+
+@pytest.mark.parametrize("encoding", ["identity", "gzip", "br"])
+def test_matches_each_representation(entry, encoding):
+    _, etag = entry.variants[encoding]
+    assert entry.matches(etag)
+    assert entry.matches(f"W/{etag}")
+    assert entry.matches(f'"stale", {etag}')
+
+
+def test_matches_rejects_other_tags(entry):
+    assert not entry.matches("")
+    assert not entry.matches(None)
+    assert not entry.matches('"stale"')
+    assert entry.matches(" * ")
+
+
+def test_etags_are_stable_and_content_addressed():
+    assert ContentEntry(LARGE, "a").etags == ContentEntry(LARGE, "b").etags
+    assert ContentEntry(LARGE, "a").etags.isdisjoint(ContentEntry(LARGE + b"y", "a").etags)
+
+
+def test_serialize_doc_leaves_input_untouched():
+    doc = {"_id": 42, "title": "Salut"}
+    assert serialize_doc(doc) == {"id": "42", "title": "Salut"}
+    assert doc == {"_id": 42, "title": "Salut"}
+    assert serialize_doc(None) is None
@@ -0,0 +1,71 @@
+import pytest
+
+from grading import PRONUNCIATION_PASS_SIMILARITY, detect_error_type, get_text_similarity, grade_answer, normalize_text
+
+
+def test_normalize_text():
+    assert normalize_text("  Bună   ZIUA ") == "bună ziua"
+    assert normalize_text(None) == ""
+
+
+@pytest.mark.parametrize("exercise_type,error_type", [
+    ("speaking", "speaking_accuracy"),
+    ("listening", "listening_accuracy"),
+    ("translation", "grammar"),
+    ("sentence_complete", "grammar"),
+    ("word_match", "vocabulary"),
+    ("multiple_choice", "vocabulary"),
+    ("unknown", "general"),
+    (None, "general"),
+])
+def test_detect_error_type(exercise_type, error_type):
+    assert detect_error_type({"type": exercise_type}) == error_type
+
+
+def test_exact_types_compare_normalized_answers():
+    exercise = {"type": "multiple_choice", "correct_answer": "Bună ziua"}
+
+    result = grade_answer(exercise, "  bună   ZIUA")
+    assert result == {"user_answer": "bună ziua", "is_correct": True, "similarity": 1.0, "feedback_details": {}}
+
+    result = grade_answer(exercise, "bună seara")
+    assert not result["is_correct"]
+    assert 0 < result["similarity"] < 1
+
+
+def test_translation_accepts_alternatives():
+    exercise = {"type": "translation", "correct_answer": "Mă numesc Ana", "acceptable_answers": ["Numele meu este Ana"]}
+
+    assert grade_answer(exercise, "numele meu  este ana")["is_correct"]
+    result = grade_answer(exercise, "mă numesc ana")
+    assert result["is_correct"]
+    assert result["feedback_details"] == {"similarity": 100}
+
+    result = grade_answer(exercise, "eu sunt ana")
+    assert not result["is_correct"]
+    assert result["feedback_details"]["similarity"] == round(result["similarity"] * 100)
+
+
+@pytest.mark.parametrize("exercise_type", ["speaking", "listening"])
+def test_speech_types_pass_on_similarity(exercise_type):
+    exercise = {"type": exercise_type, "correct_answer": "Mulțumesc frumos"}
+
+    close = grade_answer(exercise, "multumesc frumos")
+    assert close["similarity"] >= PRONUNCIATION_PASS_SIMILARITY
+    assert close["is_correct"]
+    assert close["feedback_details"]["evaluation"] == "good"
+
+    far = grade_answer(exercise, "la revedere")
+    assert not far["is_correct"]
+    assert far["feedback_details"] == {"pronunciation_score": int(far["similarity"] * 100), "evaluation": "needs_practice"}
+
+
+def test_similarity_matches_get_text_similarity():
+    exercise = {"type": "speaking", "correct_answer": " Bună DIMINEAȚA"}
+    answer = "buna dimineata"
+    assert grade_answer(exercise, answer)["similarity"] == get_text_similarity(answer, exercise["correct_answer"])
+
+
+def test_missing_correct_answer_only_matches_empty_input():
+    assert grade_answer({"type": "word_match"}, "  ")["is_correct"]
+    assert not grade_answer({"type": "word_match"}, "salut")["is_correct"]
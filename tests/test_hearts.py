@@ -0,0 +1,77 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+import duolingo_features
+from duolingo_features import HEART_REFILL_MINUTES, current_hearts, deduct_heart
+
+
+@pytest.fixture
+def users(db):
+    duolingo_features.init_collections(db)
+    return db.users
+
+
+def make_user(users, **fields):
+    user = {"_id": ObjectId(), "max_hearts": 5, **fields}
+    users.insert_one(user)
+    return user
+
+
+def test_current_hearts_refills_on_read():
+    now = datetime(2026, 3, 1, 12, 0)
+    user = {"hearts": 1, "max_hearts": 5, "last_heart_refill": now - timedelta(minutes=2 * HEART_REFILL_MINUTES + 1)}
+    assert current_hearts(user, now) == 3
+    assert current_hearts(dict(user, last_heart_refill=(now - timedelta(days=1)).isoformat()), now) == 5
+    assert current_hearts({"max_hearts": 5}, now) == 5
+
+
+def test_full_bar_starts_the_refill_timer(users):
+    user = make_user(users, hearts=5, last_heart_refill=datetime.utcnow() - timedelta(days=2))
+
+    assert asyncio.run(deduct_heart(user)) == {"hearts": 4, "shield_used": False}
+
+    stored = users.find_one({"_id": user["_id"]})
+    assert stored["hearts"] == 4
+    assert datetime.utcnow() - stored["last_heart_refill"] < timedelta(seconds=5)
+
+
+@pytest.mark.parametrize("legacy_anchor", [False, True])
+def test_refilled_hearts_are_counted_and_partial_progress_kept(users, legacy_anchor):
+    anchor = datetime.utcnow().replace(microsecond=0) - timedelta(minutes=2 * HEART_REFILL_MINUTES + 5)
+    user = make_user(users, hearts=2, last_heart_refill=anchor.isoformat() if legacy_anchor else anchor)
+
+    assert asyncio.run(deduct_heart(user)) == {"hearts": 3, "shield_used": False}
+
+    stored = users.find_one({"_id": user["_id"]})
+    assert stored["hearts"] == 3
+    assert stored["last_heart_refill"] == anchor + timedelta(minutes=2 * HEART_REFILL_MINUTES)
+
+
+def test_shield_is_used_before_hearts(users):
+    anchor = datetime.utcnow().replace(microsecond=0) - timedelta(minutes=5)
+    user = make_user(users, hearts=3, mistake_shields=1, last_heart_refill=anchor)
+
+    assert asyncio.run(deduct_heart(user)) == {"hearts": 3, "shield_used": True}
+
+    stored = users.find_one({"_id": user["_id"]})
+    assert (stored["hearts"], stored["mistake_shields"], stored["last_heart_refill"]) == (3, 0, anchor)
+
+
+def test_no_hearts_left(users):
+    anchor = datetime.utcnow().replace(microsecond=0) - timedelta(minutes=5)
+    user = make_user(users, hearts=0, mistake_shields=0, last_heart_refill=anchor)
+
+    assert asyncio.run(deduct_heart(user)) is None
+    assert users.find_one({"_id": user["_id"]}, {"_id": 0}) == {
+        "max_hearts": 5, "hearts": 0, "mistake_shields": 0, "last_heart_refill": anchor,
+    }
+
+
+def test_refill_due_with_empty_bar(users):
+    user = make_user(users, hearts=0, last_heart_refill=datetime.utcnow() - timedelta(minutes=HEART_REFILL_MINUTES + 1))
+
+    assert asyncio.run(deduct_heart(user)) == {"hearts": 0, "shield_used": False}
+    assert users.find_one({"_id": user["_id"]})["hearts"] == 0
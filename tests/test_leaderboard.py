@@ -0,0 +1,100 @@
+import random
+
+import pytest
+
+import leaderboard
+from leaderboard import XP_BUCKET_SIZE, FenwickTree, LeaderboardSnapshot, leaderboard_entry
+
+TOP_K = 5
+
+
+@pytest.fixture(autouse=True)
+def small_top_k(monkeypatch):
+    monkeypatch.setattr(leaderboard, "LEADERBOARD_TOP_K", TOP_K)
+
+
+def population(count=40, seed=7):
+    rng = random.Random(seed)
+    return [{"_id": f"user{i:02d}", "username": f"user{i:02d}", "xp": rng.randrange(0, 400)} for i in range(count)]
+
+
+def build_snapshot(users):
+    """What compute_leaderboard() returns for these users"""
+    ordered = sorted(users, key=lambda user: (-user["xp"], user["_id"]))
+    buckets = {}
+    for user in users:
+        buckets[user["xp"] // XP_BUCKET_SIZE] = buckets.get(user["xp"] // XP_BUCKET_SIZE, 0) + 1
+    return LeaderboardSnapshot([leaderboard_entry(user) for user in ordered[:TOP_K]], buckets)
+
+
+def test_fenwick_prefix_sums_match_naive_sums():
+    rng = random.Random(1)
+    counts = [0] * 50
+    tree = FenwickTree(len(counts))
+    for _ in range(500):
+        index, delta = rng.randrange(len(counts)), rng.choice([-1, 1, 3])
+        counts[index] += delta
+        tree.add(index, delta)
+
+    for index in range(len(counts)):
+        assert tree.prefix_sum(index) == sum(counts[:index + 1])
+    # Indexes past the end clamp to the full sum
+    assert tree.prefix_sum(len(counts) + 10) == sum(counts)
+
+
+def test_rank_for_xp_is_exact_in_top_k_and_bounded_below_it():
+    users = population()
+    snapshot = build_snapshot(users)
+
+    for xp in range(0, 420, 3):
+        rank, exact = snapshot.rank_for_xp(xp)
+        true_rank = 1 + sum(user["xp"] > xp for user in users)
+        if exact:
+            assert rank == true_rank
+        else:
+            # Bucket-accurate: users in the same bucket with more XP are not counted
+            same_bucket_above = sum(user["xp"] > xp and user["xp"] // XP_BUCKET_SIZE == xp // XP_BUCKET_SIZE for user in users)
+            assert rank <= true_rank <= rank + same_bucket_above
+            assert rank > TOP_K
+    assert snapshot.rank_for_xp(snapshot.entries[0]["xp"]) == (1, True)
+
+
+def test_page_uses_keyset_after_last_entry():
+    snapshot = build_snapshot(population())
+    first = snapshot.page(2)
+    second = snapshot.page(2, after_xp=first[-1]["xp"], after_id=first[-1]["id"])
+
+    assert [row["rank"] for row in first + second] == [1, 2, 3, 4]
+    assert [row["id"] for row in first + second] == [entry["id"] for entry in snapshot.entries[:4]]
+
+
+def test_record_xp_change_matches_a_fresh_snapshot():
+    users = population()
+    snapshot = build_snapshot(users)
+    ceiling = (max(user["xp"] for user in users) // XP_BUCKET_SIZE + 2) * XP_BUCKET_SIZE
+    rng = random.Random(3)
+
+    for _ in range(200):
+        user = rng.choice(users)
+        old_xp = user["xp"]
+        user["xp"] = min(old_xp + rng.randrange(1, 60), ceiling - 1)
+        snapshot.record_xp_change(user, old_xp, user["xp"])
+
+    fresh = build_snapshot(users)
+    assert snapshot.entries == fresh.entries
+    for bucket in range(snapshot.histogram.size):
+        assert snapshot.histogram.prefix_sum(bucket) == fresh.histogram.prefix_sum(bucket)
+
+
+def test_record_xp_change_moves_top_k_entry_by_id():
+    users = population()
+    snapshot = build_snapshot(users)
+    leader = dict(users[0], _id=snapshot.entries[-1]["id"])
+
+    # The caller's old_xp may be newer than the snapshot's; the entry is still replaced, not duplicated
+    snapshot.record_xp_change(leader, snapshot.entries[-1]["xp"] + 5, 10_000)
+
+    assert snapshot.entries[0]["id"] == leader["_id"]
+    assert snapshot.entries[0]["xp"] == 10_000
+    assert len(snapshot.entries) == TOP_K
+    assert [entry["id"] for entry in snapshot.entries].count(leader["_id"]) == 1
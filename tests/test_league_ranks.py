@@ -0,0 +1,80 @@
+import time
+
+from league_ranks import LeagueRankIndex
+
+
+def members(*rows):
+    return [{"user_id": user_id, "username": user_id.upper(), "xp_this_week": xp} for user_id, xp in rows]
+
+
+def test_ranks_order_by_xp_then_user_id():
+    index = LeagueRankIndex()
+    index.load_league("l1", members(("b", 50), ("a", 50), ("c", 80), ("d", 0)))
+
+    assert [row["user_id"] for row in index.top("l1", 10)] == ["c", "a", "b", "d"]
+    assert index.rank("l1", "c") == 1
+    assert index.rank("l1", "b") == 3
+    assert index.rank("l1", "nobody") is None
+    assert index.rank("other", "c") is None
+    assert index.top("l1", 2) == [
+        {"user_id": "c", "username": "C", "xp_this_week": 80, "rank": 1},
+        {"user_id": "a", "username": "A", "xp_this_week": 50, "rank": 2},
+    ]
+
+
+def test_set_xp_moves_member_and_adds_new_ones():
+    index = LeagueRankIndex()
+    index.load_league("l1", members(("a", 10), ("b", 20)))
+
+    index.set_xp("l1", "a", 30)
+    index.set_xp("l1", "c", 25, username="Cleo")
+
+    assert [(row["user_id"], row["rank"]) for row in index.top("l1", 5)] == [("a", 1), ("c", 2), ("b", 3)]
+    assert index.size("l1") == 3
+    assert index.around("l1", "c", radius=0) == [{"user_id": "c", "username": "Cleo", "xp_this_week": 25, "rank": 2}]
+
+
+def test_set_xp_ignores_leagues_not_loaded():
+    index = LeagueRankIndex()
+    index.set_xp("l1", "a", 30)
+    assert index.size("l1") == 0
+    assert not index.is_fresh("l1")
+
+
+def test_around_clips_at_both_ends():
+    index = LeagueRankIndex()
+    index.load_league("l1", members(*[(f"u{i}", 100 - i) for i in range(6)]))
+
+    assert [row["rank"] for row in index.around("l1", "u0", radius=2)] == [1, 2, 3]
+    assert [row["rank"] for row in index.around("l1", "u3", radius=2)] == [2, 3, 4, 5, 6]
+    assert [row["rank"] for row in index.around("l1", "u5", radius=1)] == [5, 6]
+    assert index.around("l1", "nobody") == []
+
+
+def test_freshness_and_eviction():
+    index = LeagueRankIndex(max_age_seconds=30, evict_after_seconds=600)
+    index.load_league("old", members(("a", 1)))
+    index.load_league("new", members(("b", 2)))
+    assert index.is_fresh("old") and len(index) == 2
+
+    now = time.monotonic()
+    index._loaded_at["old"] = now - 601
+    index._loaded_at["new"] = now - 31
+    assert not index.is_fresh("new")
+
+    assert index.evict_idle(now) == 1
+    assert len(index) == 1
+    assert index.rank("old", "a") is None
+    assert index.rank("new", "b") == 1
+
+
+def test_loading_sweeps_idle_leagues():
+    index = LeagueRankIndex(max_age_seconds=30, evict_after_seconds=600)
+    index.load_league("old", members(("a", 1)))
+    index._loaded_at["old"] -= 601
+    index._swept_at -= 31
+
+    index.load_league("new", members(("b", 2)))
+
+    assert len(index) == 1
+    assert index.size("old") == 0
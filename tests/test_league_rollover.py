@@ -0,0 +1,51 @@
+from duolingo_features import DEMOTION_SLOTS, LEAGUE_TIERS, PROMOTION_SLOTS, plan_cohort_rollover
+
+
+def cohort(*xp):
+    """Members as rollover_week streams them: sorted by xp_this_week descending"""
+    return [{"user_id": f"u{i}", "xp_this_week": value} for i, value in enumerate(sorted(xp, reverse=True))]
+
+
+def tiers(moves):
+    return [new_tier for _, new_tier, _ in moves]
+
+
+def test_full_cohort_promotes_top_and_demotes_bottom():
+    size = 30
+    moves = plan_cohort_rollover("silver", cohort(*range(size, 0, -1)))
+
+    assert tiers(moves) == (
+        ["gold"] * PROMOTION_SLOTS
+        + ["silver"] * (size - PROMOTION_SLOTS - DEMOTION_SLOTS)
+        + ["bronze"] * DEMOTION_SLOTS
+    )
+    assert [rank for _, _, rank in moves] == list(range(1, size + 1))
+    assert [user_id for user_id, _, _ in moves] == [f"u{i}" for i in range(size)]
+
+
+def test_members_without_xp_are_not_promoted():
+    moves = plan_cohort_rollover("silver", cohort(40, 0, 0))
+    assert tiers(moves) == ["gold", "silver", "silver"]
+
+
+def test_small_cohort_never_demotes_promotion_slots():
+    moves = plan_cohort_rollover("gold", cohort(*range(10, 0, -1)))
+    assert tiers(moves) == ["sapphire"] * PROMOTION_SLOTS + ["silver"] * (10 - PROMOTION_SLOTS)
+
+    moves = plan_cohort_rollover("gold", cohort(5, 4, 3))
+    assert tiers(moves) == ["sapphire"] * 3
+
+
+def test_bottom_and_top_tiers_stay_in_range():
+    members = cohort(*range(20, 0, -1))
+
+    bottom = plan_cohort_rollover(LEAGUE_TIERS[0], members)
+    assert set(tiers(bottom)[-DEMOTION_SLOTS:]) == {LEAGUE_TIERS[0]}
+
+    top = plan_cohort_rollover(LEAGUE_TIERS[-1], members)
+    assert set(tiers(top)[:PROMOTION_SLOTS]) == {LEAGUE_TIERS[-1]}
+    assert set(tiers(top)[-DEMOTION_SLOTS:]) == {LEAGUE_TIERS[-2]}
+
+
+def test_empty_cohort():
+    assert plan_cohort_rollover("bronze", []) == []
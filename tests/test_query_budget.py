@@ -0,0 +1,98 @@
+"""Mongo command budgets for endpoints that used to query once per item (N+1).
+
+Each endpoint is called against enough lessons, stories, progress rows, friends
+and due reviews that a per-item query would blow its budget. The counts include
+the auth lookup in get_current_user.
+"""
+
+import glob
+import json
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+from query_budget import QUERY_COUNT_HEADER, assert_max_queries
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+FRIENDS = 8
+STORIES = 12
+
+BUDGETS = [
+    ("GET", "/api/lessons", 3),
+    ("GET", "/api/stories", 3),
+    ("GET", "/api/friends", 3),
+    ("GET", "/api/league/standings", 4),
+    ("GET", "/api/skill-tree", 3),
+    ("POST", "/api/practice/session", 4),
+]
+
+
+def register(client, username):
+    response = client.post(
+        "/api/auth/register",
+        json={"username": username, "email": f"{username}@example.com", "password": "secret123"},
+    )
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['token']}"}
+
+
+@pytest.fixture(scope="module")
+def auth(api):
+    """A learner with progress on every lesson and story, friends, a league and due reviews"""
+    import server
+
+    headers = register(api, "budget_learner")
+    user_id = api.get("/api/user/profile", headers=headers).json()["id"]
+
+    lessons = []
+    for path in sorted(glob.glob(os.path.join(BACKEND_DIR, "generated_lesson_*.json"))):
+        with open(path) as f:
+            lessons.append(json.load(f))
+    lesson_ids = [str(_id) for _id in server.lessons_collection.insert_many(lessons).inserted_ids]
+    story_ids = [
+        str(_id) for _id in server.stories_collection.insert_many(
+            [{"title": f"Story {i}", "level": i % 3 + 1, "content": []} for i in range(STORIES)]
+        ).inserted_ids
+    ]
+    server.user_progress_collection.insert_many(
+        [{"user_id": user_id, "lesson_id": lesson_id, "completed": True, "score": 60} for lesson_id in lesson_ids]
+        + [{"user_id": user_id, "story_id": story_id, "completed": True} for story_id in story_ids]
+    )
+
+    due = datetime.utcnow() - timedelta(hours=1)
+    server.mistakes_collection.insert_many([
+        {"user_id": user_id, "lesson_id": lesson_id, "exercise_index": 0, "error_type": "vocabulary", "next_review_at": due}
+        for lesson_id in lesson_ids[:10]
+    ])
+
+    assert api.post("/api/league/join", headers=headers).status_code == 200
+    for i in range(FRIENDS):
+        friend_headers = register(api, f"budget_friend_{i}")
+        api.post("/api/league/join", headers=friend_headers)
+        assert api.post(f"/api/friends/add/budget_friend_{i}", headers=headers).status_code == 200
+    return headers
+
+
+@pytest.mark.parametrize("method,path,budget", BUDGETS)
+def test_endpoint_query_budget(api, auth, method, path, budget):
+    with assert_max_queries(budget) as log:
+        response = api.request(method, path, headers=auth)
+    assert response.status_code == 200, response.text
+    assert int(response.headers[QUERY_COUNT_HEADER]) == log.count
+
+
+def test_capture_counts_only_its_own_work(api, auth):
+    import server
+
+    with assert_max_queries(1) as log:
+        server.users_collection.find_one({"username": "budget_learner"})
+    assert log.count == 1
+
+
+def test_over_budget_fails(api, auth):
+    import server
+
+    with pytest.raises(AssertionError, match="expected at most 0"):
+        with assert_max_queries(0):
+            server.users_collection.find_one({"username": "budget_learner"})
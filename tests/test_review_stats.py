@@ -0,0 +1,31 @@
+from datetime import datetime
+
+import review_stats
+
+
+def test_due_bucket_accepts_legacy_strings():
+    assert review_stats.due_bucket(datetime(2026, 3, 1, 23, 59)) == "2026-03-01"
+    assert review_stats.due_bucket("2026-03-02T08:00:00") == "2026-03-02"
+
+
+def test_rebuild_handles_unmigrated_dates(db):
+    review_stats.init_collections(db)
+    db.user_mistakes.insert_many([
+        {"user_id": "u1", "error_type": "grammar", "next_review_at": datetime(2026, 3, 1, 9)},
+        {"user_id": "u1", "error_type": "grammar", "next_review_at": "2026-03-01T18:30:00"},
+        {"user_id": "u1", "error_type": "vocabulary", "next_review_at": "not a date"},
+        {"user_id": "u2", "next_review_at": datetime(2026, 3, 4)},
+    ])
+
+    assert review_stats.rebuild_review_stats() == 2
+
+    u1 = db.review_stats.find_one({"user_id": "u1"}, {"_id": 0})
+    assert u1 == {
+        "user_id": "u1",
+        "tracked": 3,
+        "by_error_type": {"grammar": 2, "vocabulary": 1},
+        "due_buckets": {"2026-03-01": 2},
+    }
+    u2 = db.review_stats.find_one({"user_id": "u2"}, {"_id": 0})
+    assert u2["by_error_type"] == {"general": 1}
+    assert u2["due_buckets"] == {"2026-03-04": 1}
@@ -0,0 +1,75 @@
+import itertools
+from datetime import datetime, timedelta
+
+import pytest
+
+import srs
+
+
+def test_schedule_review_first_answers():
+    assert srs.schedule_review(2.5, 1, 0, srs.CORRECT_QUALITY) == (2.5, 1, 1)
+    assert srs.schedule_review(2.5, 1, 1, srs.CORRECT_QUALITY) == (2.5, 6, 2)
+    assert srs.schedule_review(2.5, 6, 2, srs.CORRECT_QUALITY) == (2.5, 15, 3)
+
+
+def test_schedule_review_miss_resets_and_lowers_ease():
+    ease, interval, repetitions = srs.schedule_review(2.5, 15, 3, srs.WRONG_QUALITY)
+    assert (interval, repetitions) == (1, 0)
+    assert ease == pytest.approx(2.5 + srs.ease_delta(srs.WRONG_QUALITY))
+
+
+def test_schedule_review_clamps_ease_and_interval():
+    ease, interval, _ = srs.schedule_review(srs.MIN_EASE, 300, 5, srs.WRONG_QUALITY)
+    assert ease == srs.MIN_EASE
+    _, interval, _ = srs.schedule_review(2.5, 300, 5, srs.CORRECT_QUALITY)
+    assert interval == srs.MAX_INTERVAL_DAYS
+
+
+def replay(mistakes, correct_answers):
+    """Per-answer state after `mistakes` misses followed by `correct_answers` correct answers"""
+    ease, interval, repetitions = srs.DEFAULT_EASE, 1, 0
+    for _ in range(mistakes):
+        ease, interval, repetitions = srs.schedule_review(ease, interval, repetitions, srs.WRONG_QUALITY)
+    for _ in range(correct_answers):
+        ease, interval, repetitions = srs.schedule_review(ease, interval, repetitions, srs.CORRECT_QUALITY)
+    return ease, interval
+
+
+def test_derive_state_batch_matches_replayed_answers():
+    cases = list(itertools.product(range(1, 8), range(0, 6)))
+    mistakes, repetitions = zip(*cases)
+
+    ease, interval = srs.derive_state_batch(repetitions, mistakes)
+
+    for i, (mistake_count, repetition_count) in enumerate(cases):
+        expected_ease, expected_interval = replay(mistake_count, repetition_count)
+        assert ease[i] == pytest.approx(expected_ease)
+        # The replay rounds after every step, the closed form once, so they drift apart slightly
+        assert interval[i] == pytest.approx(expected_interval, rel=0.1, abs=1), (mistake_count, repetition_count)
+
+
+def test_derive_state_batch_bounds():
+    ease, interval = srs.derive_state_batch([0, 1, 40], [50, 0, 0])
+    assert ease[0] == srs.MIN_EASE
+    assert ease[1] == srs.DEFAULT_EASE
+    assert list(interval) == [1, 1, srs.MAX_INTERVAL_DAYS]
+
+
+def test_legacy_state_updates_are_guarded_on_missing_ease():
+    now = datetime(2026, 3, 2, 12, 0)
+    seen = datetime(2026, 3, 1, 8, 30)
+    docs = [
+        {"_id": 1, "repetition_count": 2, "mistake_count": 1, "last_seen_at": seen},
+        {"_id": 2, "created_at": seen.isoformat()},
+        {"_id": 3},
+    ]
+
+    updates = srs.legacy_state_updates(docs, now=now)
+
+    assert [op._filter for op in updates] == [{"_id": i, "ease": {"$exists": False}} for i in (1, 2, 3)]
+    first = updates[0]._doc["$set"]
+    assert first["interval_days"] == 6
+    assert first["next_review_at"] == seen + timedelta(days=6)
+    # ISO strings are parsed, missing timestamps fall back to now
+    assert updates[1]._doc["$set"]["next_review_at"] == seen + timedelta(days=1)
+    assert updates[2]._doc["$set"]["next_review_at"] == now + timedelta(days=1)
@@ -0,0 +1,28 @@
+import pytest
+from bson import ObjectId
+
+import streaks
+
+
+def test_migrate_streak_freezes_is_safe_to_rerun_after_a_crash(db, monkeypatch):
+    streaks.init_collections(db)
+    user_id = ObjectId()
+    db.users.insert_one({"_id": user_id, "username": "ana", "streak_freezes": 1})
+    db.user_inventory.insert_many([
+        {"user_id": str(user_id), "item_type": "streak_freeze"},
+        {"user_id": str(user_id), "item_type": "streak_freeze", "quantity": 2},
+        {"user_id": str(user_id), "item_type": "hint_token", "quantity": 1},
+    ])
+
+    # Crash after crediting the batch, before its rows are deleted
+    delete_many = streaks.user_inventory_collection.delete_many
+    monkeypatch.setattr(streaks.user_inventory_collection, "delete_many", lambda *args, **kwargs: 1 / 0)
+    with pytest.raises(ZeroDivisionError):
+        streaks.migrate_streak_freezes()
+    monkeypatch.setattr(streaks.user_inventory_collection, "delete_many", delete_many)
+
+    assert streaks.migrate_streak_freezes() == 1
+    assert streaks.migrate_streak_freezes() == 0
+
+    assert db.users.find_one({"_id": user_id})["streak_freezes"] == 4
+    assert [row["item_type"] for row in db.user_inventory.find()] == ["hint_token"]